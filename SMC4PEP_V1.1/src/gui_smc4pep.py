@@ -14,6 +14,7 @@ from tkinter import filedialog
 
 # own modules
 import utils_all
+import utils_read
 
 
 #%% funcs
@@ -32,8 +33,9 @@ def ConvertDiagrams(event=None):
     # remove the ending '.xlm', and append '_prism.mpd'
     default_name = bmpn_file[:-4] + '_prism'
     
-    # convert to prism
-    prism_data, nodes_states = utils_all.bpmn2prism(bmpn_file, remove_redund = True)
+    # parse the bpmn file (once) and convert to prism
+    bpmn_model = utils_read.read_model(bmpn_file)
+    prism_data, nodes_states = utils_all.bpmn2prism(bpmn_model, remove_redund = True)
     
     # save prism model into file
     f = filedialog.asksaveasfile(mode='w', initialfile = default_name, defaultextension='.mdp')
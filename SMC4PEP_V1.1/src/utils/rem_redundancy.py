@@ -5,6 +5,8 @@ remove redundancy
 
 #%% imports
 
+from collections import deque
+
 import numpy as np
 
 # own modules
@@ -147,17 +149,87 @@ def check_equal_diag(N1, F1, N2, F2):
 # end func
 
 
+#%% function - diag_fingerprint
+
+def diag_fingerprint(Ndiag, Fdiag):
+    # a fingerprint of a diagram, such that diagrams found equal by check_equal_diag
+    # always have the same fingerprint (the converse is not true, so equal 
+    # fingerprints must still be confirmed with check_equal_diag)
+    # check_equal_diag matches the nodes pairwise in BFS order, by type, and by name
+    # for non-gates; so the fingerprint is the label of the start node, together
+    # with the set of labels of all nodes reachable from it
+    # Input:
+    #    > Ndiag, Fdiag: nodes and flows of the diagram (see utils_read)
+    # Output:
+    #    > fingerprint: a hashable fingerprint of the diagram
+    
+    def node_label(nID):
+        # gates are compared only by type
+        n_type = Ndiag[nID]['type']
+        if n_type in ['fork', 'join', 'decision']:
+            return (n_type,)
+        # end if
+        return (n_type, Ndiag[nID]['name'])
+    # end func
+    
+    startID = utils_process.find_start(Ndiag)
+    if startID is None:
+        return (None,)
+    # end if
+    
+    # BFS from the start, collecting the labels of the reached nodes
+    visited = {startID}
+    Q = deque([startID])
+    labels = set()
+    while Q:
+        node = Q.popleft()
+        labels.add(node_label(node))
+        for child in utils_process.get_children(node, Ndiag, Fdiag):
+            if child not in visited:
+                visited.add(child)
+                Q.append(child)
+            # end if
+        # end for
+    # end while
+    
+    return (node_label(startID), frozenset(labels))
+# end func
+
+
+#%% function - fingerprint_buckets
+
+def fingerprint_buckets(Nall, Fall):
+    # group the diagrams of a process by their fingerprint (see diag_fingerprint)
+    # only diagrams in the same bucket can be equal
+    # Input:
+    #    > Nall, Fall: nodes and flows of all process diagrams
+    # Output:
+    #    > buckets: list of lists of diagram numbers (in increasing order), 
+    #               one for each fingerprint
+    
+    buckets = {}
+    for i in range(len(Nall)):
+        fp = diag_fingerprint(Nall[i], Fall[i])
+        buckets.setdefault(fp, []).append(i)
+    # end for
+    
+    return list(buckets.values())
+# end func
+
+
 #%% function - get_events
 
-def get_events(Nall, Fall):
+def get_events(Nall, Fall, with_index = False):
     # finds the events that match with each other
     # Input:
     #    > Nall, Fall: all nodes and flows of a process (all diagrams)
     #                  {diag_id}: Ndiag (and Fdiag respectivly)
     #                  where Ndiag = dict of type [node_id]:{name, type} (see
     #                  before), Fdiag = dict [(source, target)]: label
+    #    > with_index: if True, return also the index of the event names (see index_events)
     # Output:
     #    > Eall: dict of all events in the process, of type [diag_id]: [eventID1, eventID2,..]
+    #    > ev_index: (only if with_index) the event name index
     
     Eall = {} # inti
     
@@ -177,10 +249,56 @@ def get_events(Nall, Fall):
         # end for
     # end for
     
+    if with_index:
+        return Eall, index_events(Nall, Eall)
+    # end if
+    
     return Eall
 # end func
 
 
+#%% function - index_events
+
+def index_events(Nall, Eall):
+    # index the events of a process by name, in one pass; e.g. the events 
+    # 'End X' (diag 0) and 'Start X' (diag 2) are both indexed under 'X'
+    # all events must have names of the form 'Start/End/Int X' (see interm_event_name_type)
+    # Input:
+    #    > Nall: nodes of the process
+    #    > Eall: dict of all events in the process, of type [diag_id]: [eventID1, eventID2,..]
+    #            computed by function get_events
+    # Output:
+    #    > ev_index: dict of type [ev_name]: [(diag_id, eventID, ev_type), ...], the events
+    #                in diagram order, and in Eall order within each diagram
+    
+    ev_index = {}
+    malformed = [] # the events with wrong names, (diag_id, eventID, full name)
+    
+    for i in range(len(Eall)):
+        for evID in Eall[i]:
+            ev_full_name = Nall[i][evID]['name']
+            try:
+                ev_type, ev_name = interm_event_name_type(ev_full_name)
+            except TypeError:
+                malformed.append((i, evID, ev_full_name))
+                continue
+            # end try
+            ev_index.setdefault(ev_name, []).append((i, evID, ev_type))
+        # end for
+    # end for
+    
+    # report all wrong names at once
+    if malformed != []:
+        bad_events = ', '.join('{} (diagram {}): {!r}'.format(evID, i, ev_full_name) 
+                               for i, evID, ev_full_name in malformed)
+        raise TypeError('Intermediate event name has not the right form of Start/End/Int X, ' + 
+                        'for the events: ' + bad_events)
+    # end if
+    
+    return ev_index
+# end func
+
+
 #%% function - pools_or_events
 
 def pools_or_events(Eall):
@@ -271,25 +389,18 @@ def rem_event(eventID, N, F):
     # get parents of event
     parents = utils_process.get_parents(eventID, N, F)
     
-    # for all flows
-    for flow in F.keys():
-        source, target = flow
-        label = F[flow]
+    # remove flow event -> child
+    Fnew.pop( (eventID, child) )
+    
+    # for all flows of type parent -> event
+    for parent in parents:
+        label = F[ (parent, eventID) ]
         
-        # if flow is of type event -> child, remove it
-        if source == eventID and target == child:
-            Fnew.pop(flow)
-        # end if
+        # remove flow parent -> event
+        Fnew.pop( (parent, eventID) )
         
-        # if flow is of type parent -> event, then
-        if source in parents and target == eventID:
-            # remove flow parent -> event
-            Fnew.pop(flow)
-            
-            # add flow parent -> child (with same label)
-            parent = source
-            Fnew[ (parent, child) ] = label 
-        # end if
+        # add flow parent -> child (with same label)
+        Fnew[ (parent, child) ] = label 
     # end for
     
     # finally, remove event from nodes N
@@ -344,7 +455,7 @@ def get_msg_flow_events(ev_source, ev_target, diag_source, diag_target, N, F):
 
 #%% function - conn_events_to_msg_flows
 
-def conn_events_to_msg_flows(Emsg, Nall, Fall):
+def conn_events_to_msg_flows(Emsg, Nall, Fall, node_index = None):
     # convert a list of matching events Emsg into a the corresponding
     # msg flows in a pool-based diagram. For each matching events pair (ev1, ev2),
     # a msg flow between their parents par1->par2 is created
@@ -352,19 +463,25 @@ def conn_events_to_msg_flows(Emsg, Nall, Fall):
     #    > Emsg: dict of corresponding events in the form [(evID1, evID2)] -> label,
     #            e.g. ev1->ev2
     #    > Nall, Fall: nodes and flows of all process diagrams (list of dicts, see before)
+    #    > node_index: (optional) NodeIndex of Nall (see utils_process)
     # Output:
     #    > Fmsg: the corresponding msg flows of the diagram, in the form [(par1, par2)] -> label
     
     Fmsg = {} # init
     
+    # index the nodes once, for finding their diagrams
+    if node_index is None:
+        node_index = utils_process.NodeIndex(Nall)
+    # end if
+    
     # for all event pairs
     for ev_pair in Emsg.keys():
         # get the events
         evID1, evID2 = ev_pair
         
         # get the event diagrams
-        diag1, _, _ = utils_process.get_diag_name_type(evID1, Nall)
-        diag2, _, _ = utils_process.get_diag_name_type(evID2, Nall)
+        diag1, _, _ = utils_process.get_diag_name_type(evID1, Nall, node_index)
+        diag2, _, _ = utils_process.get_diag_name_type(evID2, Nall, node_index)
         
         # find the corresponding message flow
         flow = get_msg_flow_events(evID1, evID2, diag1, diag2, Nall, Fall)
@@ -379,25 +496,36 @@ def conn_events_to_msg_flows(Emsg, Nall, Fall):
 
 #%% function - remove_events
 
-def remove_events(eventIDs, Nall, Fall):
+def remove_events(eventIDs, Nall, Fall, node_index = None):
     # remove a list of events from a process
     # Input:
     #    > eventIDs: list of the events (IDs) to be removed
     #    > Nall, Fall: nodes and flows of all process diagrams (list of dicts, see before)
+    #    > node_index: (optional) NodeIndex of Nall (see utils_process); the removed
+    #                  events are removed also from the index
     # Output:
     #    > Nnew, Fnew: new process with the events removed
     
     Nnew = Nall.copy()
     Fnew = Fall.copy()
     
+    # index the nodes once, for finding their diagrams
+    if node_index is None:
+        node_index = utils_process.NodeIndex(Nall)
+    # end if
+    
     for evID in eventIDs:
         # get diagram of event
-        ev_diag, _, _ = utils_process.get_diag_name_type(evID, Nnew)
+        ev_diag, _, _ = utils_process.get_diag_name_type(evID, Nnew, node_index)
         # remove that event
         Nnew_diag, Fnew_diag = rem_event(evID, Nnew[ev_diag], Fnew[ev_diag])
         # append diagram in new
         Nnew[ev_diag] = Nnew_diag.copy()
         Fnew[ev_diag] = Fnew_diag.copy()
+        # the event is gone, remove it also from the index
+        if evID not in Nnew[ev_diag]:
+            node_index.remove_node(evID)
+        # end if
     # end for
     
     return Nnew, Fnew
@@ -406,11 +534,13 @@ def remove_events(eventIDs, Nall, Fall):
 
 #%% function - remove_equal_diagrams
 
-def remove_equal_diagrams(Nall, Fall):
+def remove_equal_diagrams(Nall, Fall, matching_diags = None):
     # remove equal diagrams from a process - two diagrams are equal if they
     # have exactly the same names, types, flows, etc.
     # Input:
     #    > Nall, Fall: nodes and flows of all process diagrams (list of dicts, see before)
+    #    > matching_diags: (optional) the equal diagrams, as computed by find_equal_diagrams;
+    #                      if None, they are computed here
     # Output:
     #    > Nnew, Fnew: nw process with equal diagrams removed
     #    > matching_diags: 2D array with arr[i,j] = 1 if diag_i = diag_j, and 0 else
@@ -418,29 +548,17 @@ def remove_equal_diagrams(Nall, Fall):
     Nnew = Nall.copy()
     Fnew = Fall.copy()
     
-    diags_to_remove = [] # the diagrams to be removed
     # array to hold which diagrams are equal. Aij = 1 if diag_i = diag_j
-    matching_diags = np.zeros( (len(Nall), len(Nall)), int)
+    if matching_diags is None:
+        matching_diags = find_equal_diagrams(Nall, Fall)
+    # end if
     
-    for i in range(len(Nall)):
-        # get diagram i
-        Ni = Nall[i]
-        Fi = Fall[i]
-        
-        for j in range(i+1, len(Nall)):
-            # get diagram j
-            Nj = Nall[j]
-            Fj = Fall[j]
-            
-            # check if i and j are equal
-            are_equal = check_equal_diag(Ni, Fi, Nj, Fj)
-            matching_diags[i, j] = are_equal
-            
-            # if j is equal to i and not yet in the list, add it
-            if are_equal and j not in diags_to_remove:
-                diags_to_remove.append(j)
-            # end if
-        # end for
+    # diagram j is removed if it is equal to some diagram i < j
+    diags_to_remove = [] # the diagrams to be removed
+    for j in range(len(Nall)):
+        if matching_diags[:j, j].any():
+            diags_to_remove.append(j)
+        # end if
     # end for
     
     # now, remove the equal diagrams from the process
@@ -459,28 +577,32 @@ def remove_equal_diagrams(Nall, Fall):
 def find_equal_diagrams(Nall, Fall):
     # find the equal diagrams in a process - two diagrams are equal if they
     # have exactly the same names, types, flows, etc.
+    # the diagrams are first grouped by fingerprint (see fingerprint_buckets), so 
+    # that check_equal_diag runs only for diagrams in the same group
     # Input:
     #    > Nall, Fall: nodes and flows of all process diagrams (list of dicts, see before)
     # Output:
-    #    > Nnew, Fnew: nw process with equal diagrams removed
-    #    > matching_diags: 2D array with arr[i,j] = 1 if diag_i = diag_j, and 0 else
+    #    > matching_diags: 2D array with arr[i,j] = 1 if diag_i = diag_j (i < j), and 0 else
     
     # array to hold which diagrams are equal. Aij = 1 if diag_i = diag_j
     matching_diags = np.zeros( (len(Nall), len(Nall)), int)
     
-    for i in range(len(Nall)):
-        # get diagram i
-        Ni = Nall[i]
-        Fi = Fall[i]
-        
-        for j in range(i+1, len(Nall)):
-            # get diagram j
-            Nj = Nall[j]
-            Fj = Fall[j]
+    for bucket in fingerprint_buckets(Nall, Fall):
+        for bi in range(len(bucket)):
+            # get diagram i
+            i = bucket[bi]
+            Ni = Nall[i]
+            Fi = Fall[i]
             
-            # check if i and j are equal
-            are_equal = check_equal_diag(Ni, Fi, Nj, Fj)
-            matching_diags[i, j] = are_equal
+            for j in bucket[bi+1:]:
+                # get diagram j
+                Nj = Nall[j]
+                Fj = Fall[j]
+                
+                # check if i and j are equal
+                are_equal = check_equal_diag(Ni, Fi, Nj, Fj)
+                matching_diags[i, j] = are_equal
+            # end for
         # end for
     # end for
     
@@ -526,12 +648,100 @@ def check_nodes_match(nodeIDs1, N1, nodeIDs2, N2):
 # end func
         
         
+#%% function - node_signature
+
+def node_signature(nID, startID, N, F):
+    # the position of a node in a diagram, as used for finding corresponding nodes
+    # (see find_corresp_node): its depth and the names and types of its parents 
+    # and children
+    # Input:
+    #    > nID, startID: the node and the start node of the diagram (IDs)
+    #    > N, F: nodes and flows of the diagram
+    # Output:
+    #    > signature: (depth, parents, children), where parents and children are
+    #                 sets of (name, type) pairs
+    
+    depth = utils_process.path_len(startID, nID, N, F)
+    parents = utils_process.get_parents(nID, N, F)
+    children = utils_process.get_children(nID, N, F)
+    
+    parents_info = frozenset((N[par]['name'], N[par]['type']) for par in parents)
+    children_info = frozenset((N[ch]['name'], N[ch]['type']) for ch in children)
+    
+    return (depth, parents_info, children_info)
+# end func
+
+
+#%% function - corresp_nodes
+
+def corresp_nodes(N1, F1, N2, F2):
+    # given two equal diagrams N1,F1 and N2,F2, find for every node of diag 1 
+    # the corresponding node in diag 2 (see find_corresp_node), all at once
+    # Input:
+    #    > N1,F1 and N2,F2: nodes and flows of diag 1 and 2 respectively
+    # Output:
+    #    > node_map: dict nID1: nID2 (nID2 is None if no node corresponds to nID1), 
+    #                or None if the diagrams are not equal
+    
+    # if diagrams not equal, error, return None
+    if check_equal_diag(N1, F1, N2, F2) == False:
+        return None
+    # end if
+    
+    # index the nodes of diag 2 by signature; when many nodes have the same
+    # signature, the first one (in node order) is the corresponding one
+    start2 = utils_process.find_start(N2)
+    nodes2 = {}
+    for nID2 in N2.keys():
+        nodes2.setdefault(node_signature(nID2, start2, N2, F2), nID2)
+    # end for
+    
+    # now, every node of diag 1 needs just a lookup
+    start1 = utils_process.find_start(N1)
+    node_map = {}
+    for nID1 in N1.keys():
+        node_map[nID1] = nodes2.get(node_signature(nID1, start1, N1, F1))
+    # end for
+    
+    return node_map
+# end func
+
+
+#%% function - corresp_node_cached
+
+def corresp_node_cached(nID, diag, diag_equal, Nall, Fall, node_maps):
+    # find the node corresponding to nID of diagram diag in the equal diagram 
+    # diag_equal, computing the node map of the two diagrams only once
+    # Input:
+    #    > nID: node (ID) of diagram diag
+    #    > diag, diag_equal: the diagram numbers
+    #    > Nall, Fall: nodes and flows of the process
+    #    > node_maps: cache dict (diag, diag_equal): node_map (see corresp_nodes);
+    #                 updated in place
+    # Output:
+    #    > nID_equal: the corresponding node, or None if not found
+    
+    if (diag, diag_equal) not in node_maps:
+        node_maps[(diag, diag_equal)] = corresp_nodes(Nall[diag], Fall[diag], 
+                                                      Nall[diag_equal], Fall[diag_equal])
+    # end if
+    
+    node_map = node_maps[(diag, diag_equal)]
+    if node_map is None:
+        return None
+    # end if
+    
+    return node_map[nID]
+# end func
+
+
 #%% function - find_corresp_node
 
 def find_corresp_node(nID1, N1, F1, N2, F2):
     # given two equal diagrams N1,F1 and N2,F2, and a node nID1 of diag 1,
     # find the corresponding node nID2 in diag 2. It must be in the same
     # position and have the same parents and children with nID1
+    # for many nodes of the same diagrams, use corresp_nodes instead
     # Input:
     #    > nID1: node (ID) of diagram 1
     #    > N1,F1 and N2,F2: nodes and flows of diag 1 and 2 respectively
@@ -543,32 +753,17 @@ def find_corresp_node(nID1, N1, F1, N2, F2):
         return None
     # end if
     
-    # get start of diag1
+    # get start of diag1 and 2
     start1 = utils_process.find_start(N1)
-    # get depth of nID1 (distance from the start)
-    depth1 = utils_process.path_len(start1, nID1, N1, F1)
-    
-    # get parents and children of node 1
-    parents1 = utils_process.get_parents(nID1, N1, F1)
-    children1 = utils_process.get_children(nID1, N1, F1)
-    
-    # get start of diag 2
     start2 = utils_process.find_start(N2)
     
+    # depth, parents and children of node 1
+    signature1 = node_signature(nID1, start1, N1, F1)
+    
     # for all nodes in diag2
     for nID2 in N2.keys():
-        # get depth of nID2
-        depth2 = utils_process.path_len(start2, nID2, N2, F2)
-        
-        # get parents and children of node 2
-        parents2 = utils_process.get_parents(nID2, N2, F2)
-        children2 = utils_process.get_children(nID2, N2, F2)
-        
         # check if depths, parents and children are equal
-        parents_equal = check_nodes_match(parents1, N1, parents2, N2)
-        children_equal = check_nodes_match(children1, N1, children2, N2)
-        
-        if depth1 == depth2 and parents_equal and children_equal:
+        if node_signature(nID2, start2, N2, F2) == signature1:
             # corresponding node, found, return
             return nID2
         # end if
@@ -618,7 +813,7 @@ def diag_equal_to(n_diag, matching_diags):
 
 #%% function - rem_redund_fix_flows
 
-def rem_redund_fix_flows(Fmsg, Nall, Fall, matching_diags):
+def rem_redund_fix_flows(Fmsg, Nall, Fall, matching_diags, node_index = None):
     # fix the message flow after we remove the redundant diagrams
     # if the nodes nID1 -> nID2 of a flow f belong to a redundant
     # diagram that was removed, then we have to redirect the flow
@@ -629,19 +824,29 @@ def rem_redund_fix_flows(Fmsg, Nall, Fall, matching_diags):
     #    > Nall, Fall: the original nodes and flows of the process
     #    > mathing_diags: an array showing which diagrams are equal (computed from
     #                     the function remove_equal_diagrams). Aij = 1 if diag_i = diag_j
+    #    > node_index: (optional) NodeIndex of the original Nall (see utils_process)
     # Output:
     #    > Fmsg_new: the new (fixed) message flows 
     
     Fmsg_new = {} # init
     
+    # index the nodes once, for finding their diagrams
+    if node_index is None:
+        node_index = utils_process.NodeIndex(Nall)
+    # end if
+    
+    # the node maps of the pairs of equal diagrams, each computed once
+    # (diag, diag_equal): {nID: nID_equal}
+    node_maps = {}
+    
     # for each msg flow
     for fl in Fmsg.keys():
         # get the flow's nodes nID1 -> nID2
         nID1, nID2 = fl
         
         # find diagrams of nID1 and nID2
-        diag1, _, _ = utils_process.get_diag_name_type(nID1, Nall)
-        diag2, _, _ = utils_process.get_diag_name_type(nID2, Nall)
+        diag1, _, _ = utils_process.get_diag_name_type(nID1, Nall, node_index)
+        diag2, _, _ = utils_process.get_diag_name_type(nID2, Nall, node_index)
         
         # check if either diag1 or diag2 are redundant
         diag1_equal = diag_equal_to(diag1, matching_diags)
@@ -649,8 +854,7 @@ def rem_redund_fix_flows(Fmsg, Nall, Fall, matching_diags):
         
         # if a diagram is equal to another, find the corresponding node there
         if diag1_equal is not None:
-            nID1_equal = find_corresp_node(nID1, Nall[diag1], Fall[diag1], 
-                                           Nall[diag1_equal], Fall[diag1_equal])
+            nID1_equal = corresp_node_cached(nID1, diag1, diag1_equal, Nall, Fall, node_maps)
         else:
             # else keep node as it is
             nID1_equal = nID1
@@ -658,8 +862,7 @@ def rem_redund_fix_flows(Fmsg, Nall, Fall, matching_diags):
         
         # same for node 2
         if diag2_equal is not None:
-            nID2_equal = find_corresp_node(nID2, Nall[diag2], Fall[diag2], 
-                                           Nall[diag2_equal], Fall[diag2_equal])
+            nID2_equal = corresp_node_cached(nID2, diag2, diag2_equal, Nall, Fall, node_maps)
         else:
             # else keep node as it is
             nID2_equal = nID2
@@ -675,23 +878,36 @@ def rem_redund_fix_flows(Fmsg, Nall, Fall, matching_diags):
 
 #%% function - remove_redundancy
             
-def remove_redundancy(Nall, Fall, Fmsg):       
+def remove_redundancy(Nall, Fall, Fmsg, node_index = None):       
     # remove redundancies in a pool - based process
     # Input:
     #    > Nall, Fall: the original nodes and flows of the process
     #    > Fmsg: the original message flows of the process
+    #    > node_index: (optional) NodeIndex of Nall (see utils_process); the nodes
+    #                  of the removed diagrams are removed also from the index
     # Output:
     #    > Nall_new, Fall_new, Fmsg_new: the new process (without redundancy)
     
+    # index the nodes once, for finding their diagrams
+    if node_index is None:
+        node_index = utils_process.NodeIndex(Nall)
+    # end if
     
     # find the diagrams that are equal
     matching_diags = find_equal_diagrams(Nall, Fall)
     
     # fix the msg flows (remove flows from redundant diagrams and redirect)
-    Fmsg_new = rem_redund_fix_flows(Fmsg, Nall, Fall, matching_diags)
+    Fmsg_new = rem_redund_fix_flows(Fmsg, Nall, Fall, matching_diags, node_index)
     
     # finally, remove the redundant diagrams
-    Nall_new, Fall_new, _ = remove_equal_diagrams(Nall, Fall)
+    Nall_new, Fall_new, _ = remove_equal_diagrams(Nall, Fall, matching_diags)
+    
+    # keep the index in line with the remaining diagrams
+    for n_diag in Nall.keys():
+        if n_diag not in Nall_new:
+            node_index.remove_diag(n_diag)
+        # end if
+    # end for
     
     # ready
     return Nall_new, Fall_new, Fmsg_new
@@ -710,19 +926,22 @@ def convert_events_to_pools(Nall, Fall):
     #    > Nall_new, Fall_new, Fmsg_new: the new process (pool-based)
     
     # get all events of the process
-    Eall = get_events(Nall, Fall)
+    Eall, ev_index = get_events(Nall, Fall, with_index = True)
     
     # find the matching events
-    Emsg = find_matching_events3(Nall, Fall, Eall)
+    Emsg = find_matching_events3(Nall, Fall, Eall, ev_index)
+    
+    # index the nodes once, for finding their diagrams
+    node_index = utils_process.NodeIndex(Nall)
     
     # from the matching events, get the message flows
-    Fmsg_new = conn_events_to_msg_flows(Emsg, Nall, Fall)
+    Fmsg_new = conn_events_to_msg_flows(Emsg, Nall, Fall, node_index)
     
     # get the list of events
     eventIDs = utils_process.get_flow_nodes(Emsg)
     
     # finally, remove the events
-    Nall_new, Fall_new = remove_events(eventIDs, Nall, Fall)
+    Nall_new, Fall_new = remove_events(eventIDs, Nall, Fall, node_index)
     
     # ready
     return Nall_new, Fall_new, Fmsg_new
@@ -731,7 +950,7 @@ def convert_events_to_pools(Nall, Fall):
 
 #%% function - event_handler_Int
 
-def event_handler_Int(evIDi, diag_i, Nall, Fall, Eall, Emsg):
+def event_handler_Int(evIDi, diag_i, Nall, Fall, Eall, Emsg, ev_index = None):
     # a helper function for matching the corresponding events in the diagrams
     # given an event ID in diagram i, it tries to find the corresponding events
     # in diag j. This function searches for the "triangles" of the form
@@ -743,6 +962,7 @@ def event_handler_Int(evIDi, diag_i, Nall, Fall, Eall, Emsg):
     #    > Eall: dict of all events in the process, of type [diag_id]: [eventID1, eventID2,..]
     #            computed by function get_events
     #    > Emsg: dict of the msg flows in the form (evID1, evID2): ''
+    #    > ev_index: (optional) the event name index (see index_events)
     # Output:
     #    > Emsg: new found flows will be appended in the dict
     
@@ -751,6 +971,10 @@ def event_handler_Int(evIDi, diag_i, Nall, Fall, Eall, Emsg):
         raise ValueError('Diagram number must be >= 0 and < len(Nall)!')
     # end if
     
+    if ev_index is None:
+        ev_index = index_events(Nall, Eall)
+    # end if
+    
     # get name and type of event
     evi_type, evi_name = interm_event_name_type( Nall[diag_i][evIDi]['name'] )
     
@@ -759,31 +983,26 @@ def event_handler_Int(evIDi, diag_i, Nall, Fall, Eall, Emsg):
         return
     # end if
     
-    # search all other diagrams
-    diag_j_found = False
+    # search the other diagrams for events with the same name; all of them
+    # in the first such diagram
     diag_j = None
     evIDs_Xj = []
-    for j in range(len(Eall)):
+    evTypes_Xj = {}
+    for j, nIDj, evj_type in ev_index.get(evi_name, []):
         if j == diag_i:
             continue
         # end if
-        for nIDj in Eall[j]:
-            # get name and type of event
-            evj_type, evj_name = interm_event_name_type( Nall[j][nIDj]['name'] )
-            # if same name with event nIDi, add it in the list
-            if evj_name == evi_name:
-                evIDs_Xj.append(nIDj)
-                diag_j_found = True
-            # end if
-        # end for
-        if diag_j_found == True:
+        if diag_j is None:
             diag_j = j
+        elif j != diag_j:
             break
         # end if
+        evIDs_Xj.append(nIDj)
+        evTypes_Xj[nIDj] = evj_type
     # end for
     
     # if not found, return
-    if diag_j_found == False:
+    if diag_j is None:
         return
     # end if
     
@@ -795,8 +1014,8 @@ def event_handler_Int(evIDi, diag_i, Nall, Fall, Eall, Emsg):
         evIDj1, evIDj2 = utils_process.order_nodes(evIDs_Xj[0], evIDs_Xj[1], Nall[diag_j], Fall[diag_j])
 
         # all events must be 'Int' otherwise handlre returns
-        evj1_type, evj1_name = interm_event_name_type( Nall[diag_j][evIDj1]['name'] )
-        evj2_type, evj2_name = interm_event_name_type( Nall[diag_j][evIDj2]['name'] )
+        evj1_type = evTypes_Xj[evIDj1]
+        evj2_type = evTypes_Xj[evIDj2]
         
         if [evj1_type, evj2_type] != ['Int', 'Int']:
             return
@@ -817,7 +1036,7 @@ def event_handler_Int(evIDi, diag_i, Nall, Fall, Eall, Emsg):
 
 #%% function - event_handler_noInt
 
-def event_handler_noInt(evIDi, diag_i, Nall, Fall, Eall, Emsg):
+def event_handler_noInt(evIDi, diag_i, Nall, Fall, Eall, Emsg, ev_index = None):
     # a helper function for matching the corresponding events in the diagrams
     # given an event ID in diagram i, it tries to find the corresponding events
     # in diag j. This function searches for non-triangles, of the form either
@@ -829,6 +1048,7 @@ def event_handler_noInt(evIDi, diag_i, Nall, Fall, Eall, Emsg):
     #    > Eall: dict of all events in the process, of type [diag_id]: [eventID1, eventID2,..]
     #            computed by function get_events
     #    > Emsg: dict of the msg flows in the form (evID1, evID2): ''
+    #    > ev_index: (optional) the event name index (see index_events)
     # Output:
     #    > Emsg: new found flows will be appended in the dict
     
@@ -837,6 +1057,10 @@ def event_handler_noInt(evIDi, diag_i, Nall, Fall, Eall, Emsg):
         raise ValueError('Diagram number must be >= 0 and < len(Nall)!')
     # end if
     
+    if ev_index is None:
+        ev_index = index_events(Nall, Eall)
+    # end if
+    
     # get name and type of event
     evi_type, evi_name = interm_event_name_type( Nall[diag_i][evIDi]['name'] )
     
@@ -845,38 +1069,23 @@ def event_handler_noInt(evIDi, diag_i, Nall, Fall, Eall, Emsg):
         return
     # end if
     
-    # search all other diagrams
-    diag_j_found = False
-    diag_j = None
+    # search the other diagrams, stop at the first event with the same name
     evIDj = None
-    for j in range(len(Eall)):
-        if j == diag_i:
-            continue
-        # end if
-        for nIDj in Eall[j]:
-            # get name and type of event
-            evj_type, evj_name = interm_event_name_type( Nall[j][nIDj]['name'] )
-            # if same name with event nIDi, stop search
-            if evj_name == evi_name:
-                evIDj = nIDj
-                diag_j_found = True
-                diag_j = j
-                break
-            # end if
-        # end for
-        if diag_j_found == True:
-            diag_j = j
+    evj_type = None
+    for j, nIDj, nj_type in ev_index.get(evi_name, []):
+        if j != diag_i:
+            evIDj = nIDj
+            evj_type = nj_type
             break
         # end if
     # end for
     
     # if not found, return
-    if diag_j_found == False:
+    if evIDj is None:
         return
     # end if
     
     # check that the type of the other event is either 'Int' or 'Start'
-    evj_type, evj_name = interm_event_name_type( Nall[diag_j][evIDj]['name'] )
     if evj_type not in ['Int', 'Start']:
         # if not, return
         return
@@ -891,7 +1100,7 @@ def event_handler_noInt(evIDi, diag_i, Nall, Fall, Eall, Emsg):
 
 
 #%% function - find_matching_events3
-def find_matching_events3(Nall, Fall, Eall):
+def find_matching_events3(Nall, Fall, Eall, ev_index = None):
     # finds the events that match with each other
     # Input:
     #    > Nall, Fall: all nodes and flows of a process (all diagrams)
@@ -900,6 +1109,8 @@ def find_matching_events3(Nall, Fall, Eall):
     #                  before), Fdiag = dict [(source, target)]: label
     #    > Eall: dict of all events in the process, of type [diag_id]: [eventID1, eventID2,..]
     #            computed by function get_events
+    #    > ev_index: (optional) the event name index (see index_events); 
+    #                if None, it is built here
     # Output:
     #    > Emsg: dict of matching events in the form [(sourceID, targetID)]: label
     #            not yet message flow, since the events have to be removed at the
@@ -907,6 +1118,12 @@ def find_matching_events3(Nall, Fall, Eall):
     
     Emsg = {} # init
     
+    # index the events by name, so that each event finds its matches with a lookup
+    # (this also checks the names of all events)
+    if ev_index is None:
+        ev_index = index_events(Nall, Eall)
+    # end if
+    
     # the only cases for the flows of diag i are the following:
     # case 1: 'End X' (diag i) --> 'Int X' (diag j)
     # case 2: 'End X' (diag i) --> 'Start X' (diag j)
@@ -923,10 +1140,10 @@ def find_matching_events3(Nall, Fall, Eall):
             
             # if type is 'End', we have cases 1 or 2. We call the handler for noInt events
             if evi_type == 'End':
-                event_handler_noInt(evIDi, diag_i, Nall, Fall, Eall, Emsg)
+                event_handler_noInt(evIDi, diag_i, Nall, Fall, Eall, Emsg, ev_index)
             elif evi_type == 'Int':
                 # call the Int events handler
-                event_handler_Int(evIDi, diag_i, Nall, Fall, Eall, Emsg)
+                event_handler_Int(evIDi, diag_i, Nall, Fall, Eall, Emsg, ev_index)
             # end if
             # we don't need to handle other cases; for example the case
             # Start_i --> End_j will be handled by the End_j event of diag j
@@ -950,10 +1167,10 @@ def events_to_flows3(Nall, Fall):
     #    > Nall_new, Fall_new, Fmsg_new: the new process (pool-based)
     
     # get all events of the process
-    Eall = get_events(Nall, Fall)
+    Eall, ev_index = get_events(Nall, Fall, with_index = True)
     
     # find the matching events
-    Emsg = find_matching_events3(Nall, Fall, Eall)
+    Emsg = find_matching_events3(Nall, Fall, Eall, ev_index)
     
     # from the matching events, get the message flows
     Fmsg = Emsg.copy()
@@ -22,47 +22,38 @@ import utils_rewards
 def differentiator(xml_file_process):
     # checks if a process is pool- or event-based
     # Input:
-    #    > xml_file_process: the xml file describing the BPMN model (str)
+    #    > xml_file_process: the xml file describing the BPMN model (str), or
+    #                        the already parsed BPMNmodel (see utils_read)
     # Output:
     #    > process_type: either 'pool_based' or 'event_based' (str)
     
-    # check if there exists a timeline
+    # the type is decided while parsing: if we have a timeline and no message
+    # flows, then it's event based, otherwise it's pool-based
     try:
-        _, _, Timeline = utils_read.read_process_events(xml_file_process)
-        Fmsg = None
-    except:
-        Timeline = None
-    # check also if there exist message flows
-    try:
-        _, _, Fmsg = utils_read.read_process_pools(xml_file_process)
-        Timeline = None
+        model = utils_read.read_model(xml_file_process)
     except:
-        Fmsg = None
+        return 'pool_based'
     # end try
     
-    # if we have a timeline and no message flows, then it's event based
-    if Timeline is not None and Fmsg is None:
-        return 'event_based'
-    else:
-        # otherwise it's pool-based
-        return 'pool_based'
-    # end if
+    return model.process_type
     
 # end func
 
 
 #%% function converter
 
-def converter(Nall, Fall, Fmsg):
+def converter(Nall, Fall, Fmsg, node_index = None):
     # in a pool-based process, remove the redundancy, and find the
     # resulting new message flows (as a list of matching nodes, similar to the
     # event-based)
     # Input:
     #    > Nall, Fall, Fmsg: nodes and flows of the process (see utils_read for specification)
+    #    > node_index: (optional) NodeIndex of Nall (see utils_process); it is kept
+    #                  in line with the new process
     # Output:
     #    > Nall_new, Fall_new, Fmsg_new: the mew process, with redundancy removed
     
-    Nall_new, Fall_new, Emsg = rem_redundancy.remove_redundancy(Nall, Fall, Fmsg)
+    Nall_new, Fall_new, Emsg = rem_redundancy.remove_redundancy(Nall, Fall, Fmsg, node_index)
     return Nall_new, Fall_new, Emsg
 # end func
 
@@ -70,66 +61,122 @@ def converter(Nall, Fall, Fmsg):
 #%% function generator
 
 
-def generator(Nall, Fall, Fmsg, Timeline, process_type):
+def generator(Nall, Fall, Fmsg, Timeline, process_type, detect_dtmc = False, fold_aux = False, 
+              compress = False, layout = 'modules', encode = False, order = False, 
+              max_states = 100000):
     # generate a prism DAT file for the given bpmn process
     # Input:
     #    > Nall, Fall: nodes and flows of the process (s. utils_read for details)
     #    > Fmsg, Timeline: message flows (or matching events) and timeline, depending
     #                      on the case; e.g. if pool-based, we have Fmsg, and Timeline is None
     #    > process_type: either 'pool_based' or 'event_based' (str)
+    #    > detect_dtmc: if True, emit the model as a dtmc when it is deterministic
+    #                   (see utils_convert.convert_process)
+    #    > fold_aux: if True, fold the aux decision states where possible
+    #                (see utils_convert.fold_aux_states); their rewards are carried 
+    #                by transition rewards
+    #    > compress: if True, collapse the deterministic chains of tasks and events
+    #                (see utils_convert.compress_chains); their rewards are carried by
+    #                transition rewards
+    #    > layout: 'modules' (one prism module per diagram module) or 'packed' (modules
+    #              never active together share a variable, see utils_convert.pack_modules)
+    #    > encode: if True, use the tight variable encoding with bool flow variables
+    #              (see utils_convert.encode_variables)
+    #    > order: if True, order the modules and variables by interaction
+    #             (see utils_convert.module_order)
+    #    > max_states: bound of the states explored by detect_dtmc
     # Output:
-    #    > prism_process_str: string describing the prism model
+    #    > result: the ConversionResult (see utils_convert); result.process_str is the
+    #              string describing the prism model
     
-    process_str = None
+    result = None
     
     if process_type == 'pool_based':
-        process_str = utils_convert.convert_process(Nall, Fall, Fmsg, None)
+        result = utils_convert.convert_process(Nall, Fall, Fmsg, None, detect_dtmc = detect_dtmc, 
+                                               fold_aux = fold_aux, compress = compress, 
+                                               layout = layout, encode = encode, order = order, 
+                                               max_states = max_states)
     elif process_type == 'event_based':
         # get matching events
         _, _, Fmsg = rem_redundancy.events_to_flows3(Nall, Fall)
         # get the rewards
         rewards_all = utils_rewards.assign_rew_process2(Timeline, Nall, Fall)
         # convert 
-        process_str = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all)
+        result = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, detect_dtmc = detect_dtmc, 
+                                               fold_aux = fold_aux, compress = compress, 
+                                               layout = layout, encode = encode, order = order, 
+                                               max_states = max_states)
     # end if
 
-    return process_str
+    return result
 # end func
 
 #%% function bpmn2prism
 
-def bpmn2prism(xml_file_process, remove_redund = True):
+def bpmn2prism(xml_file_process, remove_redund = True, detect_dtmc = False, fold_aux = False, 
+               compress = False, layout = 'modules', encode = False, order = False, 
+               max_states = 100000):
     # the main function to convert a process from BPMN into a PRISM file
     # Input:
-    #    > xml_file_process: the xml file describing the BPMN model (str)
+    #    > xml_file_process: the xml file describing the BPMN model (str), or
+    #                        the already parsed BPMNmodel (see utils_read)
     #    > remove_redund: if True, the method will try to remove redundancy in case of a
     #                     pool-based process
+    #    > detect_dtmc: if True, the model is emitted as a dtmc when it has no 
+    #                   nondeterminism (see utils_mdp.check_determinism)
+    #    > fold_aux: if True, the aux states of the decision gates are folded away
+    #                where possible (see utils_convert.fold_aux_states); with rewards 
+    #                (event-based), the folded decisions earn the rewards of the skipped 
+    #                steps as transition rewards
+    #    > compress: if True, the deterministic chains of tasks and events are collapsed 
+    #                into single states (see utils_convert.compress_chains); nodes_states
+    #                maps every node of a chain to the chain's state. With rewards 
+    #                (event-based), only the nodes with the reward of their chain are 
+    #                merged, and the skipped steps earn their rewards as transition rewards
+    #    > layout: the module layout of the prism model, 'modules' or 'packed'
+    #              (see utils_convert.pack_modules)
+    #    > encode: if True, the module states get the ranges they actually use, the flow
+    #              variables are bool, and the flows nobody waits for are dropped
+    #              (see utils_convert.encode_variables)
+    #    > order: if True, the modules and their variables are declared in an order that
+    #             keeps the interacting ones together, for smaller MTBDDs in prism
+    #             (see utils_convert.module_order)
+    #    > max_states: detect_dtmc gives up, leaving the model an mdp, after exploring
+    #                  this many states (None for no bound)
     # Output:
     #    > prism_data: the prism model description, to be dumped into a file (str)
     #    > nodes_states: data frame mapping bpmn nodes to prism states
     
+    # parse the xml file once; all readers below work on the parsed model
+    model = utils_read.read_model(xml_file_process)
+    
     # get process type (pools or events)
-    process_type = differentiator(xml_file_process)
+    process_type = differentiator(model)
     
     # read the process from xml
     if process_type == 'pool_based':
-        Nall, Fall, Fmsg = utils_read.read_process_pools(xml_file_process)
+        Nall, Fall, Fmsg = utils_read.read_process_pools(model)
         Timeline = None
+        # index the nodes once (diagram, name, type of each node)
+        node_index = utils_process.NodeIndex(Nall)
         if remove_redund:
-            Nall, Fall, Fmsg = converter(Nall, Fall, Fmsg)
+            Nall, Fall, Fmsg = converter(Nall, Fall, Fmsg, node_index)
         # end if
     else:
-        Nall, Fall, Timeline = utils_read.read_process_events(xml_file_process)
+        Nall, Fall, Timeline = utils_read.read_process_events(model)
         Fmsg = None
     # end if
     
     # generate prism description
-    prism_data = generator(Nall, Fall, Fmsg, Timeline, process_type) 
+    result = generator(Nall, Fall, Fmsg, Timeline, process_type, detect_dtmc, fold_aux, 
+                       compress, layout, encode, order, max_states) 
+    prism_data = result.process_str
     
     # finally, generate also table nodes_states that maps the BPMN diagram nodes
     # into their corresponding prism modules and states. This is very useful for
     # defining additional properties in prism
-    nodes_states = utils_convert.nodes_to_states_map(Nall, Fall, Fmsg)
+    # (derived from the conversion, the modules are not computed again)
+    nodes_states = result.nodes_states()
 
     # ready
     return prism_data, nodes_states
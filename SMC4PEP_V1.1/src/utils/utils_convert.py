@@ -5,8 +5,13 @@ utils to convert a bpmn diagram to prism
 
 #%% imports
 
+from bisect import bisect_right
+import io
+from itertools import product
+
 import numpy as np
 import matplotlib.pyplot as plt
+import networkx as nx
 import pandas as pd
 
 # own modules
@@ -654,6 +659,52 @@ def flows_to_prism_vars(Fmsg):
 # end func
 
 
+#%% function - index_flows
+
+def index_flows(Fmsg, flow_vars, Modules_all):
+    # index the flow variables by source node, target node and owning module, so that
+    # the transition generators find the flows of a node (module) without scanning Fmsg
+    # Input:
+    #    > Fmsg: the msg flows of the process
+    #    > flow_vars: dict that assigns, to each flow (evID1, evID2): fl_i
+    #                 a prism variable fl_i (see flows_to_prism_vars)
+    #    > Modules_all: list: Modules_all[diag_i] = list of dicts of type nodeID: (name, type),
+    #                   one for each module of diag_i
+    # Output:
+    #    > flow_index: dict with the following entries (all lists in the order of Fmsg):
+    #                  'source': dict of type nodeID: [fl_i, ...], the flows evID1 --> evID2
+    #                            with evID1 = nodeID (triggered when reaching nodeID)
+    #                  'target': dict of type nodeID: [fl_i, ...], the flows with
+    #                            evID2 = nodeID (that nodeID must wait for)
+    #                  'module': list: flow_index['module'][diag_i][mod_i] = [fl_i, ...], the
+    #                            flows whose evID1 belongs to the module (see helper_init_prism_mod)
+    
+    flow_index = {'source': {}, 'target': {}, 'module': []}
+    
+    # modules that contain each node (a node may belong to more than one module)
+    node_modules = {}
+    for diag_i in range(len(Modules_all)):
+        flow_index['module'].append([ [] for _ in range(len(Modules_all[diag_i])) ])
+        for mod_i in range(len(Modules_all[diag_i])):
+            for nID in Modules_all[diag_i][mod_i]:
+                node_modules.setdefault(nID, []).append((diag_i, mod_i))
+            # end for
+        # end for
+    # end for
+    
+    for fl in Fmsg:
+        evID1, evID2 = fl
+        flow_index['source'].setdefault(evID1, []).append(flow_vars[fl])
+        flow_index['target'].setdefault(evID2, []).append(flow_vars[fl])
+        for diag_i, mod_i in node_modules.get(evID1, []):
+            flow_index['module'][diag_i][mod_i].append(flow_vars[fl])
+        # end for
+    # end for
+    
+    return flow_index
+# end func
+
+
 #%% function - start_end_states
 
 def start_end_states(Modules_all):
@@ -835,7 +886,8 @@ def helper_make_trans(label, s, nID, wait_flows, s_next, nID_next, probs, trig_f
 
 #%% function - helper_init_prism_mod
 
-def helper_init_prism_mod(mod_i, Modules_i, starts_ends_i, flow_vars, Fmsg):
+def helper_init_prism_mod(mod_i, Modules_i, starts_ends_i, flow_vars, Fmsg, 
+                          flow_index = None, diag_i = None):
     # initialize a prism module with its basic information: start state, end state, etc.
     # Input:
     #    > mod_i: the module to be initialized
@@ -843,6 +895,8 @@ def helper_init_prism_mod(mod_i, Modules_i, starts_ends_i, flow_vars, Fmsg):
     #    > starts_ends_i: start-end states for the modules
     #    > flow_vars: the flow variables of the process
     #    > Fmsg: flows of the process
+    #    > flow_index, diag_i: (optional) the flow index of the process (see index_flows)
+    #                          and the diagram of the module, to avoid scanning Fmsg
     # Output:
     #    > info: dict containing the module info
     #    > flows_mod_i: list containing the flow vars that belong to mod_i - i.e.
@@ -857,6 +911,11 @@ def helper_init_prism_mod(mod_i, Modules_i, starts_ends_i, flow_vars, Fmsg):
     info = {'start_state': s_start, 'end_state': s_end, 'n_states': n_states, 'n_aux_states': 0}
     
     # get also the flow vars controlled by that module
+    if flow_index is not None and diag_i is not None:
+        flows_mod_i = list(flow_index['module'][diag_i][mod_i])
+        return info, flows_mod_i
+    # end if
+    
     flows_mod_i = []
     
     # this happens when a flow fl = evID1 --> evID2 has the evID1 in mod_i
@@ -873,16 +932,21 @@ def helper_init_prism_mod(mod_i, Modules_i, starts_ends_i, flow_vars, Fmsg):
 
 #%% function - helper_get_wait_flows
 
-def helper_get_wait_flows(nID, flow_vars, Fmsg):
+def helper_get_wait_flows(nID, flow_vars, Fmsg, flow_index = None):
     # for a node nID, find the waiting flows, that is, the nodes that must be
     # true so that the diagram can proceed after nID
     # Input:
     #    > nID: node ID
     #    > flow_vars: the flow variables of the process
     #    > Fmsg: the msg flows of the process
+    #    > flow_index: (optional) the flow index of the process (see index_flows)
     # Output:
     #    > wait_flows_nID: list of the flow vars that nID must wait for
     
+    if flow_index is not None:
+        return list( flow_index['target'].get(nID, []) )
+    # end if
+    
     wait_flows_nID = []
     
     for fl in Fmsg:
@@ -898,16 +962,21 @@ def helper_get_wait_flows(nID, flow_vars, Fmsg):
 
 #%% function - helper_get_trig_flows
 
-def helper_get_trig_flows(nID_next, flow_vars, Fmsg):
+def helper_get_trig_flows(nID_next, flow_vars, Fmsg, flow_index = None):
     # get the flow vars that get triggered (become true) when the diagram 
     # reaches node nID_next
     # Input:
     #    > nID: node ID
     #    > flow_vars: the flow variables of the process
     #    > Fmsg: the msg flows of the process
+    #    > flow_index: (optional) the flow index of the process (see index_flows)
     # Output:
     #    > trig_flows_nID_next: list of the flow vars that nID must wait for
     
+    if flow_index is not None:
+        return list( flow_index['source'].get(nID_next, []) )
+    # end if
+    
     # find the flows that get triggered when the diagram reaches nID_next
     trig_flows_nID_next = []
     for fl in Fmsg:
@@ -962,7 +1031,7 @@ def forward_trans(nID, chID, Ndiag, Fdiag):
     # Output:
     #     > is_forward: True if transition is forward (chID >= nID), False if backward
     
-    if utils_process.order_nodes(nID, chID, Ndiag, Fdiag) == (nID, chID):
+    if utils_process.is_forward_flow(nID, chID, Ndiag, Fdiag):
         # forward transition
         return True
     else:
@@ -970,14 +1039,105 @@ def forward_trans(nID, chID, Ndiag, Fdiag):
     # end if
 # end func
 
+#%% function - index_jumps
+
+def index_jumps(Ndiag, Fdiag, Fmsg, flow_vars, crit_segm_i, flow_index = None):
+    # place the heads of the message flows and the starts of the critical segments
+    # of a diagram on the diagram's BFS depths, so that the flows (segments) affected
+    # by a jump nID -> chID are found by a range query on the depths
+    # a head evID1 can only be between nID and chID (in the sense of order_nodes) if its
+    # depth is between their depths, so only those heads need to be checked
+    # Input:
+    #    > Ndiag, Fdiag: nodes and flows of the diagram
+    #    > Fmsg, flow_vars: msg flows of the process and their flow variables
+    #    > crit_segm_i: list of the critical segments of the diagram
+    #    > flow_index: (optional) the flow index of the process (see index_flows)
+    # Output:
+    #    > jump_index: dict with the start depths of the diagram ('depths') and, for 'flows'
+    #                  and 'segms', a pair (depths, entries): entries is a list of
+    #                  (position, evID1, value) sorted by depth of evID1, and depths the
+    #                  corresponding sorted list of depths. For flows, position is the flow var
+    #                  (the order of Fmsg) and value the flow var; for segments, position is
+    #                  the index in crit_segm_i and value the segment
+    
+    startID = utils_process.find_start(Ndiag)
+    if isinstance(Fdiag, utils_process.DiagFlows):
+        depths = Fdiag.distances(startID)
+    else:
+        depths = {}
+        for nID in Ndiag:
+            pathlen = utils_process.path_len(startID, nID, Ndiag, Fdiag)
+            if pathlen != -1:
+                depths[nID] = pathlen
+            # end if
+        # end for
+    # end if
+    
+    # flows: only heads reached from the start can be between two nodes
+    flow_entries = []
+    if flow_index is not None:
+        for evID1 in depths:
+            for fl_var in flow_index['source'].get(evID1, []):
+                flow_entries.append( (depths[evID1], fl_var, evID1, fl_var) )
+            # end for
+        # end for
+    else:
+        for fl in Fmsg:
+            evID1, evID2 = fl
+            if evID1 in depths:
+                flow_entries.append( (depths[evID1], flow_vars[fl], evID1, flow_vars[fl]) )
+            # end if
+        # end for
+    # end if
+    
+    # segments, in the same way
+    segm_entries = []
+    for pos in range(len(crit_segm_i)):
+        evID1, evID2 = crit_segm_i[pos]
+        if evID1 in depths:
+            segm_entries.append( (depths[evID1], pos, evID1, crit_segm_i[pos]) )
+        # end if
+    # end for
+    
+    jump_index = {'depths': depths}
+    for key, entries in [('flows', flow_entries), ('segms', segm_entries)]:
+        entries.sort(key = lambda e: (e[0], e[1]))
+        jump_index[key] = ([e[0] for e in entries], [e[1:] for e in entries])
+    # end for
+    
+    return jump_index
+# end func
+
+
+#%% function - helper_jump_range
+
+def helper_jump_range(jump_index, key, depth_low, depth_high):
+    # get the entries of a jump index with depth in (depth_low, depth_high], in the
+    # original order (of Fmsg or of the critical segments)
+    # Input:
+    #    > jump_index: see index_jumps
+    #    > key: either 'flows' or 'segms'
+    #    > depth_low, depth_high: the depth range (low excluded, high included)
+    # Output:
+    #    > entries: list of (position, evID1, value), sorted by position
+    
+    depths, entries = jump_index[key]
+    i1 = bisect_right(depths, depth_low)
+    i2 = bisect_right(depths, depth_high)
+    
+    return sorted(entries[i1:i2])
+# end func
+
+
 #%% function - helper_violated_segm
 
-def helper_violated_segm(nID, chID, crit_segm_i, Ndiag, Fdiag):
+def helper_violated_segm(nID, chID, crit_segm_i, Ndiag, Fdiag, jump_index = None):
     # find the critical segments of diag_i that get violated by the transition nID -> chID
     # Input:
     #    > nID, chID: the nod IDs of the transition nID -> chID
     #    > crit_segm_i: the critical segments of diagram i
     #    > Ndiag, Fdiag: nodes and flows of diag_i
+    #    > jump_index: (optional) the jump index of diag_i (see index_jumps)
     # Output:
     #    > violated_segm_ch: list of violated segments
     
@@ -987,6 +1147,20 @@ def helper_violated_segm(nID, chID, crit_segm_i, Ndiag, Fdiag):
         return []
     # end if
     
+    if jump_index is not None:
+        # the segment start evID1 must be in chID < evID1 <= nID
+        depths = jump_index['depths']
+        for pos, evID1, segm in helper_jump_range(jump_index, 'segms', 
+                                     depths.get(chID, -1), depths.get(nID, -1)):
+            cond1 = utils_process.is_before(evID1, nID, depths, Ndiag, Fdiag)
+            cond2 = utils_process.is_before(chID, evID1, depths, Ndiag, Fdiag)
+            if cond1 and cond2 and chID != evID1:
+                violated_segm_ch.append(segm)
+            # end if
+        # end for
+        return violated_segm_ch
+    # end if
+    
     # for all crit segments within diag_i
     for segm in crit_segm_i:
         evID1, evID2 = segm
@@ -1005,13 +1179,14 @@ def helper_violated_segm(nID, chID, crit_segm_i, Ndiag, Fdiag):
 
 #%% function - helper_trig_flows_jump
 
-def helper_trig_flows_jump(nID, chID, flow_vars, Ndiag, Fdiag, Fmsg):
+def helper_trig_flows_jump(nID, chID, flow_vars, Ndiag, Fdiag, Fmsg, jump_index = None):
     # in case of a jump (due to a decision gate) nID -> chID, find the
     # flow variables that need to be triggered or untriggered by that jump
     # Input:
     #    > nID, chID: the nod IDs of the transition nID -> chID
     #    > flow_vars: flow variables (for prism)
     #    > Ndiag, Fdiag, Fmsg: nodes and flows of diag_i, and message flows of process    
+    #    > jump_index: (optional) the jump index of diag_i (see index_jumps)
     # Output:
     #   > trig_flows_chID: list of flow vars that get triggered by the transition (e.g. set to true)
     #   > untrig_flows_chID: list of flow vars that get untriggered (set to 0) due to the jump
@@ -1022,7 +1197,7 @@ def helper_trig_flows_jump(nID, chID, flow_vars, Ndiag, Fdiag, Fmsg):
     # check if transition nID -> chID is forward or backward
     forward_trans = False
     backward_trans = False
-    if utils_process.order_nodes(nID, chID, Ndiag, Fdiag) == (nID, chID):
+    if utils_process.is_forward_flow(nID, chID, Ndiag, Fdiag):
         # forward transition
         forward_trans = True
     else:
@@ -1030,6 +1205,33 @@ def helper_trig_flows_jump(nID, chID, flow_vars, Ndiag, Fdiag, Fmsg):
         backward_trans = True
     # end if
     
+    # with the jump index, only the flows with a head between the two depths are checked
+    if jump_index is not None:
+        depths = jump_index['depths']
+        if forward_trans == True:
+            # if nID < evID1 <= chID, activate that flow
+            for pos, evID1, fl_var in helper_jump_range(jump_index, 'flows', 
+                                           depths.get(nID, -1), depths.get(chID, -1)):
+                cond1 = utils_process.is_before(nID, evID1, depths, Ndiag, Fdiag)
+                cond2 = utils_process.is_before(evID1, chID, depths, Ndiag, Fdiag)
+                if cond1 and cond2 and nID != evID1:
+                    trig_flows_chID.append(fl_var)
+                # end if
+            # end for
+        else:
+            # if evID1 > chID and evID1 <= nID, deactivate that flow
+            for pos, evID1, fl_var in helper_jump_range(jump_index, 'flows', 
+                                           depths.get(chID, -1), depths.get(nID, -1)):
+                cond1 = utils_process.is_before(evID1, nID, depths, Ndiag, Fdiag)
+                cond2 = utils_process.is_before(chID, evID1, depths, Ndiag, Fdiag)
+                if cond1 and cond2 and chID != evID1:
+                    untrig_flows_chID.append(fl_var)
+                # end if
+            # end for
+        # end if
+        return trig_flows_chID, untrig_flows_chID
+    # end if
+    
     # if transition is forward, all flows with a "head" before or at chID
     # must be activated
     if forward_trans == True:
@@ -1061,7 +1263,7 @@ def helper_trig_flows_jump(nID, chID, flow_vars, Ndiag, Fdiag, Fmsg):
 #%% function - helper_make_task_trans
 
 def helper_make_task_trans(nID, nID_next, diag_i, diag_labels, prism_mod, Mod_nodes_i, 
-                           ids2prism_i, flow_vars, Ndiag, Fdiag, Fmsg):
+                           ids2prism_i, flow_vars, Ndiag, Fdiag, Fmsg, flow_index = None):
     # helper function top make a prism transition in case nID is not fork or decision
     # Input:
     #    > nID, nID_next: node IDs of current and next node
@@ -1080,6 +1282,7 @@ def helper_make_task_trans(nID, nID_next, diag_i, diag_labels, prism_mod, Mod_no
     #                 the module, such as start state, number of states, etc
     #                 prism_mod[mod_i]['transitions'] contains a list of transitions, with various
     #                 attributes. An example: {'curr_state':.., 'next_states':..., 'probs':..., }
+    #    > flow_index: (optional) the flow index of the process (see index_flows)
     # Output:
     #    > prism_mod: appends the new transitions to the corresp prism modules
     
@@ -1089,14 +1292,14 @@ def helper_make_task_trans(nID, nID_next, diag_i, diag_labels, prism_mod, Mod_no
     s_curr = ids2prism_i[nID]['prism_state']
     
     # get the waiting flow vars of nID
-    wait_flows_nID = helper_get_wait_flows(nID, flow_vars, Fmsg)
+    wait_flows_nID = helper_get_wait_flows(nID, flow_vars, Fmsg, flow_index)
     
     # get module and prism state of child
     mod_next = Mod_nodes_i[nID_next]
     s_next = ids2prism_i[nID_next]['prism_state']
     
     # find the flows that get triggered when the diagram reaches nID_next
-    trig_flows_nID_next = helper_get_trig_flows(nID_next, flow_vars, Fmsg)
+    trig_flows_nID_next = helper_get_trig_flows(nID_next, flow_vars, Fmsg, flow_index)
     
     # case 1: transition stays inside the current module
     if mod_next == mod_curr:
@@ -1171,7 +1374,7 @@ def helper_make_task_trans(nID, nID_next, diag_i, diag_labels, prism_mod, Mod_no
 #%% function - helper_make_fork_trans
 
 def helper_make_fork_trans(nID, diag_i, diag_labels, prism_mod, Mod_nodes_i, 
-                           ids2prism_i, flow_vars, Ndiag, Fdiag, Fmsg):
+                           ids2prism_i, flow_vars, Ndiag, Fdiag, Fmsg, flow_index = None):
     # helper function top make a prism transition in case nID is a fork
     # Input:
     #    > nID, nID_next: node IDs of current and next node
@@ -1190,6 +1393,7 @@ def helper_make_fork_trans(nID, diag_i, diag_labels, prism_mod, Mod_nodes_i,
     #                 the module, such as start state, number of states, etc
     #                 prism_mod[mod_i]['transitions'] contains a list of transitions, with various
     #                 attributes. An example: {'curr_state':.., 'next_states':..., 'probs':..., }
+    #    > flow_index: (optional) the flow index of the process (see index_flows)
     # Output:
     #    > prism_mod: appends the new transitions to the corresp prism modules
     
@@ -1201,7 +1405,7 @@ def helper_make_fork_trans(nID, diag_i, diag_labels, prism_mod, Mod_nodes_i,
     s_curr = ids2prism_i[nID]['prism_state']
     
     # get the waiting flow vars of nID
-    wait_flows_nID = helper_get_wait_flows(nID, flow_vars, Fmsg)
+    wait_flows_nID = helper_get_wait_flows(nID, flow_vars, Fmsg, flow_index)
     
     # get curr node's children
     next_nodes = utils_process.get_children(nID, Ndiag, Fdiag)
@@ -1230,7 +1434,7 @@ def helper_make_fork_trans(nID, diag_i, diag_labels, prism_mod, Mod_nodes_i,
         # get prism state of next node
         s_next = ids2prism_i[chID]['prism_state']
         # find the flows that get triggered when the diagram reaches nID_next
-        trig_flows_chID = helper_get_trig_flows(chID, flow_vars, Fmsg)
+        trig_flows_chID = helper_get_trig_flows(chID, flow_vars, Fmsg, flow_index)
         
         # make trans
         trans = {}
@@ -1255,7 +1459,8 @@ def helper_make_fork_trans(nID, diag_i, diag_labels, prism_mod, Mod_nodes_i,
 #%% function - helper_make_dec_trans
 
 def helper_make_dec_trans(nID, diag_i, diag_labels, prism_mod, restart_labels, Mod_nodes_i, 
-                           ids2prism_i, flow_vars, crit_segm_i, Ndiag, Fdiag, Fmsg):
+                           ids2prism_i, flow_vars, crit_segm_i, Ndiag, Fdiag, Fmsg, flow_index = None, 
+                           jump_index = None):
     # helper function top make a prism transition in case nID is a decision gate
     # Input:
     #    > nID, nID_next: node IDs of current and next node
@@ -1276,6 +1481,8 @@ def helper_make_dec_trans(nID, diag_i, diag_labels, prism_mod, restart_labels, M
     #                 attributes. An example: {'curr_state':.., 'next_states':..., 'probs':..., }
     #    > crit_segm_i: list of type [segm1, segm2,...] listing all critical segments
     #                   contained in diag_i. Here, segm_i = (evID1_x, evID2_x) as usual
+    #    > flow_index: (optional) the flow index of the process (see index_flows)
+    #    > jump_index: (optional) the jump index of the diagram (see index_jumps)
     # Output:
     #    > prism_mod: appends the new transitions to the corresp prism modules
     #    > restart_labels: dict of the form segm: label_x, indicating the segment violated
@@ -1287,7 +1494,7 @@ def helper_make_dec_trans(nID, diag_i, diag_labels, prism_mod, restart_labels, M
     s_curr = ids2prism_i[nID]['prism_state']
     
     # get the waiting flow vars of nID
-    wait_flows_nID = helper_get_wait_flows(nID, flow_vars, Fmsg)
+    wait_flows_nID = helper_get_wait_flows(nID, flow_vars, Fmsg, flow_index)
     
     # decision gate, ugh!
     # get curr node's children
@@ -1344,11 +1551,12 @@ def helper_make_dec_trans(nID, diag_i, diag_labels, prism_mod, restart_labels, M
         s_next = ids2prism_i[chID]['prism_state']
         
         # get triggered and untriggered flows
-        trig_flows_chID, untrig_flows_chID = helper_trig_flows_jump(nID, chID, flow_vars, Ndiag, Fdiag, Fmsg)
+        trig_flows_chID, untrig_flows_chID = helper_trig_flows_jump(nID, chID, flow_vars, Ndiag, Fdiag, Fmsg, 
+                                                                    jump_index)
         
         # second, if transition goes backwards, check whether it violates some 
         # critical segment evID1 -> evID2. This happens if nID >= enID1 but chID < evID1
-        violated_segm_ch = helper_violated_segm(nID, chID, crit_segm_i, Ndiag, Fdiag)
+        violated_segm_ch = helper_violated_segm(nID, chID, crit_segm_i, Ndiag, Fdiag, jump_index)
         
         # check if transition is forward or backward
         forw_trans = forward_trans(nID, chID, Ndiag, Fdiag)
@@ -1466,7 +1674,8 @@ def helper_make_dec_trans(nID, diag_i, diag_labels, prism_mod, restart_labels, M
 #%% function - diag_modulesToPrism2
 
 def diag_modulesToPrism2(diag_i, Nall, Fall, Fmsg, Modules_i, Mod_nodes_i, starts_ends_i, 
-                        flow_vars, flow_vars_inv, ids2prism_i, prism2ids_i, crit_segm_i):
+                        flow_vars, flow_vars_inv, ids2prism_i, prism2ids_i, crit_segm_i, 
+                        flow_index = None):
     # given a diagram and it's discovered modules, we convert these modules in prism
     # Input:
     #    > diag_i: diagram number
@@ -1487,6 +1696,7 @@ def diag_modulesToPrism2(diag_i, Nall, Fall, Fmsg, Modules_i, Mod_nodes_i, start
     #    > prism2ids_i: dict of type (prism state, module no): nodeID  
     #    > crit_segm_i: list of type [segm1, segm2,...] listing all critical segments
     #                   contained in diag_i. Here, segm_i = (evID1_x, evID2_x) as usual
+    #    > flow_index: (optional) the flow index of the process (see index_flows)
     # Output:
     #    > prism_mod: list, one for each module. prism_mod[mod_i]['info'] contains info about
     #                 the module, such as start state, number of states, etc
@@ -1506,9 +1716,13 @@ def diag_modulesToPrism2(diag_i, Nall, Fall, Fmsg, Modules_i, Mod_nodes_i, start
     restart_labels = {}
     prism_mod = [ {} for _ in range(len(Modules_i)) ]
     
+    # place the msg flow heads and segment starts on the diagram depths (for jumps)
+    jump_index = index_jumps(Ndiag, Fdiag, Fmsg, flow_vars, crit_segm_i, flow_index)
+    
     for mod_i in range(len(Modules_i)):
         # init module
-        info, flows_mod_i = helper_init_prism_mod(mod_i, Modules_i, starts_ends_i, flow_vars, Fmsg)
+        info, flows_mod_i = helper_init_prism_mod(mod_i, Modules_i, starts_ends_i, flow_vars, Fmsg, 
+                                                  flow_index, diag_i)
 
         prism_mod[mod_i]['info'] = info
         prism_mod[mod_i]['transitions'] = [] # a list that will hold the module's transitions
@@ -1536,18 +1750,19 @@ def diag_modulesToPrism2(diag_i, Nall, Fall, Fmsg, Modules_i, Mod_nodes_i, start
             
             # call helper function to make the transitions for a task node
             helper_make_task_trans(nID, nID_next, diag_i, diag_labels, prism_mod, Mod_nodes_i, 
-                           ids2prism_i, flow_vars, Ndiag, Fdiag, Fmsg)
+                           ids2prism_i, flow_vars, Ndiag, Fdiag, Fmsg, flow_index)
         elif nID_type == 'end':
             # nothing is needed here (end has no further transitions), continue
             continue
         elif nID_type == 'fork':
             # call helper to handle the fork's transitions
             helper_make_fork_trans(nID, diag_i, diag_labels, prism_mod, Mod_nodes_i, 
-                           ids2prism_i, flow_vars, Ndiag, Fdiag, Fmsg)
+                           ids2prism_i, flow_vars, Ndiag, Fdiag, Fmsg, flow_index)
         elif nID_type == 'decision':
             # call helper to handle the decision gate
             helper_make_dec_trans(nID, diag_i, diag_labels, prism_mod, restart_labels, Mod_nodes_i, 
-                           ids2prism_i, flow_vars, crit_segm_i, Ndiag, Fdiag, Fmsg)
+                           ids2prism_i, flow_vars, crit_segm_i, Ndiag, Fdiag, Fmsg, flow_index, 
+                           jump_index)
         # end if
     # end for
     
@@ -1585,7 +1800,8 @@ def add_restart_trans(restart_label, prism_mod):
 #%% function - processToPrism
 
 def processToPrism(Nall, Fall, Fmsg, Modules, Mod_nodes, starts_ends, flow_vars, 
-                   flow_vars_inv, ids2prism, prism2ids, critical_segm_all, crit_segm_dep_all):
+                   flow_vars_inv, ids2prism, prism2ids, critical_segm_all, crit_segm_dep_all, 
+                   flow_index = None):
     # given a process, we convert it in prism
     # Input:
     #    > Nall, Fall: nodes and flows of the process
@@ -1608,6 +1824,8 @@ def processToPrism(Nall, Fall, Fmsg, Modules, Mod_nodes, starts_ends, flow_vars,
     #    > crit_segm_dep_all: dict of type {segm1: [diag_i, diag_j], segm2: []}
     #                     eg. for each critical segment segm1 = (evID1_x, evID2_x)
     #                     list all diagrams that depend on it, either directly or not
+    #    > flow_index: (optional) the flow index of the process (see index_flows); it is
+    #                  computed here if not given
     # Output:
     #    > prism_mod_proc: prism_mod_proc[diag_i] = list, one for each module. prism_mod[mod_i]['info'] contains 
     #                 info about the module, such as start state, number of states, etc
@@ -1619,6 +1837,11 @@ def processToPrism(Nall, Fall, Fmsg, Modules, Mod_nodes, starts_ends, flow_vars,
     prism_mod_proc = []
     restart_labels = []
     
+    # index the flow vars once (by source, target and module)
+    if flow_index is None:
+        flow_index = index_flows(Fmsg, flow_vars, Modules)
+    # end if
+    
     # for each diagram
     for diag_i in range(len(Nall)):
         # create the prism modules of that diagram and the restart labels
@@ -1627,7 +1850,7 @@ def processToPrism(Nall, Fall, Fmsg, Modules, Mod_nodes, starts_ends, flow_vars,
         prism_mod_i, restart_labels_i = diag_modulesToPrism2(diag_i, Nall, Fall, 
                         Fmsg, Modules[diag_i], Mod_nodes[diag_i], starts_ends[diag_i], 
                         flow_vars, flow_vars_inv, ids2prism[diag_i], prism2ids[diag_i], 
-                        crit_segm_i)
+                        crit_segm_i, flow_index)
         # store them
         prism_mod_proc.append(prism_mod_i.copy())
         restart_labels.append(restart_labels_i)
@@ -1654,238 +1877,1603 @@ def processToPrism(Nall, Fall, Fmsg, Modules, Mod_nodes, starts_ends, flow_vars,
 # end func
 
 
-#%% function - print_end_state
+#%% function - chain_renumbering
 
-def print_end_state(prism_mod_proc):
-    # print the end state of a process in the DAT file
-    # the end state is the goal where all diagrams - modules have finished
+def chain_renumbering(prism_mod_proc, Nall, prism2ids, rewards_all = None):
+    # find the deterministic chains of tasks and events inside the modules, and the new 
+    # state numbers once each chain is collapsed into a single state (see compress_chains)
+    # a node v is merged into the node u before it when u -> v is an unlabelled prob 1 transition
+    # that triggers no flows, v can only be entered from u, v does not wait for flows, 
+    # v is neither the start nor the end of the module, and v -> w is such a transition too;
+    # v must also earn the reward of u. The chain is represented by its first node, and 
+    # goes in one step to the state after it; the kept states are numbered in their order, 
+    # then the aux states. Nothing is modified
     # Input:
-    #    > prism_mod_proc: prism_mod_proc[diag_i] = list, one for each module. prism_mod[mod_i]['info'] contains 
-    #                 info about the module, such as start state, number of states, etc
-    #                 prism_mod[mod_i]['transitions'] contains a list of transitions, with various
-    #                 attributes. An example: {'curr_state':.., 'next_states':..., 'probs':..., }
+    #    > prism_mod_proc: the prism modules of the process (see processToPrism)
+    #    > Nall: the (BFS ordered) nodes of the process
+    #    > prism2ids: prism state -> node map (see ids_to_prism_states)
+    #    > rewards_all: (optional) list of dicts nodeID: reward, one for each diagram
     # Output:
-    #   > end_state_str: string of the end state (for prism)
+    #    > renumbers: list: renumbers[diag_i][mod_i] = (renumber, merged_into, chains), 
+    #                 where renumber[s] is the new number of state s, merged_into[v] = u 
+    #                 for each state v merged into the first state u of its chain, and
+    #                 chains[u] the states merged into u, in the chain order
     
-    end_state_str = 'label "end_state" = '
+    chain_types = ['start', 'task', 'event']
+    renumbers = []
     
-    # for all diagrams
     for diag_i in range(len(prism_mod_proc)):
-        # for all modules
+        renumbers_i = []
         for mod_i in range(len(prism_mod_proc[diag_i])):
-            # get end state of that module
-            end_state = prism_mod_proc[diag_i][mod_i]['info']['end_state']
-            # prism state specification: s{diag_i}_{mod_i}
-            end_state_str += '(s{}_{} = {}) & '.format(diag_i, mod_i, end_state)
+            prism_mod = prism_mod_proc[diag_i][mod_i]
+            info = prism_mod['info']
+            n_states = info['n_states']
+            transitions = prism_mod['transitions']
+            
+            # outgoing transitions and number of ways in, for each state
+            # (the start state is also entered by the initialisation and the restarts)
+            out_trans = {}
+            n_in = {info['start_state']: 1}
+            for trans in transitions:
+                out_trans.setdefault(trans['s'], []).append(trans)
+                for s_next in trans['s_next']:
+                    n_in[s_next] = n_in.get(s_next, 0) + 1
+                # end for
+            # end for
+            
+            def is_chain_node(s):
+                nID = prism2ids[diag_i].get((s, mod_i))
+                return nID is not None and Nall[diag_i][nID]['type'] in chain_types
+            # end func
+            
+            def node_reward(s):
+                if rewards_all is None:
+                    return 0
+                # end if
+                return rewards_all[diag_i].get(prism2ids[diag_i][(s, mod_i)], 0)
+            # end func
+            
+            def chain_next(u):
+                # the state merged into u, or None
+                if not is_chain_node(u) or len(out_trans.get(u, [])) != 1:
+                    return None
+                # end if
+                trans = out_trans[u][0]
+                if trans['label'] != '' or trans['wait_flows'] != [] or len(trans['s_next']) != 1:
+                    return None
+                # end if
+                if trans.get('trig_flows', [[]])[0] != [] or trans.get('untrig_flows', [[]])[0] != []:
+                    return None
+                # end if
+                v = trans['s_next'][0]
+                if v == u or v < 1 or v > n_states or n_in.get(v, 0) != 1 or not is_chain_node(v):
+                    return None
+                # end if
+                if v in [info['start_state'], info['end_state']]:
+                    return None
+                # end if
+                if out_trans.get(v, []) == [] or any(t['wait_flows'] != [] for t in out_trans[v]):
+                    return None
+                # end if
+                return v
+            # end func
+            
+            # follow the chains from their first state (a state that is not merged itself);
+            # the last state of a chain, and every state whose reward differs from the 
+            # first one, is kept, and starts the next chain
+            next_in_chain = {}
+            for u in range(1, n_states + 1):
+                v = chain_next(u)
+                if v is not None:
+                    next_in_chain[u] = v
+                # end if
+            # end for
+            merged_into = {}
+            chains = {}
+            for u in next_in_chain:
+                if u in next_in_chain.values():
+                    continue
+                # end if
+                head = u
+                v = next_in_chain[u]
+                while v is not None:
+                    if v in next_in_chain and node_reward(v) == node_reward(head):
+                        merged_into[v] = head
+                        chains.setdefault(head, []).append(v)
+                    else:
+                        head = v
+                    # end if
+                    v = next_in_chain.get(v)
+                # end while
+            # end for
+            
+            # renumber: the kept states in their order, then the aux states
+            renumber = {0: 0}
+            for s in range(1, n_states + info['n_aux_states'] + 1):
+                if s not in merged_into:
+                    renumber[s] = len(renumber)
+                # end if
+            # end for
+            for v in merged_into:
+                renumber[v] = renumber[merged_into[v]]
+            # end for
+            
+            renumbers_i.append((renumber, merged_into, chains))
         # end for
+        renumbers.append(renumbers_i)
     # end for
     
-    # now, end_state_str ends like end_state_str = '... & (s5_2 = 5) & '
-    # but it must end like '... & (s5_2 = 5);'
-    # so we remove the last 3 characters and append ';'
-    end_state_str = end_state_str[0:-3] + ';'
-    return end_state_str
+    return renumbers
 # end func
 
 
-#%% function - print_rewards
+#%% function - renumber_nodes
 
-def print_rewards(rewards_all, ids2prism):
-    # prints the rewards of the process in the prism DAT file
+def renumber_nodes(ids2prism, prism2ids, renumbers):
+    # move the nodes to their new states, once the chains are collapsed (see chain_renumbering)
+    # every node goes to its (chain's) new state; in the reverse map, a chain state stands 
+    # for the first node of the chain
     # Input:
-    #    > rewards_all: list with length equal to the number of diagrams; 
-    #                   rewards_all[i] is a dict of the form [nodeID] -> rew,
-    #                   containing all rewards of the diagram i 
-    #                   Computed by 'assign_rew_process2'
-    #    > ids2prism: = list: ids2prism[diag_i] = dict of type 
-    #                         nodeID: (module no, prism state)
-    # Output:
-    #    > rewards_str: string of the process rewards (for prism)
-    
-    rewards_str = 'rewards \n'
-    
-    for diag_i in range(len(rewards_all)):
-        rewards_str += '\n// diagram {} \n'.format(diag_i)
-        # for all nodes in diag_i
-        for nID in rewards_all[diag_i]:
-            # get reward
-            rew = rewards_all[diag_i][nID]
-            # get also prims state corresponding to nID
-            s_state = ids2prism[diag_i][nID]['prism_state']
-            s_mod = ids2prism[diag_i][nID]['prism_mod']
-            # if rew is not zero, append it
-            if rew != 0:
-                # prism rewards are like: s1_2 = 3: rew;
-                rewards_str += 's{}_{} = {}: {:.2f}; \n'.format(diag_i, s_mod, s_state, rew)
-            # end if
+    #    > ids2prism, prism2ids: node <-> prism state maps (see ids_to_prism_states); they
+    #                            are modified in place
+    #    > renumbers: the new state numbers of each module (see chain_renumbering)
+    
+    for diag_i in range(len(renumbers)):
+        for mod_i in range(len(renumbers[diag_i])):
+            renumber, merged_into, _ = renumbers[diag_i][mod_i]
+            heads = {}
+            for nID in ids2prism[diag_i]:
+                if ids2prism[diag_i][nID]['prism_mod'] == mod_i:
+                    s = ids2prism[diag_i][nID]['prism_state']
+                    ids2prism[diag_i][nID]['prism_state'] = renumber[s]
+                    del prism2ids[diag_i][(s, mod_i)]
+                    if s not in merged_into:
+                        heads[(renumber[s], mod_i)] = nID
+                    # end if
+                # end if
+            # end for
+            prism2ids[diag_i].update(heads)
         # end for
     # end for
-    
-    rewards_str += 'endrewards \n'
-    
-    return rewards_str
 # end func
 
 
-#%% function - print_transition
+#%% function - compress_chains
 
-def print_transition(trans, diag_i, mod_i):
-    # print out a transition for the prism dat file
-    # a transition is specified as follows:
-    # [label] s = 1 & (fl1 = 1) & (fl2 = 1) -> 
-    # 0.5:(s' = 2) & (fl3' = 1) & (fl4' = 0) + 0.5:(s' = 3);
-    # fl are the process flows that are we need to wait for, or that get triggered
-    # by the transition
+def compress_chains(prism_mod_proc, Nall, ids2prism, prism2ids, starts_ends = None, 
+                    rewards_all = None):
+    # collapse the deterministic chains of tasks and events inside the modules into single 
+    # states (see chain_renumbering), so that node-level properties still hold. The chain 
+    # takes fewer steps, and prism adds up the state rewards in every step: the transition
+    # out of a chain keeps the number of steps it skips ('skip_steps') and the merged 
+    # nodes ('skip_nodes'), whose rewards it carries (see carry_rewards). The skipped steps
+    # are taken all at once; since the merged nodes earn the reward of the first one, 
+    # any scheduler of the chain steps has one as good that does so
     # Input:
-    #    > trans: a dict containing the transition information, such as 's', 's_next',
-    #             probabilities, waiting flows, etc.
-    #    > diag_i, mod_i: the diagram and module of the transition (int)
+    #    > prism_mod_proc: the prism modules of the process (see processToPrism); they are
+    #                      modified in place
+    #    > Nall: the (BFS ordered) nodes of the process
+    #    > ids2prism, prism2ids: node <-> prism state maps (see ids_to_prism_states); they
+    #                            are modified in place
+    #    > starts_ends: (optional) start and end states of the modules (see start_end_states);
+    #                   modified in place, if given
+    #    > rewards_all: (optional) list of dicts nodeID: reward, one for each diagram; only 
+    #                   the nodes with the reward of their chain are merged
     # Output:
-    #    > trans_str: the string containing the transition
-    
-    # get transition info
-    the_label = trans['label']
-    s = trans['s']
-    wait_flows = trans['wait_flows']
-    next_states = trans['s_next']
-    probs = trans['probs']
-    if 'trig_flows' in trans:
-        trig_flows = trans['trig_flows']
-    else:
-        trig_flows = [[] for _ in range(len(next_states))]
-    # end if
-    if 'untrig_flows' in trans:
-        untrig_flows = trans['untrig_flows']
-    else:
-        untrig_flows = [[] for _ in range(len(next_states))]
-    # end if
+    #    > n_removed: list: n_removed[diag_i][mod_i] = the number of states removed 
+    #                 from that module
     
-    # start str
-    trans_str = '[{}] s{}_{} = {} '.format(the_label, diag_i, mod_i, s)
-    for fl_var in wait_flows:
-        trans_str += '& (fl{} = 1) '.format(fl_var)
-    # end for
-    trans_str += ' -> '
+    renumbers = chain_renumbering(prism_mod_proc, Nall, prism2ids, rewards_all)
+    n_removed = []
     
-    for i in range(len(next_states)):
-        pi = probs[i]
-        si = next_states[i]
-        trans_str += '{}: (s{}_{}\' = {}) '.format(pi, diag_i, mod_i, si)
-        for fl_var in trig_flows[i]:
-            trans_str += '& (fl{}\' = 1) '.format(fl_var)
-        # end for
-        for fl_var in untrig_flows[i]:
-            trans_str += '& (fl{}\' = 0) '.format(fl_var)
+    for diag_i in range(len(prism_mod_proc)):
+        n_removed_i = []
+        for mod_i in range(len(prism_mod_proc[diag_i])):
+            prism_mod = prism_mod_proc[diag_i][mod_i]
+            info = prism_mod['info']
+            renumber, merged_into, chains = renumbers[diag_i][mod_i]
+            
+            # the transitions out of a chain skip its steps
+            chain_ends = {}
+            for u in chains:
+                chain_ends[chains[u][-1]] = chains[u]
+            # end for
+            for trans in prism_mod['transitions']:
+                if trans['s'] in chain_ends:
+                    chain = chain_ends[trans['s']]
+                    trans['skip_steps'] = trans.get('skip_steps', 0) + len(chain)
+                    trans['skip_nodes'] = trans.get('skip_nodes', []) + [prism2ids[diag_i][(v, mod_i)] 
+                                                                         for v in chain]
+                # end if
+            # end for
+            
+            # drop the transitions inside the chains; the transitions out of 
+            # the chains leave from their first state
+            transitions_new = []
+            for trans in prism_mod['transitions']:
+                # (a merged state is entered only by its chain transition)
+                if len(trans['s_next']) == 1 and trans['s_next'][0] in merged_into:
+                    continue
+                # end if
+                trans['s'] = renumber[trans['s']]
+                trans['s_next'] = [renumber[s_next] for s_next in trans['s_next']]
+                transitions_new.append(trans)
+            # end for
+            prism_mod['transitions'] = transitions_new
+            
+            info['start_state'] = renumber[info['start_state']]
+            info['end_state'] = renumber[info['end_state']]
+            info['n_states'] -= len(merged_into)
+            if starts_ends is not None:
+                s_start, nID_start = starts_ends[diag_i][mod_i]['start_state']
+                s_end, nID_end = starts_ends[diag_i][mod_i]['end_state']
+                starts_ends[diag_i][mod_i]['start_state'] = (renumber[s_start], nID_start)
+                starts_ends[diag_i][mod_i]['end_state'] = (renumber[s_end], nID_end)
+                starts_ends[diag_i][mod_i]['n_states'] = info['n_states']
+            # end if
+            
+            n_removed_i.append(len(merged_into))
         # end for
-        trans_str += '+ '
+        n_removed.append(n_removed_i)
     # end for
     
-    # trans_str ends now in '(...) + ' but we want '(...);'
-    # so remove 3 last chars and append ';'
-    trans_str = trans_str[0:-3] + ';'
+    renumber_nodes(ids2prism, prism2ids, renumbers)
     
-    return trans_str
+    return n_removed
 # end func
 
 
-#%% function - print_process
+#%% function - fold_aux_states
 
-def print_process(prism_mod_proc, rewards_all, ids2prism):
-    # print out the entire process into a prism dat file
+def fold_aux_states(prism_mod_proc, rewards_all = None):
+    # fold the auxiliary states of the decision gates into the decision transitions
+    # a decision goes with prob p to an aux state, and from there with prob 1 to the child
+    # (see helper_make_dec_trans); when the aux transition has no label, and it (un)triggers
+    # no flows, the aux state is not needed, and the decision goes with prob p straight 
+    # to the child. The remaining aux states are renumbered, so that the module state
+    # ranges shrink accordingly. The decisions take one step less on the folded branches,
+    # and prism adds up the state rewards in every step: the decision keeps the probability
+    # of the skipped step in 'skip_steps', and carries its rewards (see carry_rewards).
+    # The aux state earns nothing, so only the decisions that earn nothing are folded
     # Input:
-    #    > prism_mod_proc: prism_mod_proc[diag_i] = list, one for each module. prism_mod[mod_i]['info'] contains 
-    #                 info about the module, such as start state, number of states, etc
-    #                 prism_mod[mod_i]['transitions'] contains a list of transitions, with various
-    #                 attributes. An example: {'curr_state':.., 'next_states':..., 'probs':..., }
-    #    > rewards_all: list with length equal to the number of diagrams; 
-    #                   rewards_all[i] is a dict of the form [nodeID] -> rew,
-    #                   containing all rewards of the diagram i 
-    #                   Computed by 'assign_rew_process2'
-    #    > ids2prism: = list: ids2prism[diag_i] = dict of type 
-    #                         nodeID: (module no, prism state)
+    #    > prism_mod_proc: the prism modules of the process (see processToPrism); they
+    #                      are modified in place
+    #    > rewards_all: (optional) list of dicts nodeID: reward, one for each diagram
     # Output:
-    #    > process_str: string of the process rewards (for prism)   
-    
-    process_str = 'mdp \n\n'
-    
-    # print end state
-    end_state_str = print_end_state(prism_mod_proc)
+    #    > n_removed: list: n_removed[diag_i][mod_i] = the number of aux states removed 
+    #                 from that module
     
-    process_str += end_state_str + '\n\n'
+    n_removed = []
     
-    # print also rewards if they excist
-    if rewards_all is not None:
-        rewards_str = print_rewards(rewards_all, ids2prism)
-        process_str += rewards_str + '\n\n'
-    # end if
-    
-    # for all diagrams
     for diag_i in range(len(prism_mod_proc)):
-        # for all modules
-        process_str += '// diagram {} \n'.format(diag_i)
+        n_removed_i = []
         for mod_i in range(len(prism_mod_proc[diag_i])):
-            module_str = ''
-            # get start state of mod_i, etc.
-            s_start = prism_mod_proc[diag_i][mod_i]['info']['start_state']
-            n_states = prism_mod_proc[diag_i][mod_i]['info']['n_states']
-            n_aux_states = prism_mod_proc[diag_i][mod_i]['info']['n_aux_states']
-            n_total_states = n_states + n_aux_states
-            flow_vars = prism_mod_proc[diag_i][mod_i]['flow_vars']
-            restart_labels = prism_mod_proc[diag_i][mod_i]['restart_labels']
+            prism_mod = prism_mod_proc[diag_i][mod_i]
+            n_states = prism_mod['info']['n_states']
+            transitions = prism_mod['transitions']
             
-            # def module header (variable declatations etc)
-            module_str += 'module M{}_{} \n'.format(diag_i, mod_i) # e.g. module M1_2
-            # e.g s1_2: [0..5] init 1;
-            module_str += 's{}_{}: [{}..{}] init {}; \n'.format(diag_i, mod_i, 0, n_total_states, s_start)
+            # the transitions leaving each aux state, and the decision entering it
+            aux_trans = {}
+            aux_dec = {}
+            for trans in transitions:
+                if trans['s'] > n_states:
+                    aux_trans.setdefault(trans['s'], []).append(trans)
+                # end if
+                for s_next in trans['s_next']:
+                    if s_next > n_states:
+                        aux_dec[s_next] = trans['nID']
+                    # end if
+                # end for
+            # end for
             
-            # now, we need also to declare the flow vars that belong to the module
-            for fl_var in flow_vars:
-                module_str += 'fl{}: [{}..{}] init 0; \n'.format(fl_var, 0, 1)
+            def dec_reward(s_aux):
+                if rewards_all is None:
+                    return 0
+                # end if
+                return rewards_all[diag_i].get(aux_dec.get(s_aux), 0)
+            # end func
+            
+            # the aux states that can be folded, and where they lead to
+            folded = {}
+            for s_aux in aux_trans:
+                if len(aux_trans[s_aux]) != 1:
+                    continue
+                # end if
+                trans = aux_trans[s_aux][0]
+                if trans['label'] != '' or trans['wait_flows'] != [] or len(trans['s_next']) != 1:
+                    continue
+                # end if
+                if trans.get('trig_flows', [[]])[0] != [] or trans.get('untrig_flows', [[]])[0] != []:
+                    continue
+                # end if
+                if dec_reward(s_aux) != 0:
+                    continue
+                # end if
+                folded[s_aux] = (trans['s_next'][0], trans['nID_next'][0])
             # end for
-            module_str += '\n'
             
-            # next, print out all transitions of the module
-            for trans in prism_mod_proc[diag_i][mod_i]['transitions']:
-                module_str += print_transition(trans, diag_i, mod_i) + '\n'
+            # renumber the remaining aux states
+            renumber = {}
+            for s_aux in sorted(aux_trans):
+                if s_aux not in folded:
+                    renumber[s_aux] = n_states + len(renumber) + 1
+                # end if
             # end for
             
-            # finally, print also all restarting transitions, based on the restart labels
-            # these are transitions in the form [restart_label] s >= 0 -> 1: (s' = s_start)
-            for the_label in restart_labels:
-                module_str += '[{}] s{}_{} >= 0 -> 1:(s{}_{}\' = {}); \n'.format(the_label, diag_i, mod_i, diag_i, mod_i, s_start)
+            # redirect the decisions, and drop the transitions of the folded aux states
+            transitions_new = []
+            for trans in transitions:
+                if trans['s'] in folded:
+                    continue
+                # end if
+                trans['s'] = renumber.get(trans['s'], trans['s'])
+                s_next = list(trans['s_next'])
+                nID_next = list(trans['nID_next'])
+                skip = 0.0
+                for i in range(len(s_next)):
+                    if s_next[i] in folded:
+                        s_next[i], nID_next[i] = folded[s_next[i]]
+                        skip += float(trans['probs'][i])
+                    else:
+                        s_next[i] = renumber.get(s_next[i], s_next[i])
+                    # end if
+                # end for
+                trans['s_next'] = s_next
+                trans['nID_next'] = nID_next
+                if skip > 0:
+                    trans['skip_steps'] = trans.get('skip_steps', 0) + skip
+                # end if
+                transitions_new.append(trans)
             # end for
             
-            # ready, close module
-            module_str += 'endmodule \n\n\n'
-            process_str += module_str
+            prism_mod['transitions'] = transitions_new
+            prism_mod['info']['n_aux_states'] -= len(folded)
+            n_removed_i.append(len(folded))
         # end for
+        n_removed.append(n_removed_i)
     # end for
     
-    # ready
-    return process_str
+    return n_removed
 # end func
 
 
-#%% function convert_process
+#%% function - module_fork_paths
 
-def convert_process(Nall, Fall, Fmsg, rewards_all):
-    # a function thast converts a process to a prism file, combining the above methods
+def module_fork_paths(Ndiag, Fdiag, Modules_i, Mod_nodes_i):
+    # place the modules of a diagram (see diag_to_modules2) in the fork/join nesting
+    # the path of a module is the list of (fork ID, branch node ID) of the forks it lies in, 
+    # from the outermost one: the start module has path [], a fork branch the path of the
+    # fork's module plus (fork, branch), and a join module the common part of the paths of
+    # the modules going to the join (the join closes the fork the branches came from)
     # Input:
-    #    > Nall, Fall, Fmsg: the process nodes and flows and msg
-    #    > list of dics of type nodeID: reward, one for ach diagram
+    #    > Ndiag, Fdiag: nodes and flows of the diagram
+    #    > Modules_i, Mod_nodes_i: the modules of the diagram (see diag_to_modules2)
     # Output:
-    #    > process_str: a str describing the generated dat file
+    #    > paths: list, paths[mod_i] = the path of mod_i
+    #    > unstructured: set of the modules entered or left by a decision that jumps 
+    #                    to another nesting, whose activity the paths do not describe
     
-    # assign a prism variable to each flow
-    flow_vars, flow_vars_inv = flows_to_prism_vars(Fmsg)
+    # the node each module starts with, and how it is entered
+    entries = []
+    for mod_i in range(len(Modules_i)):
+        entry = None
+        for nID in Modules_i[mod_i]:
+            nID_type = Ndiag[nID]['type']
+            if nID_type in ['start', 'join']:
+                entry = (nID_type, nID, None)
+                break
+            # end if
+            for parID in utils_process.get_parents(nID, Ndiag, Fdiag):
+                if Ndiag[parID]['type'] == 'fork' and Mod_nodes_i[parID] != mod_i:
+                    entry = ('branch', nID, parID)
+                # end if
+            # end for
+            if entry is not None:
+                break
+            # end if
+        # end for
+        entries.append(entry)
+    # end for
     
-    # order diagram nodes in BFS way (for convenience)
-    Nall, _ = utils_process.order_process_nodes(Nall, Fall)
+    paths = [None for _ in range(len(Modules_i))]
     
-    # convert process to modules
-    Modules_all, Mod_nodes_all = process_to_modules2(Nall, Fall)
+    def get_path(mod_i, visiting):
+        # the path of mod_i; modules on a loop back to it are skipped
+        if paths[mod_i] is not None:
+            return paths[mod_i]
+        # end if
+        visiting = visiting | {mod_i}
+        entry = entries[mod_i]
+        path = []
+        if entry is not None and entry[0] == 'branch':
+            _, nID, forkID = entry
+            path = get_path(Mod_nodes_i[forkID], visiting) + [(forkID, nID)]
+        elif entry is not None and entry[0] == 'join':
+            in_paths = []
+            for parID in utils_process.get_parents(entry[1], Ndiag, Fdiag):
+                mod_par = Mod_nodes_i[parID]
+                if mod_par not in visiting:
+                    in_paths.append(get_path(mod_par, visiting))
+                # end if
+            # end for
+            if in_paths != []:
+                path = in_paths[0]
+                for path_in in in_paths[1:]:
+                    n_common = 0
+                    while n_common < min(len(path), len(path_in)) and path[n_common] == path_in[n_common]:
+                        n_common += 1
+                    # end while
+                    path = path[:n_common]
+                # end for
+            # end if
+        # end if
+        paths[mod_i] = path
+        return path
+    # end func
     
-    # get start and end states for modules
+    for mod_i in range(len(Modules_i)):
+        get_path(mod_i, set())
+    # end for
+    
+    # decisions that jump straight into a module of another nesting
+    unstructured = set()
+    for nID in Ndiag:
+        if Ndiag[nID]['type'] != 'decision':
+            continue
+        # end if
+        for chID in utils_process.get_children(nID, Ndiag, Fdiag):
+            mod_curr = Mod_nodes_i[nID]
+            mod_next = Mod_nodes_i[chID]
+            if Ndiag[chID]['type'] != 'join' and paths[mod_curr] != paths[mod_next]:
+                unstructured.update([mod_curr, mod_next])
+            # end if
+        # end for
+    # end for
+    
+    return paths, unstructured
+# end func
+
+
+#%% function - modules_exclusive
+
+def modules_exclusive(path_a, path_b):
+    # whether two modules with these fork paths (see module_fork_paths) are never active
+    # at the same time: this is the case unless they lie in different branches of 
+    # the same fork
+    for (fork_a, branch_a), (fork_b, branch_b) in zip(path_a, path_b):
+        if fork_a != fork_b:
+            # forks one after the other
+            return True
+        # end if
+        if branch_a != branch_b:
+            # parallel branches
+            return False
+        # end if
+    # end for
+    # one path contains the other: the outer module waits while the inner one runs
+    return True
+# end func
+
+
+#%% function - pack_group
+
+def pack_group(prism_mod_i, members):
+    # pack mutually exclusive modules of a diagram into one module with one state variable
+    # member k keeps its states 1..n_k, shifted past the states of the members before it, 
+    # and the idle state 0 is shared; the commands synchronised on a label within the 
+    # group are combined into single commands (see pack_modules)
+    # Input:
+    #    > prism_mod_i: the prism modules of the diagram (see processToPrism)
+    #    > members: list of the module numbers to pack
+    # Output:
+    #    > prism_mod: the packed module (same form as the modules of processToPrism)
+    #    > offsets: dict mod_i: the shift of the states of mod_i
+    #    > conflicts: list of pairs of members that turned out to be active together
+    #                 (e.g. a restart that starts one member while another one jumps);
+    #                 if not empty, prism_mod is not valid
+    
+    offsets = {}
+    n_total = 0
+    for mod_i in members:
+        offsets[mod_i] = n_total
+        info = prism_mod_i[mod_i]['info']
+        n_total += info['n_states'] + info['n_aux_states']
+    # end for
+    
+    def enc(mod_i, s):
+        return 0 if s == 0 else offsets[mod_i] + s
+    # end func
+    
+    conflicts = []
+    
+    def single_active(values):
+        # the packed value of (member, value) pairs, where at most one is not idle
+        active = [(mod_i, s) for mod_i, s in values if s != 0]
+        for k in range(1, len(active)):
+            conflicts.append((active[0][0], active[k][0]))
+        # end for
+        return enc(*active[0]) if active != [] else 0
+    # end func
+    
+    # the options of each member for each label: its labelled transitions, 
+    # and None for the restart (s >= 0 -> s_start)
+    label_options = {}
+    transitions = []
+    for mod_i in members:
+        for trans in prism_mod_i[mod_i]['transitions']:
+            if trans['label'] == '':
+                if trans['s'] == 0:
+                    conflicts.extend([(mod_i, mod_j) for mod_j in members if mod_j != mod_i])
+                    continue
+                # end if
+                trans_new = dict(trans)
+                trans_new['s'] = enc(mod_i, trans['s'])
+                trans_new['s_next'] = [enc(mod_i, s_next) for s_next in trans['s_next']]
+                transitions.append(trans_new)
+            else:
+                label_options.setdefault(trans['label'], {}).setdefault(mod_i, []).append(trans)
+            # end if
+        # end for
+        for the_label in prism_mod_i[mod_i]['restart_labels']:
+            label_options.setdefault(the_label, {}).setdefault(mod_i, []).append(None)
+        # end for
+    # end for
+    
+    starts = [(mod_i, prism_mod_i[mod_i]['info']['start_state']) for mod_i in members]
+    ends = [(mod_i, prism_mod_i[mod_i]['info']['end_state']) for mod_i in members]
+    s_start = single_active(starts)
+    s_end = single_active(ends)
+    restart_labels = []
+    
+    # combine the commands of the members moving on the same label
+    for the_label in label_options:
+        mods = list(label_options[the_label])
+        for combo in product(*[label_options[the_label][mod_i] for mod_i in mods]):
+            if all(trans is None for trans in combo):
+                # all members restart
+                restart_labels.append(the_label)
+                continue
+            # end if
+            
+            # guard: at most one member can be away from idle
+            guard = [(mod_i, trans['s']) for mod_i, trans in zip(mods, combo) 
+                     if trans is not None and trans['s'] != 0]
+            if len(guard) > 1:
+                # never enabled, the members are never active together
+                continue
+            # end if
+            
+            wait_flows = []
+            branch_lists = []
+            for mod_i, trans in zip(mods, combo):
+                if trans is None:
+                    branch_lists.append([(1.0, mod_i, starts[members.index(mod_i)][1], [], [])])
+                    continue
+                # end if
+                wait_flows += [fl for fl in trans['wait_flows'] if fl not in wait_flows]
+                n_next = len(trans['s_next'])
+                trig_flows = trans.get('trig_flows', [[] for _ in range(n_next)])
+                untrig_flows = trans.get('untrig_flows', [[] for _ in range(n_next)])
+                branch_lists.append([(trans['probs'][i], mod_i, trans['s_next'][i], 
+                                      trig_flows[i], untrig_flows[i]) for i in range(n_next)])
+            # end for
+            
+            trans_new = {'label': the_label, 'nID': None, 'wait_flows': wait_flows, 
+                         's_next': [], 'nID_next': [], 'probs': [], 'trig_flows': [], 
+                         'untrig_flows': []}
+            if guard != []:
+                trans_new['s'] = enc(*guard[0])
+            else:
+                # all from idle: the move must start a member, otherwise the
+                # guard cannot tell the members apart
+                trans_new['s'] = 0
+            # end if
+            for branches in product(*branch_lists):
+                prob = 1.0
+                for branch in branches:
+                    prob *= branch[0]
+                # end for
+                s_next = single_active([(branch[1], branch[2]) for branch in branches])
+                if guard == [] and s_next == 0:
+                    conflicts.extend([(mods[0], mod_j) for mod_j in members if mod_j != mods[0]])
+                # end if
+                trans_new['s_next'].append(s_next)
+                trans_new['nID_next'].append(None)
+                trans_new['probs'].append(prob)
+                trans_new['trig_flows'].append([fl for branch in branches for fl in branch[3]])
+                trans_new['untrig_flows'].append([fl for branch in branches for fl in branch[4]])
+            # end for
+            # the steps skipped by the members' commands (see compress_chains)
+            skipped = [trans for trans in combo if trans is not None and 'skip_steps' in trans]
+            if skipped != []:
+                trans_new['skip_steps'] = sum(trans['skip_steps'] for trans in skipped)
+                trans_new['skip_nodes'] = [nID for trans in skipped for nID in trans.get('skip_nodes', [])]
+            # end if
+            transitions.append(trans_new)
+        # end for
+    # end for
+    
+    flow_vars = []
+    for mod_i in members:
+        flow_vars += prism_mod_i[mod_i]['flow_vars']
+    # end for
+    
+    prism_mod = {'info': {'start_state': s_start, 'end_state': s_end, 'n_states': n_total, 
+                          'n_aux_states': 0},
+                 'transitions': transitions, 'flow_vars': flow_vars, 
+                 'restart_labels': restart_labels}
+    
+    return prism_mod, offsets, conflicts
+# end func
+
+
+#%% function - pack_modules
+
+def pack_modules(prism_mod_proc, Nall, Fall, Modules_all, Mod_nodes_all, ids2prism):
+    # an alternative module layout: the modules of a diagram that are never active at 
+    # the same time (see modules_exclusive) share one module and one state variable, 
+    # with disjoint value ranges (see pack_group). The modules are grouped greedily, in
+    # their order; when combining the commands of a group shows that two members are 
+    # active together after all, they are separated and the diagram is grouped again
+    # Input:
+    #    > prism_mod_proc: the prism modules of the process (see processToPrism)
+    #    > Nall, Fall: the (BFS ordered) nodes and flows of the process
+    #    > Modules_all, Mod_nodes_all: the modules of each diagram (see process_to_modules2)
+    #    > ids2prism: the node -> prism state map (see ids_to_prism_states)
+    # Output:
+    #    > prism_mod_packed: the packed prism modules, in the form of prism_mod_proc
+    #    > ids2prism_packed, prism2ids_packed: the node <-> prism state maps of the packed
+    #                                         modules (see ids_to_prism_states)
+    #    > groups: list: groups[diag_i] = list of the module lists packed together
+    
+    prism_mod_packed = []
+    ids2prism_packed = [{} for _ in range(len(prism_mod_proc))]
+    prism2ids_packed = [{} for _ in range(len(prism_mod_proc))]
+    groups = []
+    
+    for diag_i in range(len(prism_mod_proc)):
+        paths, unstructured = module_fork_paths(Nall[diag_i], Fall[diag_i], Modules_all[diag_i], 
+                                                Mod_nodes_all[diag_i])
+        n_mod = len(prism_mod_proc[diag_i])
+        separated = set()
+        
+        while True:
+            # greedy grouping
+            groups_i = []
+            for mod_i in range(n_mod):
+                placed = False
+                for group in groups_i:
+                    if mod_i in unstructured or any(mod_j in unstructured for mod_j in group):
+                        continue
+                    # end if
+                    if all(modules_exclusive(paths[mod_i], paths[mod_j]) and 
+                           (mod_i, mod_j) not in separated for mod_j in group):
+                        group.append(mod_i)
+                        placed = True
+                        break
+                    # end if
+                # end for
+                if not placed:
+                    groups_i.append([mod_i])
+                # end if
+            # end for
+            
+            # pack the groups
+            packed_i = []
+            offsets_i = []
+            conflicts = []
+            for group in groups_i:
+                prism_mod, offsets, group_conflicts = pack_group(prism_mod_proc[diag_i], group)
+                packed_i.append(prism_mod)
+                offsets_i.append(offsets)
+                conflicts += group_conflicts
+            # end for
+            if conflicts == []:
+                break
+            # end if
+            for mod_i, mod_j in conflicts:
+                separated.update([(mod_i, mod_j), (mod_j, mod_i)])
+            # end for
+        # end while
+        
+        # the new module and state of every node
+        group_of = {}
+        for group_no in range(len(groups_i)):
+            for mod_i in groups_i[group_no]:
+                group_of[mod_i] = group_no
+            # end for
+        # end for
+        for nID in ids2prism[diag_i]:
+            mod_i = ids2prism[diag_i][nID]['prism_mod']
+            s = ids2prism[diag_i][nID]['prism_state']
+            group_no = group_of[mod_i]
+            s_new = 0 if s == 0 else offsets_i[group_no][mod_i] + s
+            ids2prism_packed[diag_i][nID] = {'prism_state': s_new, 'prism_mod': group_no}
+            prism2ids_packed[diag_i].setdefault((s_new, group_no), nID)
+        # end for
+        
+        prism_mod_packed.append(packed_i)
+        groups.append(groups_i)
+    # end for
+    
+    return prism_mod_packed, ids2prism_packed, prism2ids_packed, groups
+# end func
+
+
+#%% function - encode_variables
+
+def encode_variables(prism_mod_proc):
+    # tighten the encoding of the prism variables: the range of each module state is cut
+    # down to the values the module actually uses (its start and end, and the states its 
+    # transitions leave from or go to; e.g. some modules are never idle), and the flow
+    # variables that no transition waits for are dropped, along with their updates; the 
+    # remaining flow variables can then be written as bool (see write_process)
+    # Input:
+    #    > prism_mod_proc: the prism modules of the process (see processToPrism); they are
+    #                      modified in place: info['state_low'] and info['state_high'] hold 
+    #                      the new range of each module state
+    # Output:
+    #    > encoding: dict with
+    #                'ranges': ranges[diag_i][mod_i] = (low, high) of the module state
+    #                'dropped_flows': list of the flow variables dropped
+    #                'bits_before', 'bits_after': the bits of the state vector, with the
+    #                                             declared ranges before and after
+    #                'bits_saved': bits_before - bits_after; 0 when no range shrinks to a
+    #                              lower power of two and no flow is dropped, which is the
+    #                              case for many processes (only the flows become bool)
+    #                'ranges_tightened': the number of module states whose range shrank
+    
+    # the flow variables somebody waits for
+    waited = set()
+    for diag_i in range(len(prism_mod_proc)):
+        for prism_mod in prism_mod_proc[diag_i]:
+            for trans in prism_mod['transitions']:
+                waited.update(trans['wait_flows'])
+            # end for
+        # end for
+    # end for
+    
+    ranges = []
+    dropped_flows = []
+    bits_before = 0
+    bits_after = 0
+    for diag_i in range(len(prism_mod_proc)):
+        ranges_i = []
+        for prism_mod in prism_mod_proc[diag_i]:
+            info = prism_mod['info']
+            n_total_states = info['n_states'] + info['n_aux_states']
+            
+            # the values the module state takes
+            values = {info['start_state'], info['end_state']}
+            for trans in prism_mod['transitions']:
+                values.add(trans['s'])
+                values.update(trans['s_next'])
+            # end for
+            info['state_low'] = int(min(values))
+            info['state_high'] = int(max(values))
+            ranges_i.append((info['state_low'], info['state_high']))
+            
+            # drop the flows nobody waits for
+            dropped = [fl_var for fl_var in prism_mod['flow_vars'] if fl_var not in waited]
+            if dropped != []:
+                prism_mod['flow_vars'] = [fl_var for fl_var in prism_mod['flow_vars'] 
+                                          if fl_var in waited]
+                dropped_flows += dropped
+            # end if
+            
+            bits_before += int(np.ceil(np.log2(n_total_states + 1))) + len(prism_mod['flow_vars']) + len(dropped)
+            bits_after += int(np.ceil(np.log2(info['state_high'] - info['state_low'] + 1))) + len(prism_mod['flow_vars'])
+        # end for
+        ranges.append(ranges_i)
+    # end for
+    
+    # and their updates
+    if dropped_flows != []:
+        for diag_i in range(len(prism_mod_proc)):
+            for prism_mod in prism_mod_proc[diag_i]:
+                for trans in prism_mod['transitions']:
+                    for key in ['trig_flows', 'untrig_flows']:
+                        if key in trans:
+                            trans[key] = [[fl_var for fl_var in flows if fl_var in waited] 
+                                          for flows in trans[key]]
+                        # end if
+                    # end for
+                # end for
+            # end for
+        # end for
+    # end if
+    
+    n_tightened = sum(1 for diag_i in range(len(prism_mod_proc)) 
+                      for mod_i, prism_mod in enumerate(prism_mod_proc[diag_i])
+                      if ranges[diag_i][mod_i] != (0, prism_mod['info']['n_states'] + prism_mod['info']['n_aux_states']))
+    return {'ranges': ranges, 'dropped_flows': dropped_flows, 
+            'bits_before': bits_before, 'bits_after': bits_after, 
+            'bits_saved': bits_before - bits_after, 'ranges_tightened': n_tightened}
+# end func
+
+
+#%% function - interaction_graph
+
+def interaction_graph(prism_mod_proc):
+    # the interaction graph of the prism modules: two modules are linked if one of them
+    # waits for or updates a flow variable of the other, or if they synchronise on a 
+    # label (the restart labels included)
+    # Input:
+    #    > prism_mod_proc: the prism modules of the process (see processToPrism)
+    # Output:
+    #    > G: networkx graph with a node (diag_i, mod_i) for each module; the weight of an
+    #         edge counts the flow variables and labels the two modules share
+    
+    G = nx.Graph()
+    owner = {}
+    label_mods = {}
+    for diag_i in range(len(prism_mod_proc)):
+        for mod_i in range(len(prism_mod_proc[diag_i])):
+            prism_mod = prism_mod_proc[diag_i][mod_i]
+            G.add_node((diag_i, mod_i))
+            for fl_var in prism_mod['flow_vars']:
+                owner[fl_var] = (diag_i, mod_i)
+            # end for
+            labels = [trans['label'] for trans in prism_mod['transitions']] + list(prism_mod['restart_labels'])
+            for the_label in labels:
+                if the_label != '':
+                    mods = label_mods.setdefault(the_label, [])
+                    if (diag_i, mod_i) not in mods:
+                        mods.append((diag_i, mod_i))
+                    # end if
+                # end if
+            # end for
+        # end for
+    # end for
+    
+    def link(a, b):
+        if a != b:
+            w = G[a][b]['weight'] if G.has_edge(a, b) else 0
+            G.add_edge(a, b, weight = w + 1)
+        # end if
+    # end func
+    
+    # the flow variables, each one once for every module that reads or writes it
+    for diag_i in range(len(prism_mod_proc)):
+        for mod_i in range(len(prism_mod_proc[diag_i])):
+            used = set()
+            for trans in prism_mod_proc[diag_i][mod_i]['transitions']:
+                used.update(trans['wait_flows'])
+                for key in ['trig_flows', 'untrig_flows']:
+                    for flows in trans.get(key, []):
+                        used.update(flows)
+                    # end for
+                # end for
+            # end for
+            for fl_var in sorted(used):
+                if fl_var in owner:
+                    link((diag_i, mod_i), owner[fl_var])
+                # end if
+            # end for
+        # end for
+    # end for
+    
+    # the synchronising labels
+    for the_label in label_mods:
+        mods = label_mods[the_label]
+        for a in range(len(mods)):
+            for b in range(a + 1, len(mods)):
+                link(mods[a], mods[b])
+            # end for
+        # end for
+    # end for
+    
+    return G
+# end func
+
+
+#%% function - order_bandwidth
+
+def order_bandwidth(G, modules):
+    # the bandwidth of a module order: the largest distance, in the order, between two
+    # interacting modules (see interaction_graph)
+    # Input:
+    #    > G: the interaction graph of the modules
+    #    > modules: list of the modules (diag_i, mod_i), in the order they are declared
+    # Output:
+    #    > bandwidth: int
+    
+    pos = {mod: k for k, mod in enumerate(modules)}
+    return max([abs(pos[a] - pos[b]) for a, b in G.edges()], default = 0)
+# end func
+
+
+#%% function - module_order
+
+def module_order(prism_mod_proc):
+    # an order of the prism modules and variables that keeps the interacting ones close
+    # together, which is what the symbolic engines of prism want (the variables are 
+    # ordered as they are declared). The modules are ordered by reverse Cuthill-McKee on 
+    # their interaction graph; within a module, the flow variables go next to the modules
+    # that read them: before the module state if these come earlier, after it otherwise.
+    # A flow variable is always declared in the module that updates it, so only the
+    # modules themselves move
+    # Input:
+    #    > prism_mod_proc: the prism modules of the process (see processToPrism)
+    # Output:
+    #    > ordering: dict with
+    #                'modules': list of (diag_i, mod_i), in the order to declare them
+    #                'flows': flows[(diag_i, mod_i)] = (flows declared before the module
+    #                         state, flows declared after it)
+    #                'bandwidth_before', 'bandwidth_after': the bandwidth of the diagram 
+    #                         order and of the new order (see order_bandwidth)
+    
+    G = interaction_graph(prism_mod_proc)
+    default = list(G.nodes())
+    modules = list(nx.utils.reverse_cuthill_mckee_ordering(G))
+    pos = {mod: k for k, mod in enumerate(modules)}
+    
+    # the modules reading each flow variable
+    readers = {}
+    for diag_i in range(len(prism_mod_proc)):
+        for mod_i in range(len(prism_mod_proc[diag_i])):
+            for trans in prism_mod_proc[diag_i][mod_i]['transitions']:
+                for fl_var in trans['wait_flows']:
+                    readers.setdefault(fl_var, set()).add((diag_i, mod_i))
+                # end for
+            # end for
+        # end for
+    # end for
+    
+    flows = {}
+    for diag_i, mod_i in modules:
+        p = pos[(diag_i, mod_i)]
+        keys = {}
+        for fl_var in prism_mod_proc[diag_i][mod_i]['flow_vars']:
+            others = [pos[mod] for mod in readers.get(fl_var, []) if mod != (diag_i, mod_i)]
+            keys[fl_var] = np.mean(others) if others != [] else p
+        # end for
+        # sort keeps the declaration order on ties
+        fl_sorted = sorted(keys, key = lambda fl_var: keys[fl_var])
+        flows[(diag_i, mod_i)] = ([fl_var for fl_var in fl_sorted if keys[fl_var] < p], 
+                                  [fl_var for fl_var in fl_sorted if keys[fl_var] >= p])
+    # end for
+    
+    return {'modules': modules, 'flows': flows, 
+            'bandwidth_before': order_bandwidth(G, default), 
+            'bandwidth_after': order_bandwidth(G, modules)}
+# end func
+
+
+#%% function - write_end_state
+
+def write_end_state(stream, prism_mod_proc):
+    # write the end state of a process in the DAT file
+    # the end state is the goal where all diagrams - modules have finished
+    # Input:
+    #    > stream: a text stream to write to (anything with a write(str) method, 
+    #              e.g. an open file)
+    #    > prism_mod_proc: prism_mod_proc[diag_i] = list, one for each module. prism_mod[mod_i]['info'] contains 
+    #                 info about the module, such as start state, number of states, etc
+    #                 prism_mod[mod_i]['transitions'] contains a list of transitions, with various
+    #                 attributes. An example: {'curr_state':.., 'next_states':..., 'probs':..., }
+    
+    # one term for each module, e.g. (s5_2 = 5)
+    # prism state specification: s{diag_i}_{mod_i}
+    end_states = []
+    for diag_i in range(len(prism_mod_proc)):
+        for mod_i in range(len(prism_mod_proc[diag_i])):
+            end_state = prism_mod_proc[diag_i][mod_i]['info']['end_state']
+            end_states.append('(s{}_{} = {})'.format(diag_i, mod_i, end_state))
+        # end for
+    # end for
+    
+    # the terms are joined like '... & (s5_2 = 5);'
+    if end_states == []:
+        stream.write('label "end_state";')
+    else:
+        stream.write('label "end_state" = ' + ' & '.join(end_states) + ';')
+    # end if
+# end func
+
+
+#%% function - print_end_state
+
+def print_end_state(prism_mod_proc):
+    # print the end state of a process in the DAT file (see write_end_state)
+    # Input:
+    #    > prism_mod_proc: the prism modules of the process (see write_end_state)
+    # Output:
+    #   > end_state_str: string of the end state (for prism)
+    
+    stream = io.StringIO()
+    write_end_state(stream, prism_mod_proc)
+    return stream.getvalue()
+# end func
+
+
+#%% function - carry_rewards
+
+def carry_rewards(prism_mod_proc, rewards_all):
+    # the transitions that skip steps of the model (see compress_chains, fold_aux_states)
+    # carry the rewards of those steps as prism transition rewards (see skipped_rewards);
+    # a transition reward is given to an action, so each such unlabelled transition gets 
+    # a label of its own, r{diag_i}_{mod_i}_{cnt}, which no other module synchronises on.
+    # Nothing to carry, and no label, if the process has no rewards
+    # Input:
+    #    > prism_mod_proc: the prism modules of the process; the labels are set in place
+    #    > rewards_all: list of dicts nodeID: reward, one for each diagram, or None
+    # Output:
+    #    > n_carriers: the number of transitions that carry rewards
+    
+    if not has_rewards(rewards_all):
+        return 0
+    # end if
+    
+    n_carriers = 0
+    for diag_i in range(len(prism_mod_proc)):
+        for mod_i in range(len(prism_mod_proc[diag_i])):
+            cnt = 0
+            for trans in prism_mod_proc[diag_i][mod_i]['transitions']:
+                if trans.get('skip_steps', 0) == 0:
+                    continue
+                # end if
+                if trans['label'] == '':
+                    trans['label'] = 'r{}_{}_{}'.format(diag_i, mod_i, cnt)
+                    cnt += 1
+                # end if
+                n_carriers += 1
+            # end for
+        # end for
+    # end for
+    
+    return n_carriers
+# end func
+
+
+#%% function - carried_nodes
+
+def carried_nodes(prism_mod_proc):
+    # the nodes whose rewards are carried by transitions, instead of their states
+    # (the nodes merged into chains, see compress_chains)
+    # Input:
+    #    > prism_mod_proc: the prism modules of the process
+    # Output:
+    #    > carried: list: carried[diag_i] = set of the node IDs
+    
+    carried = []
+    for diag_i in range(len(prism_mod_proc)):
+        carried_i = set()
+        for prism_mod in prism_mod_proc[diag_i]:
+            for trans in prism_mod['transitions']:
+                carried_i.update(trans.get('skip_nodes', []))
+            # end for
+        # end for
+        carried.append(carried_i)
+    # end for
+    
+    return carried
+# end func
+
+
+#%% function - state_rewards
+
+def state_rewards(rewards_all, ids2prism, prism_mod_proc = None):
+    # the non-zero rewards per prism state, as written in the rewards of the prism model
+    # Input:
+    #    > rewards_all: list of dicts nodeID: reward, one for each diagram, or None
+    #    > ids2prism: node -> prism state map (see ids_to_prism_states)
+    #    > prism_mod_proc: (optional) the prism modules of the process; the rewards of the
+    #                      nodes carried by transitions are left out (see carried_nodes)
+    # Output:
+    #    > rew_states: list, one for each diagram, of dicts (prism_mod, prism_state): rew;
+    #                  empty if the process has no rewards
+    
+    rew_states = []
+    if rewards_all is None:
+        return rew_states
+    # end if
+    carried = [set() for _ in rewards_all]
+    if prism_mod_proc is not None:
+        carried = carried_nodes(prism_mod_proc)
+    # end if
+    for diag_i in range(len(rewards_all)):
+        rew_diag = {}
+        for nID in rewards_all[diag_i]:
+            rew = rewards_all[diag_i][nID]
+            if rew != 0 and nID not in carried[diag_i]:
+                s_mod = ids2prism[diag_i][nID]['prism_mod']
+                s_state = ids2prism[diag_i][nID]['prism_state']
+                rew_diag[(s_mod, s_state)] = rew
+            # end if
+        # end for
+        rew_states.append(rew_diag)
+    # end for
+    return rew_states
+# end func
+
+
+#%% function - skipped_rewards
+
+def skipped_rewards(prism_mod_proc, rewards_all):
+    # the rewards of the steps a transition skips (see carry_rewards): the rewards of the
+    # skipped nodes, and for each skipped step the state rewards of all the other modules,
+    # which stay where they are (the steps are taken as if right before the transition).
+    # A decision with folded aux states skips a step only on those branches, so there
+    # skip_steps is the probability of the skip, and the reward is carried in expectation
+    # Input:
+    #    > prism_mod_proc: the prism modules of the process (after carry_rewards)
+    #    > rewards_all: list of dicts nodeID: reward, one for each diagram, or None
+    # Output:
+    #    > trans_rew: list of dicts, one for each transition that carries rewards:
+    #                 'label', 'diag', 'mod' and 's' (the action, module and state of the
+    #                 transition), 'const' (the rewards of the skipped nodes) and 'steps'
+    #                 (the steps skipped, each one earning the other modules' state rewards)
+    
+    trans_rew = []
+    if not has_rewards(rewards_all):
+        return trans_rew
+    # end if
+    for diag_i in range(len(prism_mod_proc)):
+        for mod_i in range(len(prism_mod_proc[diag_i])):
+            for trans in prism_mod_proc[diag_i][mod_i]['transitions']:
+                if trans.get('skip_steps', 0) == 0:
+                    continue
+                # end if
+                # (the state rewards have 2 decimals, see write_rewards)
+                const = sum(float('{:.2f}'.format(rewards_all[diag_i].get(nID, 0))) 
+                            for nID in trans.get('skip_nodes', []))
+                trans_rew.append({'label': trans['label'], 'diag': diag_i, 'mod': mod_i, 
+                                  's': trans['s'], 'const': const, 
+                                  'steps': float(trans['skip_steps'])})
+            # end for
+        # end for
+    # end for
+    
+    return trans_rew
+# end func
+
+
+#%% function - write_rewards
+
+def write_rewards(stream, rewards_all, ids2prism, prism_mod_proc = None):
+    # writes the rewards of the process in the prism DAT file
+    # Input:
+    #    > stream: a text stream to write to (see write_end_state)
+    #    > rewards_all: list with length equal to the number of diagrams; 
+    #                   rewards_all[i] is a dict of the form [nodeID] -> rew,
+    #                   containing all rewards of the diagram i 
+    #                   Computed by 'assign_rew_process2'
+    #    > ids2prism: = list: ids2prism[diag_i] = dict of type 
+    #                         nodeID: (module no, prism state)
+    #    > prism_mod_proc: (optional) the prism modules of the process; the transitions
+    #                      that skip steps carry their rewards (see skipped_rewards)
+    
+    stream.write('rewards \n')
+    
+    carried = [set() for _ in rewards_all]
+    if prism_mod_proc is not None:
+        carried = carried_nodes(prism_mod_proc)
+    # end if
+    
+    for diag_i in range(len(rewards_all)):
+        stream.write('\n// diagram {} \n'.format(diag_i))
+        # for all nodes in diag_i
+        for nID in rewards_all[diag_i]:
+            # the rewards of merged nodes are carried by transitions
+            if nID in carried[diag_i]:
+                continue
+            # end if
+            # get reward
+            rew = rewards_all[diag_i][nID]
+            # get also prims state corresponding to nID
+            s_state = ids2prism[diag_i][nID]['prism_state']
+            s_mod = ids2prism[diag_i][nID]['prism_mod']
+            # if rew is not zero, append it
+            if rew != 0:
+                # prism rewards are like: s1_2 = 3: rew;
+                stream.write('s{}_{} = {}: {:.2f}; \n'.format(diag_i, s_mod, s_state, rew))
+            # end if
+        # end for
+    # end for
+    
+    # the transition rewards of the skipped steps: the rewards of the skipped nodes, and
+    # the state rewards of the other modules once per skipped step, 
+    # e.g. [r1_0_0] s1_0 = 3: 4.50; [r1_0_0] s1_0 = 3 & s0_2 = 5: 2.5;
+    if prism_mod_proc is not None:
+        rew_states = state_rewards(rewards_all, ids2prism, prism_mod_proc)
+        trans_rew = skipped_rewards(prism_mod_proc, rewards_all)
+        if trans_rew != []:
+            stream.write('\n// skipped steps \n')
+        # end if
+        for item in trans_rew:
+            guard = '[{}] s{}_{} = {}'.format(item['label'], item['diag'], item['mod'], item['s'])
+            if item['const'] != 0:
+                stream.write('{}: {:.2f}; \n'.format(guard, item['const']))
+            # end if
+            for diag_j in range(len(rew_states)):
+                for (s_mod, s_state), rew in rew_states[diag_j].items():
+                    if (diag_j, s_mod) == (item['diag'], item['mod']):
+                        continue
+                    # end if
+                    rew = item['steps'] * float('{:.2f}'.format(rew))
+                    stream.write('{} & s{}_{} = {}: {:.6g}; \n'.format(guard, diag_j, s_mod, 
+                                                                       s_state, rew))
+                # end for
+            # end for
+        # end for
+    # end if
+    
+    stream.write('endrewards \n')
+# end func
+
+
+#%% function - print_rewards
+
+def print_rewards(rewards_all, ids2prism, prism_mod_proc = None):
+    # prints the rewards of the process in the prism DAT file (see write_rewards)
+    # Input:
+    #    > rewards_all, ids2prism, prism_mod_proc: rewards and prism states of the nodes,
+    #                                              and the prism modules (see write_rewards)
+    # Output:
+    #    > rewards_str: string of the process rewards (for prism)
+    
+    stream = io.StringIO()
+    write_rewards(stream, rewards_all, ids2prism, prism_mod_proc)
+    return stream.getvalue()
+# end func
+
+
+#%% function - write_transition
+
+def write_transition(stream, trans, diag_i, mod_i, bool_flows = False):
+    # write out a transition for the prism dat file
+    # a transition is specified as follows:
+    # [label] s = 1 & (fl1 = 1) & (fl2 = 1) -> 
+    # 0.5:(s' = 2) & (fl3' = 1) & (fl4' = 0) + 0.5:(s' = 3);
+    # fl are the process flows that are we need to wait for, or that get triggered
+    # by the transition
+    # Input:
+    #    > stream: a text stream to write to (see write_end_state)
+    #    > trans: a dict containing the transition information, such as 's', 's_next',
+    #             probabilities, waiting flows, etc.
+    #    > diag_i, mod_i: the diagram and module of the transition (int)
+    #    > bool_flows: if True, the flow variables are bool (see encode_variables)
+    
+    # get transition info
+    the_label = trans['label']
+    s = trans['s']
+    wait_flows = trans['wait_flows']
+    next_states = trans['s_next']
+    probs = trans['probs']
+    if 'trig_flows' in trans:
+        trig_flows = trans['trig_flows']
+    else:
+        trig_flows = [[] for _ in range(len(next_states))]
+    # end if
+    if 'untrig_flows' in trans:
+        untrig_flows = trans['untrig_flows']
+    else:
+        untrig_flows = [[] for _ in range(len(next_states))]
+    # end if
+    
+    # the values of a flow variable when (un)triggered
+    fl_on, fl_off = ('true', 'false') if bool_flows else (1, 0)
+    
+    # guard part
+    guard = ['[{}] s{}_{} = {} '.format(the_label, diag_i, mod_i, s)]
+    for fl_var in wait_flows:
+        guard.append('& (fl{} = {}) '.format(fl_var, fl_on))
+    # end for
+    guard.append(' -> ')
+    guard = ''.join(guard)
+    
+    # update part: one branch for each next state, each one ends with a space
+    branches = []
+    for i in range(len(next_states)):
+        pi = probs[i]
+        si = next_states[i]
+        branch = ['{}: (s{}_{}\' = {}) '.format(pi, diag_i, mod_i, si)]
+        for fl_var in trig_flows[i]:
+            branch.append('& (fl{}\' = {}) '.format(fl_var, fl_on))
+        # end for
+        for fl_var in untrig_flows[i]:
+            branch.append('& (fl{}\' = {}) '.format(fl_var, fl_off))
+        # end for
+        branches.append(''.join(branch))
+    # end for
+    
+    # branches are joined with '+ ', and the transition ends like '(...);'
+    if branches == []:
+        stream.write(guard[0:-3] + ';')
+    else:
+        stream.write(guard + '+ '.join(branches)[0:-1] + ';')
+    # end if
+# end func
+
+
+#%% function - print_transition
+
+def print_transition(trans, diag_i, mod_i, bool_flows = False):
+    # print out a transition for the prism dat file (see write_transition)
+    # Input:
+    #    > trans: a dict containing the transition information (see write_transition)
+    #    > diag_i, mod_i: the diagram and module of the transition (int)
+    #    > bool_flows: if True, the flow variables are bool (see encode_variables)
+    # Output:
+    #    > trans_str: the string containing the transition
+    
+    stream = io.StringIO()
+    write_transition(stream, trans, diag_i, mod_i, bool_flows)
+    return stream.getvalue()
+# end func
+
+
+#%% function - write_module
+
+def write_module(stream, prism_mod, diag_i, mod_i, bool_flows = False, flow_order = None):
+    # write out a prism module (declarations, transitions, restarting transitions)
+    # Input:
+    #    > stream: a text stream to write to (see write_end_state)
+    #    > prism_mod: the module, e.g. prism_mod_proc[diag_i][mod_i] (see write_process)
+    #    > diag_i, mod_i: the diagram and module number (int)
+    #    > bool_flows: if True, the flow variables are bool (see encode_variables)
+    #    > flow_order: (optional) the flow variables to declare before and after the
+    #                  module state (see module_order); by default they all come after it
+    
+    # get start state of mod_i, etc.
+    s_start = prism_mod['info']['start_state']
+    n_states = prism_mod['info']['n_states']
+    n_aux_states = prism_mod['info']['n_aux_states']
+    n_total_states = n_states + n_aux_states
+    # the range of the state, if tightened (see encode_variables)
+    s_low = prism_mod['info'].get('state_low', 0)
+    s_high = prism_mod['info'].get('state_high', n_total_states)
+    if flow_order is None:
+        flows_before, flows_after = [], prism_mod['flow_vars']
+    else:
+        flows_before, flows_after = flow_order
+    # end if
+    restart_labels = prism_mod['restart_labels']
+    
+    # def module header (variable declatations etc)
+    stream.write('module M{}_{} \n'.format(diag_i, mod_i)) # e.g. module M1_2
+    
+    # we need also to declare the flow vars that belong to the module
+    def write_flows(flow_vars):
+        for fl_var in flow_vars:
+            if bool_flows:
+                stream.write('fl{}: bool init false; \n'.format(fl_var))
+            else:
+                stream.write('fl{}: [{}..{}] init 0; \n'.format(fl_var, 0, 1))
+            # end if
+        # end for
+    # end func
+    
+    write_flows(flows_before)
+    # e.g s1_2: [0..5] init 1;
+    stream.write('s{}_{}: [{}..{}] init {}; \n'.format(diag_i, mod_i, s_low, s_high, s_start))
+    write_flows(flows_after)
+    stream.write('\n')
+    
+    # next, write out all transitions of the module
+    for trans in prism_mod['transitions']:
+        write_transition(stream, trans, diag_i, mod_i, bool_flows)
+        stream.write('\n')
+    # end for
+    
+    # finally, write also all restarting transitions, based on the restart labels
+    # these are transitions in the form [restart_label] s >= 0 -> 1: (s' = s_start)
+    for the_label in restart_labels:
+        stream.write('[{}] s{}_{} >= 0 -> 1:(s{}_{}\' = {}); \n'.format(the_label, diag_i, mod_i, diag_i, mod_i, s_start))
+    # end for
+    
+    # ready, close module
+    stream.write('endmodule \n\n\n')
+# end func
+
+
+#%% function - write_process
+
+def write_process(stream, prism_mod_proc, rewards_all, ids2prism, model_type = 'mdp', 
+                  bool_flows = False, ordering = None):
+    # write out the entire process into a prism dat file, module by module and
+    # transition by transition
+    # Input:
+    #    > stream: a text stream to write to (anything with a write(str) method, e.g. an
+    #              open file, io.StringIO, or socket.makefile('w'))
+    #    > prism_mod_proc: prism_mod_proc[diag_i] = list, one for each module. prism_mod[mod_i]['info'] contains 
+    #                 info about the module, such as start state, number of states, etc
+    #                 prism_mod[mod_i]['transitions'] contains a list of transitions, with various
+    #                 attributes. An example: {'curr_state':.., 'next_states':..., 'probs':..., }
+    #    > rewards_all: list with length equal to the number of diagrams; 
+    #                   rewards_all[i] is a dict of the form [nodeID] -> rew,
+    #                   containing all rewards of the diagram i 
+    #                   Computed by 'assign_rew_process2'
+    #    > ids2prism: = list: ids2prism[diag_i] = dict of type 
+    #                         nodeID: (module no, prism state)
+    #    > model_type: the prism model type, 'mdp' or 'dtmc' (for a process proven 
+    #                  deterministic, see utils_mdp.check_determinism)
+    #    > bool_flows: if True, the flow variables are declared bool (see encode_variables)
+    #    > ordering: (optional) the order to declare the modules and their variables in
+    #                (see module_order); by default diagram by diagram
+    
+    stream.write('{} \n\n'.format(model_type))
+    
+    # write end state
+    write_end_state(stream, prism_mod_proc)
+    stream.write('\n\n')
+    
+    # write also rewards if they excist
+    if rewards_all is not None:
+        write_rewards(stream, rewards_all, ids2prism, prism_mod_proc)
+        stream.write('\n\n')
+    # end if
+    
+    if ordering is None:
+        # for all diagrams
+        for diag_i in range(len(prism_mod_proc)):
+            # for all modules
+            stream.write('// diagram {} \n'.format(diag_i))
+            for mod_i in range(len(prism_mod_proc[diag_i])):
+                write_module(stream, prism_mod_proc[diag_i][mod_i], diag_i, mod_i, bool_flows)
+            # end for
+        # end for
+    else:
+        # the modules of the diagrams are interleaved; mark each change of diagram
+        diag_prev = None
+        for diag_i, mod_i in ordering['modules']:
+            if diag_i != diag_prev:
+                stream.write('// diagram {} \n'.format(diag_i))
+                diag_prev = diag_i
+            # end if
+            write_module(stream, prism_mod_proc[diag_i][mod_i], diag_i, mod_i, bool_flows, 
+                         ordering['flows'][(diag_i, mod_i)])
+        # end for
+    # end if
+# end func
+
+
+#%% function - print_process
+
+def print_process(prism_mod_proc, rewards_all, ids2prism, model_type = 'mdp', 
+                  bool_flows = False, ordering = None):
+    # print out the entire process into a prism dat file (see write_process)
+    # Input:
+    #    > prism_mod_proc, rewards_all, ids2prism, model_type, bool_flows, ordering: 
+    #                                                                   see write_process
+    # Output:
+    #    > process_str: string of the process (for prism)   
+    
+    stream = io.StringIO()
+    write_process(stream, prism_mod_proc, rewards_all, ids2prism, model_type, bool_flows, 
+                  ordering)
+    return stream.getvalue()
+# end func
+
+
+#%% class - ConversionResult
+
+class ConversionResult():
+    # the outcome of converting a process into prism (see convert_process)
+    # holds all intermediate products of the conversion, so that the prism model,
+    # the node-state table, the rewards and any other export can be derived from it,
+    # without ordering the nodes or splitting the diagrams into modules again
+
+    def __init__(self, Nall, Fall, Fmsg, Modules_all, Mod_nodes_all, starts_ends, 
+                 ids2prism, prism2ids, flow_vars, flow_vars_inv, critical_segm_all, 
+                 crit_segm_dep_all, prism_mod_proc, rewards_all, process_str = None):
+        # store the conversion products
+        # Attributes:
+        #    > Nall, Fall, Fmsg: the (BFS ordered) process nodes, flows and message flows
+        #    > Modules_all, Mod_nodes_all: the modules of each diagram (see process_to_modules2)
+        #    > starts_ends: start and end states of the modules (see start_end_states)
+        #    > ids2prism, prism2ids: node <-> prism state maps (see ids_to_prism_states)
+        #    > flow_vars, flow_vars_inv: the prism variables of the message flows 
+        #                                (see flows_to_prism_vars)
+        #    > critical_segm_all, crit_segm_dep_all: the critical segments and the
+        #                                diagrams depending on them (see crit_segment_depend)
+        #    > prism_mod_proc: the prism modules of the process (see processToPrism)
+        #    > rewards_all: list of dicts nodeID: reward, one for each diagram, or None
+        #    > process_str: the prism model (str), or None if it was written straight
+        #                   to a file or stream
+        #    > model_type: 'mdp', or 'dtmc' if the process was proven deterministic
+        #    > determinism: the report of the determinism analysis 
+        #                   (see utils_mdp.check_determinism), or None if it was not run
+        #    > aux_removed: aux_removed[diag_i][mod_i] = the number of aux decision states
+        #                   folded away (see fold_aux_states), or None if they were kept
+        #    > chain_removed: chain_removed[diag_i][mod_i] = the number of states collapsed
+        #                     into chains (see compress_chains), or None if not compressed
+        #    > module_groups: module_groups[diag_i] = the lists of diagram modules that share
+        #                     a prism module (see pack_modules), or None for one prism module
+        #                     per diagram module; Modules_all, Mod_nodes_all and starts_ends
+        #                     always describe the diagram modules
+        #    > encoding: the tightened variable encoding (see encode_variables), with bool
+        #                flow variables, or None for the plain one
+        #    > ordering: the order of the modules and variables in the prism model 
+        #                (see module_order), or None for the diagram order
+
+        self.Nall = Nall
+        self.Fall = Fall
+        self.Fmsg = Fmsg
+        self.Modules_all = Modules_all
+        self.Mod_nodes_all = Mod_nodes_all
+        self.starts_ends = starts_ends
+        self.ids2prism = ids2prism
+        self.prism2ids = prism2ids
+        self.flow_vars = flow_vars
+        self.flow_vars_inv = flow_vars_inv
+        self.critical_segm_all = critical_segm_all
+        self.crit_segm_dep_all = crit_segm_dep_all
+        self.prism_mod_proc = prism_mod_proc
+        self.rewards_all = rewards_all
+        self.process_str = process_str
+        self.model_type = 'mdp'
+        self.determinism = None
+        self.aux_removed = None
+        self.chain_removed = None
+        self.module_groups = None
+        self.encoding = None
+        self.ordering = None
+    # end func
+
+    def write(self, out):
+        # write the prism model to a file name or a text stream (see write_process)
+        if isinstance(out, str):
+            with open(out, 'w') as f:
+                write_process(f, self.prism_mod_proc, self.rewards_all, self.ids2prism, 
+                              self.model_type, self.encoding is not None, self.ordering)
+            # end with
+        else:
+            write_process(out, self.prism_mod_proc, self.rewards_all, self.ids2prism, 
+                          self.model_type, self.encoding is not None, self.ordering)
+        # end if
+    # end func
+
+    def to_prism(self):
+        # the prism model as a string (the stored one, if it has already been printed)
+        if self.process_str is None:
+            return print_process(self.prism_mod_proc, self.rewards_all, self.ids2prism, 
+                                 self.model_type, self.encoding is not None, self.ordering)
+        # end if
+        return self.process_str
+    # end func
+
+    def nodes_states(self):
+        # the table that maps the diagram nodes to their prism modules and states
+        # (see states_table)
+        return states_table(self.Nall, self.ids2prism)
+    # end func
+
+    def state_rewards(self):
+        # the non-zero rewards per prism state (see state_rewards)
+        return state_rewards(self.rewards_all, self.ids2prism, self.prism_mod_proc)
+    # end func
+
+    def transition_rewards(self):
+        # the rewards carried by the transitions that skip steps (see skipped_rewards)
+        return skipped_rewards(self.prism_mod_proc, self.rewards_all)
+    # end func
+
+# end class
+
+
+#%% function - build_modules
+
+def build_modules(Nall, Fall, Fmsg, rewards_all):
+    # the first part of the conversion (see convert_process): split the diagrams into
+    # modules, and build the prism modules of the process, without writing the model
+    # Input:
+    #    > Nall, Fall, Fmsg: the process nodes and flows and msg
+    #    > rewards_all: list of dics of type nodeID: reward, one for ach diagram, or None
+    # Output:
+    #    > result: ConversionResult holding the conversion products (no process_str)
+    
+    # assign a prism variable to each flow
+    flow_vars, flow_vars_inv = flows_to_prism_vars(Fmsg)
+    
+    # order diagram nodes in BFS way (for convenience)
+    Nall, _ = utils_process.order_process_nodes(Nall, Fall)
+    
+    # convert process to modules
+    Modules_all, Mod_nodes_all = process_to_modules2(Nall, Fall)
+    
+    # get start and end states for modules
     starts_ends = start_end_states(Modules_all)
     
     # get all prism states and modules of nodes
@@ -1899,39 +3487,149 @@ def convert_process(Nall, Fall, Fmsg, rewards_all):
     
     crit_segm_dep_all = crit_segment_depend(critical_segm_all, dependencies, Nall, Fall)
     
+    # index the flow vars by source, target and owning module
+    flow_index = index_flows(Fmsg, flow_vars, Modules_all)
+    
     # ready to run the beast :p
     prism_mod_proc = processToPrism(Nall, Fall, Fmsg, Modules_all, Mod_nodes_all, starts_ends, 
-                            flow_vars, flow_vars_inv, ids2prism, prism2ids, critical_segm_all, crit_segm_dep_all)
+                            flow_vars, flow_vars_inv, ids2prism, prism2ids, critical_segm_all, crit_segm_dep_all, 
+                            flow_index)
+    
+    result = ConversionResult(Nall, Fall, Fmsg, Modules_all, Mod_nodes_all, starts_ends, 
+                              ids2prism, prism2ids, flow_vars, flow_vars_inv, critical_segm_all, 
+                              crit_segm_dep_all, prism_mod_proc, rewards_all)
+    
+    return result
+# end func
+
+
+#%% function - has_rewards
+
+def has_rewards(rewards_all):
+    # check if a process has any non-zero reward
+    # Input:
+    #    > rewards_all: list of dics of type nodeID: reward, one for ach diagram, or None
+    # Output:
+    #    > True or False
+    
+    if rewards_all is None:
+        return False
+    # end if
+    return any(rew != 0 for rewards_i in rewards_all for rew in rewards_i.values())
+# end func
+
+
+#%% function convert_process
+
+def convert_process(Nall, Fall, Fmsg, rewards_all, out = None, detect_dtmc = False, 
+                    fold_aux = False, compress = False, layout = 'modules', encode = False, 
+                    order = False, max_states = 100000):
+    # a function thast converts a process to a prism file, combining the above methods
+    # Input:
+    #    > Nall, Fall, Fmsg: the process nodes and flows and msg
+    #    > list of dics of type nodeID: reward, one for ach diagram
+    #    > out: (optional) where to write the prism model: a file name, or a text stream
+    #           (see write_process). If None, the model is kept as a string
+    #    > detect_dtmc: if True, check whether the model is deterministic 
+    #                   (see utils_mdp.check_determinism), and if so emit it as a dtmc;
+    #                   the report is kept in result.determinism
+    #    > fold_aux: if True, fold the aux states of the decisions where possible 
+    #                (see fold_aux_states); the states removed per module are kept
+    #                in result.aux_removed. The folded decisions carry the rewards of 
+    #                the skipped steps (see carry_rewards)
+    #    > compress: if True, collapse the deterministic chains of tasks and events into
+    #                single states (see compress_chains); the states removed per module 
+    #                are kept in result.chain_removed. The transitions out of the chains
+    #                carry the rewards of the skipped steps (see carry_rewards)
+    #    > layout: 'modules' for one prism module per diagram module (the default), or
+    #              'packed' for one module per group of modules that are never active 
+    #              together (see pack_modules); the groups are kept in result.module_groups
+    #    > encode: if True, use the tight variable encoding (see encode_variables), with
+    #              bool flow variables; the encoding is kept in result.encoding
+    #    > order: if True, declare the modules and variables in interaction order 
+    #             (see module_order); the order is kept in result.ordering
+    #    > max_states: the bound of the determinism analysis: after exploring this many
+    #                  states it gives up, and the model stays an mdp (None for no bound)
+    # Output:
+    #    > result: ConversionResult holding the conversion products; result.process_str
+    #              is the str describing the generated dat file (None if written to out)
+    
+    # build the prism modules of the process
+    result = build_modules(Nall, Fall, Fmsg, rewards_all)
+    prism_mod_proc = result.prism_mod_proc
     
+    # collapse the deterministic chains (before the aux states, which are renumbered)
+    if compress:
+        result.chain_removed = compress_chains(prism_mod_proc, result.Nall, result.ids2prism, 
+                                               result.prism2ids, result.starts_ends, rewards_all)
+    # end if
+    
+    # drop the aux decision states that are not needed
+    if fold_aux:
+        result.aux_removed = fold_aux_states(prism_mod_proc, rewards_all)
+    # end if
+    
+    # share the state variables of the modules that are never active together;
+    # from here on the result holds the packed modules
+    if layout == 'packed':
+        prism_mod_proc, ids2prism, prism2ids, groups = pack_modules(prism_mod_proc, result.Nall, Fall, 
+                                                result.Modules_all, result.Mod_nodes_all, 
+                                                result.ids2prism)
+        result.prism_mod_proc = prism_mod_proc
+        result.ids2prism = ids2prism
+        result.prism2ids = prism2ids
+        result.module_groups = groups
+    elif layout != 'modules':
+        raise ValueError('Unknown module layout: ' + str(layout))
+    # end if
+    
+    # tighten the variable ranges, and drop the flows nobody waits for
+    if encode:
+        result.encoding = encode_variables(prism_mod_proc)
+    # end if
+    
+    # keep the interacting modules and variables next to each other
+    if order:
+        result.ordering = module_order(prism_mod_proc)
+    # end if
+    
+    # the transitions that skip steps carry their rewards, on labels of their own
+    carry_rewards(prism_mod_proc, rewards_all)
+    
+    # without nondeterminism, the model is a dtmc
+    if detect_dtmc:
+        # (imported here, utils_mdp imports this module)
+        import utils_mdp
+        result.determinism = utils_mdp.check_determinism(result, max_states)
+        result.model_type = result.determinism['model_type']
+    # end if
     
-    process_str = print_process(prism_mod_proc, rewards_all, ids2prism)
+    # write the model, either straight to out or into a string
+    if out is None:
+        result.process_str = result.to_prism()
+    else:
+        result.write(out)
+    # end if
     
     # ready, return
-    return process_str
+    return result
 # end func
 
 
-#%% function - nodes_to_states_map
+#%% function - states_table
 
-def nodes_to_states_map(Nall, Fall, Fmsg):
-    # maps the diagram nodes to their corresponding prism states
-    # and returns a table; e.g. nID1 <-> s0_1, nID2 <-> s0_2 etc.
+def states_table(Nall, ids2prism):
+    # the table of the diagram nodes and their corresponding prism states
+    # e.g. nID1 <-> s0_1, nID2 <-> s0_2 etc.
     # the table contains the following columns: 
     # diagram no. | node ID | node name | node type | prism module | prism state
     # Input:
-    #    > Nall, Fall, Fmsg: nodes, flows and message flows of the process
+    #    > Nall: the (BFS ordered) nodes of the process
+    #    > ids2prism: = list: ids2prism[diag_i] = dict of type 
+    #                         nodeID: (module no, prism state)
     # Output:
     #    > nodes_states: data frame containing the table data described above
     
-    # order diagram nodes in BFS way (for convenience)
-    Nall, _ = utils_process.order_process_nodes(Nall, Fall)
-    
-    # convert process to modules
-    Modules_all, Mod_nodes_all = process_to_modules2(Nall, Fall)
-    
-    # get all prism states and modules of nodes
-    ids2prism, prism2ids = ids_to_prism_states(Nall, Fall, Modules_all, Mod_nodes_all)
-    
     # holds the data to return
     data = []
     column_names = ['diagram no.', 'node ID', 'node name', 
@@ -1960,6 +3658,46 @@ def nodes_to_states_map(Nall, Fall, Fmsg):
     return df
 # end func
 
+
+#%% function - nodes_to_states_map
+
+def nodes_to_states_map(Nall, Fall, Fmsg, compress = False, rewards_all = None):
+    # maps the diagram nodes to their corresponding prism states
+    # and returns a table (see states_table)
+    # if the process has already been converted, use ConversionResult.nodes_states
+    # instead, which does not order the nodes and build the modules again
+    # Input:
+    #    > Nall, Fall, Fmsg: nodes, flows and message flows of the process
+    #    > compress: if True, the states of the model with compressed chains 
+    #                (see compress_chains), where every node of a chain is mapped
+    #                to the state of the chain; this needs the prism modules
+    #                (see build_modules), but no model is written
+    #    > rewards_all: (optional) the rewards of the process, as given to convert_process;
+    #                   with compress, the chains depend on them (see chain_renumbering)
+    # Output:
+    #    > nodes_states: data frame containing the table data (see states_table)
+    
+    if compress:
+        # the chains need the prism modules, but not the model itself
+        result = build_modules(Nall, Fall, Fmsg, rewards_all)
+        renumbers = chain_renumbering(result.prism_mod_proc, result.Nall, result.prism2ids, 
+                                      rewards_all)
+        renumber_nodes(result.ids2prism, result.prism2ids, renumbers)
+        return result.nodes_states()
+    # end if
+    
+    # order diagram nodes in BFS way (for convenience)
+    Nall, _ = utils_process.order_process_nodes(Nall, Fall)
+    
+    # convert process to modules
+    Modules_all, Mod_nodes_all = process_to_modules2(Nall, Fall)
+    
+    # get all prism states and modules of nodes
+    ids2prism, prism2ids = ids_to_prism_states(Nall, Fall, Modules_all, Mod_nodes_all)
+    
+    return states_table(Nall, ids2prism)
+# end func
+
             
             
             
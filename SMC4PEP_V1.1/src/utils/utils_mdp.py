@@ -0,0 +1,1049 @@
+# -*- coding: utf-8 -*-
+"""
+explicit-state engine for the generated prism MDP
+builds the reachable state space of the prism modules (see utils_convert.processToPrism)
+in-process, without loading the .mdp file into PRISM
+"""
+
+#%% imports
+
+from collections import deque
+from itertools import product
+import time
+
+import numpy as np
+import pandas as pd
+
+# own modules
+import utils_convert
+
+
+#%% class - CompiledModel
+
+class CompiledModel():
+    # the prism modules of a process, compiled into variables and commands
+    # this is the same model as the one written in the .mdp file (see utils_convert.write_process),
+    # in a form that can be explored state by state
+
+    def __init__(self, prism_mod_proc):
+        # compile the prism modules
+        # Input:
+        #    > prism_mod_proc: prism_mod_proc[diag_i] = list, one for each module
+        #                      (see utils_convert.processToPrism)
+        # Attributes:
+        #    > var_names: names of the variables, e.g. ['s0_0', 's0_1', 'fl1', ...], in the order
+        #                 of their declaration in the .mdp file
+        #    > var_index: dict var_name: position in var_names
+        #    > var_low, var_high, var_init: arrays with the range and initial value of each variable
+        #    > modules: list of (diag_i, mod_i), one for each module
+        #    > mod_var: mod_var[k] = index of the state variable of module k
+        #    > commands: commands[k] = list of the commands of module k, each a dict with
+        #                'label' ('' if not synchronised), 'value' (the value of the module state
+        #                in the guard, or None if the guard holds in all states), 'waits' (indices
+        #                of the flow variables that must be 1), and 'branches' (list of
+        #                (prob, [(var index, new value), ...]))
+        #    > label_modules: dict label: list of the modules (k) that synchronise on the label
+        #    > labels: dict of the state labels of the model, label: [(var index, value), ...]
+        #              e.g. labels['end_state'] (conjunction of var = value)
+
+        self.var_names = []
+        self.var_index = {}
+        self.var_low = []
+        self.var_high = []
+        self.var_init = []
+        self.modules = []
+        self.mod_var = []
+
+        # 1st pass: declare the variables, module by module (as in the .mdp file)
+        for diag_i in range(len(prism_mod_proc)):
+            for mod_i in range(len(prism_mod_proc[diag_i])):
+                prism_mod = prism_mod_proc[diag_i][mod_i]
+                info = prism_mod['info']
+                n_total_states = info['n_states'] + info['n_aux_states']
+
+                self.modules.append((diag_i, mod_i))
+                self.mod_var.append(len(self.var_names))
+                # (the range may have been tightened, see utils_convert.encode_variables)
+                self.add_var('s{}_{}'.format(diag_i, mod_i), info.get('state_low', 0), 
+                             info.get('state_high', n_total_states), info['start_state'])
+
+                for fl_var in prism_mod['flow_vars']:
+                    self.add_var('fl{}'.format(fl_var), 0, 1, 0)
+                # end for
+            # end for
+        # end for
+
+        self.var_low = np.array(self.var_low, dtype = np.int64)
+        self.var_high = np.array(self.var_high, dtype = np.int64)
+        self.var_init = np.array(self.var_init, dtype = np.int64)
+
+        # 2nd pass: the commands; guards may read flow variables of later modules
+        self.commands = []
+        self.label_modules = {}
+        end_state = []
+
+        for k in range(len(self.modules)):
+            diag_i, mod_i = self.modules[k]
+            prism_mod = prism_mod_proc[diag_i][mod_i]
+            s_var = self.mod_var[k]
+            mod_commands = []
+
+            for trans in prism_mod['transitions']:
+                mod_commands.append(self.compile_transition(trans, s_var))
+            # end for
+
+            # restarting transitions: [restart_label] s >= 0 -> 1: (s' = s_start)
+            s_start = prism_mod['info']['start_state']
+            for the_label in prism_mod['restart_labels']:
+                mod_commands.append({'label': the_label, 'value': None, 'waits': [],
+                                     'branches': [(1.0, [(s_var, s_start)])]})
+            # end for
+
+            # the module synchronises on all labels of its commands
+            for cmd in mod_commands:
+                if cmd['label'] != '':
+                    mods = self.label_modules.setdefault(cmd['label'], [])
+                    if k not in mods:
+                        mods.append(k)
+                    # end if
+                # end if
+            # end for
+
+            self.commands.append(mod_commands)
+            end_state.append((s_var, prism_mod['info']['end_state']))
+        # end for
+
+        self.labels = {'end_state': end_state}
+    # end func
+
+    def add_var(self, var_name, low, high, init):
+        # declare a variable
+        if var_name in self.var_index:
+            raise ValueError('Variable declared twice: ' + var_name)
+        # end if
+        self.var_index[var_name] = len(self.var_names)
+        self.var_names.append(var_name)
+        self.var_low.append(low)
+        self.var_high.append(high)
+        self.var_init.append(init)
+    # end func
+
+    def compile_transition(self, trans, s_var):
+        # compile a transition of a module (see utils_convert.write_transition) into a command
+        next_states = trans['s_next']
+        trig_flows = trans.get('trig_flows', [[] for _ in range(len(next_states))])
+        untrig_flows = trans.get('untrig_flows', [[] for _ in range(len(next_states))])
+
+        waits = [self.var_index['fl{}'.format(fl_var)] for fl_var in trans['wait_flows']]
+
+        branches = []
+        for i in range(len(next_states)):
+            updates = [(s_var, next_states[i])]
+            for fl_var in trig_flows[i]:
+                updates.append((self.var_index['fl{}'.format(fl_var)], 1))
+            # end for
+            for fl_var in untrig_flows[i]:
+                updates.append((self.var_index['fl{}'.format(fl_var)], 0))
+            # end for
+            branches.append((float(trans['probs'][i]), updates))
+        # end for
+
+        return {'label': trans['label'], 'value': trans['s'], 'waits': waits, 'branches': branches}
+    # end func
+
+    def enabled_commands(self, k, state):
+        # the commands of module k that are enabled in state (tuple of variable values)
+        s_value = state[self.mod_var[k]]
+        enabled = []
+        for cmd in self.commands[k]:
+            if cmd['value'] is not None and cmd['value'] != s_value:
+                continue
+            # end if
+            if all(state[v] == 1 for v in cmd['waits']):
+                enabled.append(cmd)
+            # end if
+        # end for
+        return enabled
+    # end func
+
+# end class
+
+
+#%% function - compile_model
+
+def compile_model(source):
+    # compile the prism model of a process
+    # Input:
+    #    > source: the ConversionResult of the process (see utils_convert.convert_process),
+    #              or directly its prism_mod_proc, or an already compiled model
+    # Output:
+    #    > model: the CompiledModel
+
+    if isinstance(source, CompiledModel):
+        return source
+    # end if
+    if isinstance(source, utils_convert.ConversionResult):
+        source = source.prism_mod_proc
+    # end if
+
+    return CompiledModel(source)
+# end func
+
+
+#%% function - enabled_moves
+
+def enabled_moves(model, state):
+    # the moves enabled in a state, following the prism semantics:
+    # unlabelled commands interleave, and a labelled move combines one enabled
+    # command of every module that synchronises on the label
+    # Input:
+    #    > model: the CompiledModel
+    #    > state: the current state (tuple of variable values)
+    # Output:
+    #    > moves: list of (label, cmds), where cmds are the commands moving together;
+    #             in module and command order for the unlabelled moves, then in label order
+
+    # enabled commands of each module, split by label
+    enabled_unlab = []
+    enabled_lab = []
+    for k in range(len(model.modules)):
+        by_label = {}
+        for cmd in model.enabled_commands(k, state):
+            if cmd['label'] == '':
+                enabled_unlab.append(cmd)
+            else:
+                by_label.setdefault(cmd['label'], []).append(cmd)
+            # end if
+        # end for
+        enabled_lab.append(by_label)
+    # end for
+
+    moves = []
+    for cmd in enabled_unlab:
+        moves.append(('', (cmd,)))
+    # end for
+
+    for the_label in model.label_modules:
+        mods = model.label_modules[the_label]
+        per_mod = [enabled_lab[k].get(the_label, []) for k in mods]
+        # blocked, if a module of the label cannot move
+        if any(cmds == [] for cmds in per_mod):
+            continue
+        # end if
+        for combo in product(*per_mod):
+            moves.append((the_label, combo))
+        # end for
+    # end for
+
+    return moves
+# end func
+
+
+#%% function - choice_distributions
+
+def choice_distributions(model, state):
+    # the nondeterministic choices of a state, one for each enabled move (see enabled_moves)
+    # Input:
+    #    > model: the CompiledModel
+    #    > state: the current state (tuple of variable values)
+    # Output:
+    #    > choices: list of (label, {next state: prob}), in the order of enabled_moves
+
+    choices = []
+    for the_label, cmds in enabled_moves(model, state):
+        choices.append((the_label, combine_commands(model, state, cmds)))
+    # end for
+
+    return choices
+# end func
+
+
+#%% function - combine_commands
+
+def combine_commands(model, state, cmds):
+    # the distribution of a synchronised move of several commands (one per module)
+    # Input:
+    #    > model: the CompiledModel
+    #    > state: the current state (tuple of variable values)
+    #    > cmds: list of commands moving together
+    # Output:
+    #    > dist: dict next state (tuple): prob
+
+    dist = {}
+    for branches in product(*[cmd['branches'] for cmd in cmds]):
+        prob = 1.0
+        updates = {}
+        for p, upd in branches:
+            prob *= p
+            for v, val in upd:
+                if v in updates and updates[v] != val:
+                    raise ValueError('Conflicting updates of variable ' + model.var_names[v] +
+                                     ' in a synchronised move')
+                # end if
+                updates[v] = val
+            # end for
+        # end for
+
+        next_state = list(state)
+        for v, val in updates.items():
+            if val < model.var_low[v] or val > model.var_high[v]:
+                raise ValueError('Value {} out of range for variable {}'.format(val, model.var_names[v]))
+            # end if
+            next_state[v] = val
+        # end for
+        next_state = tuple(next_state)
+        dist[next_state] = dist.get(next_state, 0.0) + prob
+    # end for
+
+    return dist
+# end func
+
+
+#%% class - ExplicitMDP
+
+class ExplicitMDP():
+    # the reachable state space of a compiled model, in CSR form
+    # the choices of state s are choice_offsets[s] .. choice_offsets[s+1]-1, and the
+    # transitions of choice c are trans_offsets[c] .. trans_offsets[c+1]-1
+
+    def __init__(self, model, states, choice_offsets, choice_labels, label_names,
+                 trans_offsets, succ, probs, deadlocks):
+        # Attributes:
+        #    > model: the CompiledModel
+        #    > states: array (n_states, n_vars) of the variable values of each state;
+        #              state 0 is the initial state
+        #    > choice_offsets: array (n_states + 1) of the first choice of each state
+        #    > choice_labels: array (n_choices) of the label of each choice (index in label_names)
+        #    > label_names: list of the labels ('' for unlabelled, None for added deadlock loops)
+        #    > trans_offsets: array (n_choices + 1) of the first transition of each choice
+        #    > succ, probs: arrays (n_transitions) of the target state and probability of
+        #                   each transition
+        #    > deadlocks: array of the states without any enabled choice
+
+        self.model = model
+        self.states = states
+        self.choice_offsets = choice_offsets
+        self.choice_labels = choice_labels
+        self.label_names = label_names
+        self.trans_offsets = trans_offsets
+        self.succ = succ
+        self.probs = probs
+        self.deadlocks = deadlocks
+
+        self.n_states = states.shape[0]
+        self.n_choices = len(trans_offsets) - 1
+        self.n_transitions = len(succ)
+
+        # the state of each choice, and the choice of each transition
+        self.choice_state = np.repeat(np.arange(self.n_states), np.diff(choice_offsets))
+        self.trans_choice = np.repeat(np.arange(self.n_choices), np.diff(trans_offsets))
+
+        # predecessors, computed when first needed (see predecessors)
+        self.pred_csr = None
+    # end func
+
+    def var_values(self, var_name):
+        # the values of a variable (e.g. 's0_4') in all states
+        return self.states[:, self.model.var_index[var_name]]
+    # end func
+
+    def label_mask(self, the_label):
+        # boolean array of the states satisfying a label of the model (e.g. 'end_state')
+        mask = np.ones(self.n_states, dtype = bool)
+        for v, val in self.model.labels[the_label]:
+            mask &= (self.states[:, v] == val)
+        # end for
+        return mask
+    # end func
+
+    def predecessors(self):
+        # the predecessors of each state, as a CSR array sorted by target state
+        # Output:
+        #    > pred_offsets: array (n_states + 1); the predecessors of state s are
+        #                    pred[pred_offsets[s]:pred_offsets[s+1]]
+        #    > pred: array of predecessor states (with repetitions, one per transition)
+        if self.pred_csr is None:
+            src = self.choice_state[self.trans_choice]
+            order = np.argsort(self.succ, kind = 'stable')
+            pred = src[order]
+            pred_offsets = np.zeros(self.n_states + 1, dtype = np.int64)
+            np.cumsum(np.bincount(self.succ, minlength = self.n_states), out = pred_offsets[1:])
+            self.pred_csr = (pred_offsets, pred)
+        # end if
+        return self.pred_csr
+    # end func
+
+    def distance_to(self, target, avoid = None):
+        # the length of the shortest path from each state to the target (backward BFS)
+        # Input:
+        #    > target: boolean array of the target states, or a label name
+        #    > avoid: (optional) boolean array of states the paths must not pass through
+        # Output:
+        #    > dist: int array, -1 for the states that cannot reach the target
+
+        if isinstance(target, str):
+            target = self.label_mask(target)
+        # end if
+        pred_offsets, pred = self.predecessors()
+
+        dist = np.full(self.n_states, -1, dtype = np.int64)
+        dist[target] = 0
+        Q = deque(np.flatnonzero(target))
+        while Q:
+            s = Q.popleft()
+            for p in pred[pred_offsets[s]:pred_offsets[s+1]]:
+                if dist[p] < 0 and (avoid is None or not avoid[p]):
+                    dist[p] = dist[s] + 1
+                    Q.append(p)
+                # end if
+            # end for
+        # end while
+
+        return dist
+    # end func
+
+    def can_reach(self, target):
+        # the states from which some path (under some scheduler) reaches the target
+        # Input:
+        #    > target: boolean array of the target states, or a label name
+        # Output:
+        #    > reach: boolean array
+
+        return self.distance_to(target) >= 0
+    # end func
+
+    def summary(self):
+        # basic figures of the MDP
+        # Output:
+        #    > info: dict with the number of states, choices, transitions and deadlocks,
+        #            and whether the end state can be reached from the initial state
+        return {'states': self.n_states, 'choices': self.n_choices,
+                'transitions': self.n_transitions, 'deadlocks': len(self.deadlocks),
+                'end_state_reachable': bool(self.can_reach('end_state')[0])}
+    # end func
+
+# end class
+
+
+#%% function - build_mdp
+
+def build_mdp(source, fix_deadlocks = True, max_states = None):
+    # build the reachable state space of a process model, starting from the initial state
+    # Input:
+    #    > source: the model to build (see compile_model)
+    #    > fix_deadlocks: if True, states without choices get a self-loop (as in PRISM);
+    #                     in any case they are listed in mdp.deadlocks
+    #    > max_states: (optional) stop with an error if the state space exceeds this size
+    # Output:
+    #    > mdp: the ExplicitMDP
+
+    model = compile_model(source)
+
+    init = tuple(int(x) for x in model.var_init)
+    state_ids = {init: 0}
+    states = [init]
+
+    choice_offsets = [0]
+    choice_labels = []
+    label_names = []
+    label_ids = {}
+    trans_offsets = [0]
+    succ = []
+    probs = []
+    deadlocks = []
+
+    # BFS over the reachable states; state ids follow the discovery order
+    s = 0
+    while s < len(states):
+        state = states[s]
+        choices = choice_distributions(model, state)
+
+        if choices == []:
+            deadlocks.append(s)
+            if fix_deadlocks:
+                choices = [(None, {state: 1.0})]
+            # end if
+        # end if
+
+        for the_label, dist in choices:
+            if the_label not in label_ids:
+                label_ids[the_label] = len(label_names)
+                label_names.append(the_label)
+            # end if
+            choice_labels.append(label_ids[the_label])
+
+            for next_state, p in dist.items():
+                if next_state not in state_ids:
+                    if max_states is not None and len(states) >= max_states:
+                        raise ValueError('State space exceeds {} states'.format(max_states))
+                    # end if
+                    state_ids[next_state] = len(states)
+                    states.append(next_state)
+                # end if
+                succ.append(state_ids[next_state])
+                probs.append(p)
+            # end for
+            trans_offsets.append(len(succ))
+        # end for
+        choice_offsets.append(len(choice_labels))
+        s += 1
+    # end while
+
+    return ExplicitMDP(model, np.array(states, dtype = np.int64),
+                       np.array(choice_offsets, dtype = np.int64),
+                       np.array(choice_labels, dtype = np.int64), label_names,
+                       np.array(trans_offsets, dtype = np.int64),
+                       np.array(succ, dtype = np.int64), np.array(probs, dtype = np.float64),
+                       np.array(deadlocks, dtype = np.int64))
+# end func
+
+
+#%% function - describe_move
+
+def describe_move(model, state, the_label, cmds):
+    # a readable form of a move, e.g. '[] s0_1 = 3' or '[f0_0] M0_0, M0_1, M0_2'
+    # Input:
+    #    > model: the CompiledModel
+    #    > state: the state the move is enabled in
+    #    > the_label, cmds: the move (see enabled_moves)
+    # Output:
+    #    > move_str: str
+
+    # the module of a command is the one whose state variable it updates first
+    var_mod = {model.mod_var[k]: k for k in range(len(model.modules))}
+    mods = [var_mod[cmd['branches'][0][1][0][0]] for cmd in cmds]
+
+    if the_label == '':
+        diag_i, mod_i = model.modules[mods[0]]
+        return '[] s{}_{} = {}'.format(diag_i, mod_i, state[model.mod_var[mods[0]]])
+    # end if
+    return '[{}] '.format(the_label) + ', '.join('M{}_{}'.format(*model.modules[k]) for k in mods)
+# end func
+
+
+#%% function - check_determinism
+
+def check_determinism(source, max_states = None):
+    # decide whether a process model is deterministic, i.e. whether at most one move
+    # (see enabled_moves) is enabled in every reachable state; the model is then a DTMC, 
+    # and PRISM (with the dtmc keyword) gives it exactly the same semantics as the MDP
+    # the states are explored from the initial state through the guards, labels and module
+    # interleaving, and the analysis stops at the first state with two enabled moves
+    # Input:
+    #    > source: the model to check (see compile_model)
+    #    > max_states: (optional) give up, leaving the model an MDP, after this many states
+    # Output:
+    #    > report: dict with
+    #              'deterministic': True, False, or None if the analysis gave up
+    #              'model_type': 'dtmc' if deterministic, otherwise 'mdp'
+    #              'n_states': number of states explored
+    #              'state': for a nondeterministic model, the first state with two moves
+    #                       (dict variable name: value), otherwise None
+    #              'moves': the moves enabled in that state (see describe_move)
+    #              'reason': a sentence explaining the decision
+
+    model = compile_model(source)
+
+    init = tuple(int(x) for x in model.var_init)
+    seen = {init}
+    Q = deque([init])
+
+    while Q:
+        state = Q.popleft()
+        moves = enabled_moves(model, state)
+
+        if len(moves) > 1:
+            moves_str = [describe_move(model, state, the_label, cmds) for the_label, cmds in moves]
+            return {'deterministic': False, 'model_type': 'mdp', 'n_states': len(seen),
+                    'state': {model.var_names[v]: state[v] for v in range(len(state))},
+                    'moves': moves_str,
+                    'reason': 'a reachable state enables {} moves: {}'.format(len(moves), 
+                                                                          '; '.join(moves_str))}
+        # end if
+
+        for the_label, cmds in moves:
+            for next_state in combine_commands(model, state, cmds):
+                if next_state not in seen:
+                    if max_states is not None and len(seen) >= max_states:
+                        return {'deterministic': None, 'model_type': 'mdp', 'n_states': len(seen),
+                                'state': None, 'moves': [],
+                                'reason': 'gave up after {} states'.format(max_states)}
+                    # end if
+                    seen.add(next_state)
+                    Q.append(next_state)
+                # end if
+            # end for
+        # end for
+    # end while
+
+    return {'deterministic': True, 'model_type': 'dtmc', 'n_states': len(seen),
+            'state': None, 'moves': [],
+            'reason': 'all {} reachable states enable at most one move'.format(len(seen))}
+# end func
+
+
+#%% function - any_choice, all_choices
+
+def choice_any_succ(mdp, mask):
+    # for each choice, True if some successor is in mask
+    return np.logical_or.reduceat(mask[mdp.succ], mdp.trans_offsets[:-1])
+# end func
+
+def choice_all_succ(mdp, mask):
+    # for each choice, True if all successors are in mask
+    return np.logical_and.reduceat(mask[mdp.succ], mdp.trans_offsets[:-1])
+# end func
+
+def state_any_choice(mdp, choice_mask):
+    # for each state, True if some choice is in choice_mask
+    return np.logical_or.reduceat(choice_mask, mdp.choice_offsets[:-1])
+# end func
+
+def state_all_choices(mdp, choice_mask):
+    # for each state, True if all choices are in choice_mask
+    return np.logical_and.reduceat(choice_mask, mdp.choice_offsets[:-1])
+# end func
+
+
+#%% function - check_choices
+
+def check_choices(mdp):
+    # the vectorised solvers need at least one choice in every state
+    if np.any(np.diff(mdp.choice_offsets) == 0):
+        raise ValueError('The MDP has states without choices; build it with fix_deadlocks = True')
+    # end if
+# end func
+
+
+#%% function - prob0A
+
+def prob0A(mdp, target):
+    # the states where the target is reached with probability 0 under all schedulers
+    # (Pmax = 0), i.e. the states that cannot reach the target at all
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > target: boolean array of the target states
+    # Output:
+    #    > no: boolean array
+    
+    check_choices(mdp)
+    reach = target.copy()
+    while True:
+        reach_new = reach | state_any_choice(mdp, choice_any_succ(mdp, reach))
+        if np.array_equal(reach_new, reach):
+            break
+        # end if
+        reach = reach_new
+    # end while
+    
+    return ~reach
+# end func
+
+
+#%% function - prob0E
+
+def prob0E(mdp, target):
+    # the states where the target is reached with probability 0 under some scheduler
+    # (Pmin = 0); the complement is the least set containing the target and the
+    # states whose choices all lead to the set with positive probability
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > target: boolean array of the target states
+    # Output:
+    #    > no: boolean array
+    
+    check_choices(mdp)
+    reach = target.copy()
+    while True:
+        reach_new = reach | state_all_choices(mdp, choice_any_succ(mdp, reach))
+        if np.array_equal(reach_new, reach):
+            break
+        # end if
+        reach = reach_new
+    # end while
+    
+    return ~reach
+# end func
+
+
+#%% function - prob1E
+
+def prob1E(mdp, target):
+    # the states where the target is reached with probability 1 under some scheduler
+    # (Pmax = 1), as a greatest fixpoint of least fixpoints
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > target: boolean array of the target states
+    # Output:
+    #    > yes: boolean array
+    
+    check_choices(mdp)
+    U = np.ones(mdp.n_states, dtype = bool)
+    while True:
+        # the choices that stay in U
+        stay = choice_all_succ(mdp, U)
+        R = target.copy()
+        while True:
+            R_new = R | (U & state_any_choice(mdp, stay & choice_any_succ(mdp, R)))
+            if np.array_equal(R_new, R):
+                break
+            # end if
+            R = R_new
+        # end while
+        if np.array_equal(R, U):
+            break
+        # end if
+        U = R
+    # end while
+    
+    return U
+# end func
+
+
+#%% function - prob1A
+
+def prob1A(mdp, target, no_min = None):
+    # the states where the target is reached with probability 1 under all schedulers
+    # (Pmin = 1): the states that cannot reach a Pmin = 0 state without passing the target
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > target: boolean array of the target states
+    #    > no_min: (optional) the Pmin = 0 states, if already computed (see prob0E)
+    # Output:
+    #    > yes: boolean array
+    
+    if no_min is None:
+        no_min = prob0E(mdp, target)
+    # end if
+    
+    bad = no_min.copy()
+    while True:
+        bad_new = bad | (~target & state_any_choice(mdp, choice_any_succ(mdp, bad)))
+        if np.array_equal(bad_new, bad):
+            break
+        # end if
+        bad = bad_new
+    # end while
+    
+    return ~bad
+# end func
+
+
+#%% function - value_iteration
+
+def value_iteration(mdp, x, maybe, opt, rew = None, epsilon = 1e-6, 
+                    relative = True, max_iters = 100000, choice_rew = None):
+    # min/max value iteration over the CSR arrays: in each step, the value of every 
+    # choice is the weighted sum over its transitions, and the value of a state the 
+    # min or max over its choices (numpy segment reductions)
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > x: array of the initial values; only the maybe states are updated
+    #    > maybe: boolean array of the states to solve
+    #    > opt: 'min' or 'max'
+    #    > rew: (optional) array of the state rewards, added in each step
+    #    > epsilon: the convergence threshold
+    #    > relative: if True, the change is measured relative to the values (as in PRISM)
+    #    > max_iters: stop with an error after this many iterations
+    #    > choice_rew: (optional) array of the transition rewards of the choices
+    # Output:
+    #    > x: the values
+    #    > iters: the number of iterations done
+    
+    if opt == 'min':
+        reduce_op = np.minimum
+    elif opt == 'max':
+        reduce_op = np.maximum
+    else:
+        raise ValueError('opt must be min or max')
+    # end if
+    check_choices(mdp)
+    
+    x = np.array(x, dtype = np.float64)
+    trans_starts = mdp.trans_offsets[:-1]
+    choice_starts = mdp.choice_offsets[:-1]
+    
+    for iters in range(1, max_iters + 1):
+        choice_vals = np.add.reduceat(mdp.probs * x[mdp.succ], trans_starts)
+        if choice_rew is not None:
+            choice_vals = choice_vals + choice_rew
+        # end if
+        x_new = reduce_op.reduceat(choice_vals, choice_starts)
+        if rew is not None:
+            x_new = x_new + rew
+        # end if
+        x_new = np.where(maybe, x_new, x)
+        
+        # convergence check, on the finite values
+        finite = np.isfinite(x_new) & np.isfinite(x)
+        diff = np.abs(x_new[finite] - x[finite])
+        if relative:
+            scale = np.abs(x_new[finite])
+            diff = np.where(scale > 0, diff / np.where(scale > 0, scale, 1), diff)
+        # end if
+        x = x_new
+        if diff.size == 0 or diff.max() < epsilon:
+            return x, iters
+        # end if
+    # end for
+    
+    raise RuntimeError('Value iteration did not converge in {} iterations'.format(max_iters))
+# end func
+
+
+#%% function - reach_prob
+
+def reach_prob(mdp, target, opt = 'min', epsilon = 1e-6, relative = True, max_iters = 100000):
+    # the min or max probability of eventually reaching the target, e.g. Pmin=? [F "end_state"]
+    # the states with probability 0 and 1 are found first with graph algorithms 
+    # (prob0A/E, prob1A/E), value iteration solves only the rest
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > target: boolean array of the target states, or a label name (e.g. 'end_state')
+    #    > opt: 'min' or 'max'
+    #    > epsilon, relative, max_iters: convergence settings (see value_iteration)
+    # Output:
+    #    > probs: array with the probability of every state
+    
+    if isinstance(target, str):
+        target = mdp.label_mask(target)
+    # end if
+    
+    if opt == 'min':
+        no = prob0E(mdp, target)
+        yes = prob1A(mdp, target, no)
+    elif opt == 'max':
+        no = prob0A(mdp, target)
+        yes = prob1E(mdp, target)
+    else:
+        raise ValueError('opt must be min or max')
+    # end if
+    
+    maybe = ~(no | yes)
+    x = yes.astype(np.float64)
+    if maybe.any():
+        x, _ = value_iteration(mdp, x, maybe, opt, None, epsilon, relative, max_iters)
+    # end if
+    
+    return x
+# end func
+
+
+#%% function - state_reward_vector
+
+def state_reward_vector(mdp, rew_states):
+    # the state rewards of the mdp, as in the rewards section of the .mdp file
+    # (see utils_convert.write_rewards); prism adds up all the items that hold in a state
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > rew_states: list, one for each diagram, of dicts (prism_mod, prism_state): rew
+    #                  (see utils_convert.ConversionResult.state_rewards)
+    # Output:
+    #    > rew: array with the reward of every state
+    
+    rew = np.zeros(mdp.n_states, dtype = np.float64)
+    for diag_i in range(len(rew_states)):
+        for (s_mod, s_state), r in rew_states[diag_i].items():
+            # the .mdp file has the rewards with 2 decimals
+            r = float('{:.2f}'.format(r))
+            rew += r * (mdp.var_values('s{}_{}'.format(diag_i, s_mod)) == s_state)
+        # end for
+    # end for
+    
+    return rew
+# end func
+
+
+#%% function - transition_reward_vector
+
+def transition_reward_vector(mdp, trans_rew, rew_states):
+    # the transition rewards of the mdp, one for each choice, as in the rewards section
+    # of the .mdp file (see utils_convert.write_rewards): the choices on the action of a 
+    # transition that skips steps, from its state, earn the rewards of the skipped nodes,
+    # and for each skipped step the state rewards of the other modules
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > trans_rew: the rewards of the skipped steps 
+    #                 (see utils_convert.ConversionResult.transition_rewards)
+    #    > rew_states: the state rewards (see state_reward_vector)
+    # Output:
+    #    > choice_rew: array with the reward of every choice
+    
+    choice_rew = np.zeros(mdp.n_choices, dtype = np.float64)
+    if trans_rew == []:
+        return choice_rew
+    # end if
+    rew = state_reward_vector(mdp, rew_states)
+    
+    for item in trans_rew:
+        if item['label'] not in mdp.label_names:
+            continue
+        # end if
+        s_var = 's{}_{}'.format(item['diag'], item['mod'])
+        on = mdp.choice_labels == mdp.label_names.index(item['label'])
+        on &= mdp.var_values(s_var)[mdp.choice_state] == item['s']
+        # the state rewards of the module itself
+        own_states = [{} for _ in rew_states]
+        own_states[item['diag']] = {key: r for key, r in rew_states[item['diag']].items() 
+                                    if key[0] == item['mod']}
+        others = rew - state_reward_vector(mdp, own_states)
+        states = mdp.choice_state[on]
+        choice_rew[on] += item['const'] + item['steps'] * others[states]
+    # end for
+    
+    return choice_rew
+# end func
+
+
+#%% function - expected_reward
+
+def expected_reward(mdp, target, rew, opt = 'min', epsilon = 1e-6, relative = True, 
+                    max_iters = 100000, choice_rew = None):
+    # the min or max expected reward accumulated until reaching the target,
+    # e.g. Rmin=? [F "end_state"]; it is infinite in the states where the target is
+    # not reached with probability 1 (under the best scheduler for min, under some 
+    # scheduler for max), as in prism
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > target: boolean array of the target states, or a label name (e.g. 'end_state')
+    #    > rew: array of the state rewards (see state_reward_vector)
+    #    > opt: 'min' or 'max'
+    #    > epsilon, relative, max_iters: convergence settings (see value_iteration)
+    #    > choice_rew: (optional) array of the transition rewards of the choices 
+    #                  (see transition_reward_vector)
+    # Output:
+    #    > values: array with the expected reward of every state
+    
+    if isinstance(target, str):
+        target = mdp.label_mask(target)
+    # end if
+    
+    if opt == 'min':
+        finite = prob1E(mdp, target)
+    elif opt == 'max':
+        finite = prob1A(mdp, target)
+    else:
+        raise ValueError('opt must be min or max')
+    # end if
+    
+    x = np.where(finite, 0.0, np.inf)
+    maybe = finite & ~target
+    if maybe.any():
+        x, _ = value_iteration(mdp, x, maybe, opt, np.where(maybe, rew, 0.0), epsilon, 
+                               relative, max_iters, choice_rew)
+    # end if
+    
+    return x
+# end func
+
+
+#%% function - check_properties
+
+def check_properties(source, epsilon = 1e-6, relative = True, max_iters = 100000, mdp = None):
+    # check the default properties (see src/properties/sample_properties.txt) 
+    # on the explicitly built MDP, in the initial state
+    # Input:
+    #    > source: the ConversionResult of the process (it gives also the rewards), or 
+    #              an ExplicitMDP, or anything build_mdp accepts
+    #    > epsilon, relative, max_iters: convergence settings (see value_iteration)
+    #    > mdp: (optional) the ExplicitMDP of source, if it is already built
+    # Output:
+    #    > results: dict property: value; the reward properties only if the process
+    #               has rewards
+    
+    rew_states = []
+    trans_rew = []
+    if isinstance(source, utils_convert.ConversionResult):
+        rew_states = source.state_rewards()
+        trans_rew = source.transition_rewards()
+    # end if
+    if isinstance(source, ExplicitMDP):
+        mdp = source
+    elif mdp is None:
+        mdp = build_mdp(source)
+    # end if
+    
+    target = mdp.label_mask('end_state')
+    
+    # with one choice per state (a DTMC), min and max coincide; solve once
+    opts = ['min', 'max']
+    if mdp.n_choices == mdp.n_states:
+        opts = ['min']
+    # end if
+    
+    results = {}
+    for opt in opts:
+        probs = reach_prob(mdp, target, opt, epsilon, relative, max_iters)
+        results['P{}=? [F "end_state"]'.format(opt)] = float(probs[0])
+    # end for
+    
+    if rew_states != []:
+        rew = state_reward_vector(mdp, rew_states)
+        choice_rew = None
+        if trans_rew != []:
+            choice_rew = transition_reward_vector(mdp, trans_rew, rew_states)
+        # end if
+        for opt in opts:
+            values = expected_reward(mdp, target, rew, opt, epsilon, relative, max_iters, 
+                                     choice_rew)
+            results['R{}=? [F "end_state"]'.format(opt)] = float(values[0])
+        # end for
+    # end if
+    
+    if opts == ['min']:
+        results_min = results
+        results = {}
+        for prop in results_min:
+            results[prop] = results_min[prop]
+            results[prop.replace('min', 'max', 1)] = results_min[prop]
+        # end for
+    # end if
+    
+    return results
+# end func
+
+
+#%% function - benchmark_layouts
+
+def benchmark_layouts(Nall, Fall, Fmsg, rewards_all, layouts = ('modules', 'packed'), 
+                      explicit = True):
+    # compare the module layouts of the conversion (see utils_convert.convert_process):
+    # size of the prism model (modules, variables, bits of the state vector) and, 
+    # optionally, the explicit state space and the default properties; all layouts
+    # describe the same process, so the state space and the results must agree
+    # Input:
+    #    > Nall, Fall, Fmsg, rewards_all: the process (see utils_convert.convert_process)
+    #    > layouts: the layouts to compare
+    #    > explicit: if True, build the MDP of each layout and check the default properties
+    # Output:
+    #    > table: data frame with one row per layout
+    
+    rows = []
+    for layout in layouts:
+        t0 = time.perf_counter()
+        result = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, layout = layout)
+        row = {'layout': layout, 'convert time (s)': time.perf_counter() - t0}
+        
+        model = compile_model(result)
+        widths = model.var_high - model.var_low + 1
+        row['modules'] = len(model.modules)
+        row['variables'] = len(model.var_names)
+        row['state bits'] = int(np.sum(np.ceil(np.log2(widths))))
+        
+        if explicit:
+            t0 = time.perf_counter()
+            mdp = build_mdp(model)
+            row['build time (s)'] = time.perf_counter() - t0
+            row['states'] = mdp.n_states
+            row['transitions'] = mdp.n_transitions
+            
+            t0 = time.perf_counter()
+            results = check_properties(result, mdp = mdp)
+            row['check time (s)'] = time.perf_counter() - t0
+            row.update(results)
+        # end if
+        rows.append(row)
+    # end for
+    
+    return pd.DataFrame(rows)
+# end func
@@ -5,6 +5,8 @@ utils to process bpmn diagrams
 
 #%% imports
 
+from collections import deque
+
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -12,6 +14,175 @@ import matplotlib.pyplot as plt
 #import correct_diagrams
 
 
+#%% class - DiagFlows
+
+class DiagFlows(dict):
+    # the flows of a diagram: a dict of type (sourceID, targetID): label, as
+    # Fdiag in utils_read, which keeps also the children and parents of each node
+    # so that traversals don't have to scan all flows for every node
+    # the children (parents) of a node are kept in the same order as their flows
+    # appear in the dict, so that results are the same as with a plain dict
+    # it keeps also an ordering index (BFS distances and BFS order), computed
+    # when first needed and reset whenever a flow is added or removed
+    
+    def __init__(self, *args, **kwargs):
+        # succ: dict of type nodeID: [childID1, childID2, ...]
+        # pred: dict of type nodeID: [parentID1, parentID2, ...]
+        # dist_rows: dict of type nodeID: {nodeID2: path length nodeID -> nodeID2}
+        # bfs_orders: dict of type startID: {nodeID: position in BFS order}
+        # edge_tables: dict of type startID: (edge_table, loops, loop_of), see classify_edges
+        dict.__init__(self)
+        self.succ = {}
+        self.pred = {}
+        self.dist_rows = {}
+        self.bfs_orders = {}
+        self.edge_tables = {}
+        self.update(*args, **kwargs)
+    # end func
+    
+    def add_adjacency(self, flow):
+        # insert the nodes of a new flow in succ and pred
+        source, target = flow
+        self.succ.setdefault(source, []).append(target)
+        self.pred.setdefault(target, []).append(source)
+        self.reset_index()
+    # end func
+    
+    def rem_adjacency(self, flow):
+        # remove the nodes of a deleted flow from succ and pred
+        source, target = flow
+        self.succ[source].remove(target)
+        self.pred[target].remove(source)
+        self.reset_index()
+    # end func
+    
+    def reset_index(self):
+        # forget the ordering index (the diagram has changed)
+        if self.dist_rows or self.bfs_orders or self.edge_tables:
+            self.dist_rows = {}
+            self.bfs_orders = {}
+            self.edge_tables = {}
+        # end if
+    # end func
+    
+    def __setitem__(self, flow, label):
+        if flow not in self:
+            self.add_adjacency(flow)
+        # end if
+        dict.__setitem__(self, flow, label)
+    # end func
+    
+    def __delitem__(self, flow):
+        dict.__delitem__(self, flow)
+        self.rem_adjacency(flow)
+    # end func
+    
+    def pop(self, flow, *default):
+        if flow in self:
+            self.rem_adjacency(flow)
+        # end if
+        return dict.pop(self, flow, *default)
+    # end func
+    
+    def popitem(self):
+        flow, label = dict.popitem(self)
+        self.rem_adjacency(flow)
+        return flow, label
+    # end func
+    
+    def setdefault(self, flow, label = None):
+        if flow not in self:
+            self[flow] = label
+        # end if
+        return self[flow]
+    # end func
+    
+    def update(self, *args, **kwargs):
+        for flow, label in dict(*args, **kwargs).items():
+            self[flow] = label
+        # end for
+    # end func
+    
+    def __ior__(self, other):
+        self.update(other)
+        return self
+    # end func
+    
+    def clear(self):
+        dict.clear(self)
+        self.succ = {}
+        self.pred = {}
+        self.reset_index()
+    # end func
+    
+    def copy(self):
+        # a copy is again a DiagFlows (dict.copy would return a plain dict)
+        return DiagFlows(self)
+    # end func
+    
+    def __reduce__(self):
+        # pickle and (deep)copy through the flows only; succ, pred are rebuilt
+        return (DiagFlows, (dict(self),))
+    # end func
+    
+    def children(self, nodeID):
+        # the children of a node (list of IDs)
+        return list( self.succ.get(nodeID, []) )
+    # end func
+    
+    def parents(self, nodeID):
+        # the parents of a node (list of IDs)
+        return list( self.pred.get(nodeID, []) )
+    # end func
+    
+    def label(self, sourceID, targetID, default = None):
+        # the label of flow sourceID -> targetID, or default if no such flow
+        return self.get( (sourceID, targetID), default )
+    # end func
+    
+    def distances(self, nodeID):
+        # the length of the shortest path from nodeID to each node it reaches
+        # (BFS, computed once per node)
+        # Output:
+        #    > dist: dict of type nodeID2: path length nodeID -> nodeID2
+        #            (nodes not reached are not in dist)
+        
+        if nodeID not in self.dist_rows:
+            dist = {nodeID: 0}
+            Q = deque([nodeID])
+            while Q:
+                node = Q.popleft()
+                for child in self.succ.get(node, []):
+                    if child not in dist:
+                        dist[child] = dist[node] + 1
+                        Q.append(child)
+                    # end if
+                # end for
+            # end while
+            self.dist_rows[nodeID] = dist
+        # end if
+        
+        return self.dist_rows[nodeID]
+    # end func
+    
+    def bfs_order(self, startID):
+        # the nodes reached from startID, in BFS order (see order_diag_nodes)
+        # (computed once per start node)
+        # Output:
+        #    > pos: dict of type nodeID: position in the BFS order, in BFS order
+        
+        if startID not in self.bfs_orders:
+            # BFS visits the nodes by increasing distance, and among nodes of the same
+            # distance, in the order they are discovered; that's the order of distances()
+            self.bfs_orders[startID] = {nID: i for i, nID in enumerate(self.distances(startID))}
+        # end if
+        
+        return self.bfs_orders[startID]
+    # end func
+    
+# end class
+
+
 #%% function - get_children
 
 def get_children(nodeID, Ndiag, Fdiag):
@@ -22,6 +193,11 @@ def get_children(nodeID, Ndiag, Fdiag):
     # Outputs:
     #    > children: list of nodes (IDs) that are children of original node
     
+    # diagram flows keep their children, no need to scan
+    if isinstance(Fdiag, DiagFlows):
+        return Fdiag.children(nodeID)
+    # end if
+    
     children = []
     
     for flow in Fdiag.keys():
@@ -46,6 +222,11 @@ def get_parents(nodeID, Ndiag, Fdiag):
     # Outputs:
     #    > children: list of nodes (IDs) that are children of original node
     
+    # diagram flows keep their parents, no need to scan
+    if isinstance(Fdiag, DiagFlows):
+        return Fdiag.parents(nodeID)
+    # end if
+    
     parents = []
     
     for flow in Fdiag.keys():
@@ -63,14 +244,25 @@ def get_parents(nodeID, Ndiag, Fdiag):
 
 #%% function - nodeID_fromName
 
-def nodeID_fromName(nodeName, Ndiag):
+def nodeID_fromName(nodeName, Ndiag, node_index = None):
     # get a node ID from the node's name
     # Inputs:
     #    > nodeName: name node
     #    > Ndiag: nodes of the diagram (see utils_read for details)
+    #    > node_index: (optional) a NodeIndex of the process that contains Ndiag,
+    #                  to find the node without scanning Ndiag
     # Outputs:
     #    > nodeID: ID of requested node
     
+    if node_index is not None:
+        for nID in node_index.ids_from_name(nodeName):
+            if nID in Ndiag and Ndiag[nID]['name'] == nodeName:
+                return nID
+            # end if
+        # end for
+        return None
+    # end if
+    
     for nID in Ndiag.keys():
         if Ndiag[nID]['name'] == nodeName:
             return nID
@@ -159,6 +351,14 @@ def path_len(node1, node2, Ndiag, Fdiag):
     # Output:
     #    > pathlen: the length of the path node1 -> node2, or -1 if no path
     
+    # diagram flows keep the BFS distances from each node, no need to search
+    if isinstance(Fdiag, DiagFlows):
+        if node1 == node2:
+            return 0
+        # end if
+        return Fdiag.distances(node1).get(node2, -1)
+    # end if
+    
     # we will start a BFS from node1. If we see node2, then it's after
     # else it's not
     
@@ -240,17 +440,126 @@ def order_nodes(node1, node2, Ndiag, Fdiag):
 # end func
 
 
+#%% class - NodeIndex
+
+class NodeIndex():
+    # an index of the nodes of a process, to find the diagram, name and type of
+    # a node (and the nodes with a given name) without scanning all diagrams
+    # it must be updated (remove_node, remove_diag) when nodes or diagrams are
+    # removed from the process
+    
+    def __init__(self, Nall):
+        # Input:
+        #    > Nall: nodes of all diagrams, either a list [Ndiag1, Ndiag2, ...] or a
+        #            dict {diag_no}: Ndiag (see utils_read)
+        # nodes: dict of type nodeID: (diag_no, node_name, node_type)
+        # names: dict of type node_name: [nodeID1, nodeID2, ...]
+        self.nodes = {}
+        self.names = {}
+        
+        if type(Nall) == list:
+            diags = range(len(Nall))
+        else:
+            diags = Nall.keys()
+        # end if
+        
+        for diag in diags:
+            for nID in Nall[diag]:
+                self.add_node(nID, diag, Nall[diag][nID])
+            # end for
+        # end for
+    # end func
+    
+    def add_node(self, nID, diag, node):
+        # insert a node (dict with 'name', 'type') of diagram diag
+        # if the ID exists already, the first node is kept (as get_diag_name_type)
+        if nID in self.nodes:
+            return
+        # end if
+        self.nodes[nID] = (diag, node['name'], node['type'])
+        self.names.setdefault(node['name'], []).append(nID)
+    # end func
+    
+    def remove_node(self, nID):
+        # remove a node from the index (if it is there)
+        if nID not in self.nodes:
+            return
+        # end if
+        _, n_name, _ = self.nodes.pop(nID)
+        self.names[n_name].remove(nID)
+        if self.names[n_name] == []:
+            self.names.pop(n_name)
+        # end if
+    # end func
+    
+    def remove_diag(self, diag):
+        # remove all nodes of a diagram from the index
+        for nID in [nID for nID in self.nodes if self.nodes[nID][0] == diag]:
+            self.remove_node(nID)
+        # end for
+    # end func
+    
+    def get(self, nID):
+        # diagram, name and type of a node, or None, None, None if not found
+        return self.nodes.get(nID, (None, None, None))
+    # end func
+    
+    def ids_from_name(self, nodeName):
+        # the IDs of the nodes with a given name (list, empty if none)
+        return list( self.names.get(nodeName, []) )
+    # end func
+    
+# end class
+
+
+#%% function - is_before
+
+def is_before(node1, node2, start_depths, Ndiag, Fdiag):
+    # check if node1 is before node2 in a diagram, that is, if
+    # order_nodes(node1, node2, Ndiag, Fdiag) == (node1, node2), when the path lengths
+    # from the start to the nodes are already known
+    # Input:
+    #    > node1, node2: two nodes in a diagram
+    #    > start_depths: dict of type nodeID: path length start -> nodeID, for the nodes
+    #                    reached from the start (e.g. Fdiag.distances(startID))
+    #    > Ndiag, Fdiag: nodes and flows of the diagram
+    # Output:
+    #    > before: True if node1 is before node2, False else
+    
+    pathlen01 = start_depths.get(node1, -1)
+    pathlen02 = start_depths.get(node2, -1)
+    
+    # same node: the path to itself has length 0 (see order_nodes)
+    if node1 == node2:
+        return pathlen01 >= 0
+    # end if
+    
+    # node1 must be the first one, and the path node1 -> node2 must not contain loops
+    if pathlen01 >= pathlen02:
+        return False
+    # end if
+    pathlen12 = path_len(node1, node2, Ndiag, Fdiag)
+    return pathlen12 != -1 and pathlen12 <= pathlen02
+# end func
+
+
 #%% function - get_diag_name_type
 
-def get_diag_name_type(nID, Nall):
+def get_diag_name_type(nID, Nall, node_index = None):
     # get diagram number and name, type of a node of a process
     # Input:
     #    > nID: node ID
     #    > Nall: list [Ndiag1, Ndiag2, ...] for all diagrams, where Ndiagi
     #            is a dict containing the nodes of diagram i (see previous)
+    #    > node_index: (optional) a NodeIndex of Nall, to find the node without
+    #                  scanning all diagrams
     # Output:
     #    > n_diag, n_name, n_type: the node's diagram and name, type
     
+    if node_index is not None:
+        return node_index.get(nID)
+    # end if
+    
     node_found = False
     # init to None - return None if node not found
     n_diag = None
@@ -258,15 +567,12 @@ def get_diag_name_type(nID, Nall):
     n_type = None
     
     for i in range(len(Nall)):
-        for nIDi in Nall[i].keys():
-            if nIDi == nID:
-                n_diag = i
-                n_name = Nall[i][nIDi]['name']
-                n_type = Nall[i][nIDi]['type']
-                node_found = True
-                break
-            # end if
-        # end for
+        if nID in Nall[i]:
+            n_diag = i
+            n_name = Nall[i][nID]['name']
+            n_type = Nall[i][nID]['type']
+            node_found = True
+        # end if
         if node_found:
             break
         # end if
@@ -304,6 +610,213 @@ def get_flow_nodes(F):
 # end func
 
 
+#%% function - classify_edges
+
+def classify_edges(Ndiag, Fdiag):
+    # classify the flows of a diagram with one DFS from the start node (and then from
+    # any node not yet visited), and find the loops of the diagram and their nesting,
+    # all in linear time (union-find of the loop bodies, as in Havlak's loop forest)
+    # for diagram flows (DiagFlows), the result is computed once and kept
+    # Input:
+    #    > Ndiag, Fdiag: nodes and flows of the diagram
+    # Output:
+    #    > edge_table: dict of type (sourceID, targetID): {'kind': kind, 'forward': is_forward}
+    #                  kind is the DFS class of the flow: 'tree', 'forward', 'cross' or 'back'
+    #                  is_forward is True if the flow goes forward in the BFS order of the
+    #                  diagram, exactly as order_nodes(sourceID, targetID) == (sourceID, targetID)
+    #                  (this is the direction used by the converter)
+    #    > loops: dict of type headerID: {'nodes': [...], 'parent': headerID or None, 'depth': d}
+    #             one loop for each header (target of back flows): the header and the nodes
+    #             below it in the DFS tree that reach a back flow to it without passing 
+    #             through it; nodes are in DFS order, parent is the innermost loop 
+    #             containing this one, and depth its nesting level (1 for outermost loops)
+    #    > loop_of: dict of type nodeID: headerID of the innermost loop containing the node
+    
+    startID = find_start(Ndiag)
+    
+    if isinstance(Fdiag, DiagFlows) and startID in Fdiag.edge_tables:
+        return Fdiag.edge_tables[startID]
+    # end if
+    
+    # BFS depths from start (-1 if not reached), for the forward rule of order_nodes
+    if isinstance(Fdiag, DiagFlows):
+        depth = Fdiag.distances(startID)
+    else:
+        depth = {}
+        for nID in get_flow_nodes(Fdiag):
+            pathlen = path_len(startID, nID, Ndiag, Fdiag)
+            if pathlen != -1:
+                depth[nID] = pathlen
+            # end if
+        # end for
+    # end if
+    
+    # DFS (iterative): pre-order number of each node, 1 while the node is on the 
+    # DFS stack and 2 when it's finished, and the last pre-order number below it
+    pre = {}
+    state = {}
+    last = {}
+    order = []
+    edge_table = {}
+    back_sources = {}
+    
+    roots = [startID] + list(Ndiag.keys())
+    for flow in Fdiag.keys():
+        roots.extend(flow)
+    # end for
+    for root in roots:
+        if root in pre or (root == startID and root is None):
+            continue
+        # end if
+        pre[root] = len(pre)
+        state[root] = 1
+        order.append(root)
+        stack = [ (root, iter(get_children(root, Ndiag, Fdiag))) ]
+        
+        while stack != []:
+            nID, children = stack[-1]
+            for chID in children:
+                if chID not in pre:
+                    kind = 'tree'
+                elif state[chID] == 1:
+                    kind = 'back'
+                    back_sources.setdefault(chID, []).append(nID)
+                elif pre[nID] < pre[chID]:
+                    kind = 'forward'
+                else:
+                    kind = 'cross'
+                # end if
+                
+                # direction as in order_nodes (see order_nodes)
+                d1 = depth.get(nID, -1)
+                d2 = depth.get(chID, -1)
+                if nID == chID:
+                    is_forward = d1 >= 0
+                else:
+                    is_forward = d1 < d2 and d2 >= 1
+                # end if
+                edge_table[(nID, chID)] = {'kind': kind, 'forward': is_forward}
+                
+                if kind == 'tree':
+                    # go deeper
+                    pre[chID] = len(pre)
+                    state[chID] = 1
+                    order.append(chID)
+                    stack.append( (chID, iter(get_children(chID, Ndiag, Fdiag))) )
+                    break
+                # end if
+            else:
+                # all children seen, node finished
+                state[nID] = 2
+                last[nID] = len(pre) - 1
+                stack.pop()
+            # end for
+        # end while
+    # end for
+    
+    # loop forest: the headers from the innermost (last in DFS order) out; the body of
+    # a loop is collected from its back flows, upwards through the flows that are not
+    # back flows, with the inner loops already collapsed into their headers (union-find)
+    union = {}
+    def find(x):
+        root = x
+        while union.get(root, root) != root:
+            root = union[root]
+        # end while
+        while x != root:
+            union[x], x = root, union[x]
+        # end while
+        return root
+    # end func
+    
+    header_of = {}
+    for headerID in reversed(order):
+        if headerID not in back_sources:
+            continue
+        # end if
+        body = set()
+        Q = []
+        for nID in back_sources[headerID]:
+            x = find(nID)
+            if x != headerID and x not in body:
+                body.add(x)
+                Q.append(x)
+            # end if
+        # end for
+        while Q != []:
+            x = Q.pop()
+            for y in get_parents(x, Ndiag, Fdiag):
+                if edge_table[(y, x)]['kind'] == 'back':
+                    continue
+                # end if
+                y = find(y)
+                # only the nodes below the header (as the natural loops, if reducible)
+                if y == headerID or y in body or not pre[headerID] < pre[y] <= last[headerID]:
+                    continue
+                # end if
+                body.add(y)
+                Q.append(y)
+            # end for
+        # end while
+        for x in body:
+            header_of[x] = headerID
+            union[x] = headerID
+        # end for
+    # end for
+    
+    # the loops outer to inner (a header comes after the header of its loop, in DFS order)
+    loops = {}
+    for headerID in order:
+        if headerID in back_sources:
+            parent = header_of.get(headerID)
+            depth_loop = 1 if parent is None else loops[parent]['depth'] + 1
+            loops[headerID] = {'nodes': [], 'parent': parent, 'depth': depth_loop}
+        # end if
+    # end for
+    
+    # the nodes of each loop, in DFS order, and the innermost loop of each node
+    loop_of = {}
+    for nID in order:
+        headerID = nID if nID in loops else header_of.get(nID)
+        if headerID is not None:
+            loop_of[nID] = headerID
+        # end if
+        while headerID is not None:
+            loops[headerID]['nodes'].append(nID)
+            headerID = loops[headerID]['parent']
+        # end while
+    # end for
+    
+    if isinstance(Fdiag, DiagFlows):
+        Fdiag.edge_tables[startID] = (edge_table, loops, loop_of)
+    # end if
+    
+    return edge_table, loops, loop_of
+# end func
+
+
+#%% function - is_forward_flow
+
+def is_forward_flow(nID, chID, Ndiag, Fdiag):
+    # check if the flow nID -> chID goes forward; same result as 
+    # order_nodes(nID, chID, Ndiag, Fdiag) == (nID, chID), but read from the edge
+    # table of the diagram (see classify_edges)
+    # Input:
+    #    > nID, chID: source and target of the flow
+    #    > Ndiag, Fdiag: nodes and flows of the diagram
+    # Output:
+    #    > is_forward: True if the flow goes forward, False else
+    
+    if isinstance(Fdiag, DiagFlows) and (nID, chID) in Fdiag:
+        edge_table, _, _ = classify_edges(Ndiag, Fdiag)
+        return edge_table[(nID, chID)]['forward']
+    # end if
+    
+    # not a flow of the diagram (or plain flows dict): order the nodes
+    return order_nodes(nID, chID, Ndiag, Fdiag) == (nID, chID)
+# end func
+
+
 #%% function - find_forward_children
 
 def find_forward_children(nodeID, Ndiag, Fdiag):
@@ -324,7 +837,7 @@ def find_forward_children(nodeID, Ndiag, Fdiag):
     forw_children = []
     
     for childID in all_children:
-        if order_nodes(nodeID, childID, Ndiag, Fdiag) == (nodeID, childID):
+        if is_forward_flow(nodeID, childID, Ndiag, Fdiag):
             # the ordering nodeID -> childID is correct
             forw_children.append(childID)
         # end if
@@ -383,6 +896,12 @@ def order_diag_nodes(Ndiag, Fdiag):
     # find the start node
     startID = find_start(Ndiag)
     
+    # diagram flows keep the BFS order
+    if isinstance(Fdiag, DiagFlows):
+        Ndiag_ord = {nID: Ndiag[nID] for nID in Fdiag.bfs_order(startID)}
+        return Ndiag_ord
+    # end if
+    
     # start BFS from start, and append nodes as we discover them 
     Ndiag_ord = {}
     
@@ -455,6 +974,20 @@ def is_deeper(nID1, nID2, Ndiag, Fdiag):
         return 'equal'
     # end if
     
+    # diagram flows keep the BFS order (positions of nodes)
+    if isinstance(Fdiag, DiagFlows):
+        bfs_pos = Fdiag.bfs_order( find_start(Ndiag) )
+        if nID1 not in bfs_pos or nID2 not in bfs_pos:
+            # as list.index below, for nodes not reached from the start
+            raise ValueError('node not reached from the start of the diagram')
+        # end if
+        if bfs_pos[nID1] < bfs_pos[nID2]:
+            return 'less deep'
+        else:
+            return 'more deep'
+        # end if
+    # end if
+    
     # node diag nodes by BFS
     Ndiag_ord = order_diag_nodes(Ndiag, Fdiag)
     
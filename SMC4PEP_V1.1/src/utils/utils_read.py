@@ -15,6 +15,8 @@ import networkx as nx # for making and plotting graphs
 
 import xmltodict   # for reading xml files
 
+import xml.etree.ElementTree as ET   # for streaming (iterparse) reading of xml files
+
 #import pickle # for storing python objects
 
 # own modules
@@ -81,7 +83,10 @@ def read_xml(xml_file):
     #    > bpmn_dict: a dict of dicts containing the BPMN diagrams (e.g. process['nodes'])
     
     # gead xml and convert to dict
-    xml_data = open(xml_file, 'r').read()  # Read data
+    # (read as bytes, so that the parser uses the encoding declared in the file)
+    with open(xml_file, 'rb') as f:
+        xml_data = f.read()  # Read data
+    # end with
     xmlDict = xmltodict.parse(xml_data)  # Parse XML
     
     # get the process elements (diagrams with nodes, edges, etc)
@@ -91,6 +96,137 @@ def read_xml(xml_file):
 # end func
 
 
+#%% function - read_xml_iter
+
+# namespace of the BPMN model elements (process, tasks, flows, etc)
+BPMN_NS = '{http://www.omg.org/spec/BPMN/20100524/MODEL}'
+
+# the elements of a process that read_diagram uses
+DIAG_ELEMS = ['task', 'startEvent', 'endEvent', 'intermediateThrowEvent',
+              'intermediateCatchEvent', 'exclusiveGateway', 'parallelGateway',
+              'sequenceFlow']
+
+def add_to_skeleton(skel, key, val):
+    # add a value under a key, the way xmltodict does: a single value is stored
+    # as is, several values with the same key are stored as a list
+    # Input:
+    #    > skel: the dict to add to
+    #    > key, val: key and value to add
+
+    if key not in skel:
+        skel[key] = val
+    elif type(skel[key]) == list:
+        skel[key].append(val)
+    else:
+        skel[key] = [skel[key], val]
+    # end if
+# end func
+
+def elem_attributes(elem):
+    # get the (non-namespaced) attributes of an xml element, as xmltodict keys
+    # Input:
+    #    > elem: the ElementTree element
+    # Output:
+    #    > attr: dict of type {'@attr_name': value}
+
+    attr = {}
+    for key, val in elem.attrib.items():
+        if key[0] != '{':
+            attr['@' + key] = val
+        # end if
+    # end for
+
+    return attr
+# end func
+
+def read_xml_iter(xml_file):
+    # read the xml file in python, streaming it with iterparse
+    # only the parts needed by read_diagram and get_seq_flows are kept, in the same
+    # form as xmltodict produces them (see read_xml); each element is cleared as soon
+    # as it has been handled, and the diagram geometry (bpmndi) is dropped, so that
+    # memory stays low even for large files
+    # Input:
+    #    > xml_file: the xml file name (such as 'aaa.xml') or path ('files\aaa.xml')
+    # Output:
+    #    > bpmn_dict: a (pruned) dict of dicts containing the BPMN diagrams,
+    #                 equivalent to the one of read_xml
+
+    bpmn_dict = {}
+    # open elements, from the root down to the current one
+    stack = []
+    # the process or collaboration (as dict) that is currently read
+    curr_skel = None
+    # outgoing flows of the parallel gate that is currently read
+    gate_outgoing = []
+
+    for event, elem in ET.iterparse(xml_file, events = ('start', 'end')):
+        if event == 'start':
+            depth = len(stack)
+            stack.append(elem)
+
+            if depth == 0 and elem.tag != BPMN_NS + 'definitions':
+                raise ValueError('The xml file does not contain BPMN definitions!')
+            # end if
+
+            # a new process or collaboration starts
+            if depth == 1 and elem.tag == BPMN_NS + 'process':
+                curr_skel = elem_attributes(elem)
+                add_to_skeleton(bpmn_dict, 'bpmn:process', curr_skel)
+            elif depth == 1 and elem.tag == BPMN_NS + 'collaboration':
+                curr_skel = elem_attributes(elem)
+                add_to_skeleton(bpmn_dict, 'bpmn:collaboration', curr_skel)
+            elif depth == 2 and elem.tag == BPMN_NS + 'parallelGateway':
+                gate_outgoing = []
+            # end if
+
+            continue
+        # end if
+
+        # end of an element: all its children have been read
+        stack.pop()
+        depth = len(stack)
+
+        if depth == 0:
+            # end of definitions, ready
+            break
+        # end if
+
+        parent = stack[-1]
+
+        if depth == 3 and stack[1].tag == BPMN_NS + 'process' and \
+                parent.tag == BPMN_NS + 'parallelGateway' and elem.tag == BPMN_NS + 'outgoing':
+            # outgoing flow of a parallel gate; the gate uses it at its end
+            gate_outgoing.append(elem.text.strip() if elem.text is not None else None)
+        # end if
+
+        if depth == 2 and parent.tag == BPMN_NS + 'process' and \
+                elem.tag[len(BPMN_NS):] in DIAG_ELEMS and elem.tag.startswith(BPMN_NS):
+            # node or sequence flow of a diagram
+            tag = elem.tag[len(BPMN_NS):]
+            elem_dict = elem_attributes(elem)
+            if tag == 'parallelGateway':
+                for out_fl in gate_outgoing:
+                    add_to_skeleton(elem_dict, 'bpmn:outgoing', out_fl)
+                # end for
+            # end if
+            add_to_skeleton(curr_skel, 'bpmn:' + tag, elem_dict)
+        elif depth == 2 and parent.tag == BPMN_NS + 'collaboration' and \
+                elem.tag == BPMN_NS + 'messageFlow':
+            # message flow
+            add_to_skeleton(curr_skel, 'bpmn:messageFlow', elem_attributes(elem))
+        # end if
+
+        # element handled (or not needed): free it
+        # (elements end in order and each one is removed at its end, so the
+        # current one is always the first child of its parent)
+        elem.clear()
+        del parent[0]
+    # end for
+
+    return bpmn_dict
+# end func
+
+
 #%% function - rem_unconnected
 
 def rem_unconnected(Ndiag, Fdiag):
@@ -156,9 +292,9 @@ def read_diagram(diagram):
     
     
     
-    # dicts to hold nodes and flows
+    # dicts to hold nodes and flows (flows keep also children and parents)
     Ndiag = {}
-    Fdiag = {}
+    Fdiag = utils_process.DiagFlows()
     
     # get diagram name
     diag_name = diagram['@name']
@@ -357,17 +493,14 @@ def get_seq_flows(bpmn_dict):
     
     Fmsg = {}
     
-    # get msg flow data from the xml file
-    try:
-        bpmn_msg_flows = bpmn_dict['bpmn:collaboration']['bpmn:messageFlow']
-    except:
-        bpmn_msg_flows = []
-        for proc_fl in bpmn_dict['bpmn:collaboration']:
-            for elem in proc_fl['bpmn:messageFlow']:
-                bpmn_msg_flows.append(elem)
-            # end for
+    # get msg flow data from the xml file (there may be one or more
+    # collaborations, each with one or more message flows)
+    bpmn_msg_flows = []
+    for proc_fl in orddict2list(bpmn_dict['bpmn:collaboration']):
+        for elem in orddict2list(proc_fl['bpmn:messageFlow']):
+            bpmn_msg_flows.append(elem)
         # end for
-    # end try
+    # end for
     
     for fl in bpmn_msg_flows:
         # get source and target
@@ -383,53 +516,141 @@ def get_seq_flows(bpmn_dict):
 # end func
 
 
+#%% class - BPMNmodel
+
+class BPMNmodel():
+    # a BPMN model, parsed once from its xml file
+    # holds everything that the readers (pools, events) and the differentiator
+    # need, so that a conversion never reads and parses the same file twice
+
+    def __init__(self, xml_file, reader = 'iterparse'):
+        # read and parse the xml file
+        # Input:
+        #    > xml_file: the xml file name (such as 'aaa.xml') or path ('files\aaa.xml')
+        #    > reader: the xml reader to use, either 'iterparse' (streaming, see
+        #              read_xml_iter) or 'xmltodict' (whole file, see read_xml)
+        # Attributes:
+        #    > bpmn_dict: the bpmn dict of the file, e.g. xmlDict['bpmn:definitions']
+        #    > diagrams: list of (diag_no, diag_name, Ndiag, Fdiag), one for each
+        #                non-empty diagram (see read_diagram)
+        #    > N, F: dicts of type {diag_no}: Ndiag, Fdiag for all non-empty diagrams (pools)
+        #    > Fmsg: dict of message flows (see get_seq_flows), or None if the
+        #            model has no message flows
+        #    > Timeline: dict of 'nodes' and 'flows' of the timeline diagram, or None
+        #                if the model has no timeline
+        #    > process_type: either 'pool_based' or 'event_based' (str)
+
+        self.xml_file = xml_file
+        self.reader = reader
+        if reader == 'iterparse':
+            self.bpmn_dict = read_xml_iter(xml_file)
+        elif reader == 'xmltodict':
+            self.bpmn_dict = read_xml(xml_file)
+        else:
+            raise ValueError('Unknown xml reader: ' + str(reader))
+        # end if
+
+        # get process (pools)
+        process = self.bpmn_dict['bpmn:process']
+        if type(process) != list:
+            # handle single diagram case
+            process = [process]
+        # end if
+
+        self.diagrams = []
+        self.N = {}
+        self.F = {}
+        self.Timeline = None
+
+        cnt = -1
+        for diagram in process:
+            cnt += 1
+            # read current diagram
+            diag_name, Ndiag, Fdiag = read_diagram(diagram)
+
+            # if diagram empty, skip it
+            if len(Ndiag) == 0:
+                continue
+            # end if
+
+            self.diagrams.append((cnt, diag_name, Ndiag, Fdiag))
+            self.N[cnt] = Ndiag
+            self.F[cnt] = Fdiag
+
+            # if diagram is timeline, store it also separately
+            if diag_name.lower() == 'timeline':
+                self.Timeline = {'nodes': Ndiag, 'flows': Fdiag}
+            # end if
+        # end for
+
+        # read also the message flows, if they exist
+        try:
+            self.Fmsg = get_seq_flows(self.bpmn_dict)
+        except:
+            self.Fmsg = None
+        # end try
+
+        # if we have a timeline and no message flows, then it's event based
+        # otherwise it's pool-based
+        if self.Timeline is not None and self.Fmsg is None:
+            self.process_type = 'event_based'
+        else:
+            self.process_type = 'pool_based'
+        # end if
+    # end func
+
+# end class
+
+
+#%% function - read_model
+
+def read_model(xml_file, reader = 'iterparse'):
+    # get the parsed BPMN model of an xml file
+    # Input:
+    #    > xml_file: the xml file name or path (str), or an already parsed BPMNmodel
+    #    > reader: the xml reader to use, if the file has to be parsed (see BPMNmodel)
+    # Output:
+    #    > model: the BPMNmodel; the file is parsed only if xml_file is a path
+
+    if isinstance(xml_file, BPMNmodel):
+        return xml_file
+    # end if
+
+    return BPMNmodel(xml_file, reader)
+# end func
+
+
 #%% function - read_process_pools
 
 def read_process_pools(xml_file):
     # read a pool - based process from an xml file
     # Input:
-    #    > xml_file: string containing the file name
+    #    > xml_file: string containing the file name, or the parsed BPMNmodel
     # Output:
     #    > N, F, Fmsg: dict of type {pool_id}:Npool, Fpool,
     #                  where Npool = dict of type [node_id]:{name, type} (see
     #                  before), Fpool = dict [(source, target)]: label, and
     #                  Fmsg is the dict of message flows: [source, target]: label
-    
-    # read the bpmn info
-    bpmn_dict = read_xml(xml_file)
-    
-    # get process (pools)
-    process = bpmn_dict['bpmn:process']
-    
+
+    # read the bpmn info (only if not already parsed)
+    model = read_model(xml_file)
+
+    # a pool-based process needs message flows
+    if model.Fmsg is None:
+        raise ValueError('The process has no message flows!')
+    # end if
+
+    # all non-empty diagrams are pools
     N = {}
     F = {}
-    Fmsg = {}
-    
-    cnt = -1
-    
-    # read each pool
-    if type(process) != list:
-        # handle single diagram case
-        process = [process]
-    # end if
-    for diagram in process:
-        cnt += 1
-        # read current diagram
-        diag_name, Ndiag, Fdiag = read_diagram(diagram)
-        
-        # if diagram empty, skip it
-        if len(Ndiag) == 0:
-            continue
-        # end if
-        
-        # append Ndiag, Fdiag in total
-        N[cnt] = Ndiag
-        F[cnt] = Fdiag
+    for cnt, diag_name, Ndiag, Fdiag in model.diagrams:
+        # copy, so that later steps cannot alter the parsed model
+        N[cnt] = Ndiag.copy()
+        F[cnt] = Fdiag.copy()
     # end for
-    
-    # read also the message flows
-    Fmsg = get_seq_flows(bpmn_dict)
-    
+
+    Fmsg = model.Fmsg.copy()
+
     # ready, return
     return N, F, Fmsg
 # end func
@@ -450,7 +671,7 @@ def merge_nodes_flows(N, F):
     #            flows of the process
     
     Nall = {}
-    Fall = {}
+    Fall = utils_process.DiagFlows()
     
     for i in N.keys():
         # append nodes of diagram i into Nall
@@ -474,53 +695,36 @@ def merge_nodes_flows(N, F):
 def read_process_events(xml_file):
     # read an event - based process from an xml file
     # Input:
-    #    > xml_file: string containing the file name
+    #    > xml_file: string containing the file name, or the parsed BPMNmodel
     # Output:
     #    > N, F, Timeline: dict of type {pool_id}:Npool, Fpool,
     #                  where Npool = dict of type [node_id]:{name, type} (see
     #                  before), Fpool = dict [(source, target)]: label, and
     #                  Timeline is the timeline of the process
-    
-    # read the bpmn info
-    bpmn_dict = read_xml(xml_file)
-    
-    # get process (pools)
-    process = bpmn_dict['bpmn:process']
-    
+
+    # read the bpmn info (only if not already parsed)
+    model = read_model(xml_file)
+
+    # an event-based process needs a timeline
+    if model.Timeline is None:
+        raise ValueError('The process has no timeline!')
+    # end if
+
     N = {}
     F = {}
-    
-    cnt = -1
-    
-    # read each pool
-    if type(process) != list:
-        # handle single diagram case
-        process = [process]
-    # end if
-    for diagram in process:
-        cnt += 1
-        # read current diagram
-        diag_name, Ndiag, Fdiag = read_diagram(diagram)
-        
-        # if diagram empty, skip it
-        if len(Ndiag) == 0:
-            continue
-        # end if
-        
-        # if diagram is timeline, store it separately
+    for cnt, diag_name, Ndiag, Fdiag in model.diagrams:
+        # the timeline is stored separately, skip it
         if diag_name.lower() == 'timeline':
-            Ntimeline = Ndiag
-            Ftimeline = Fdiag
-            Timeline = {'nodes': Ntimeline, 'flows': Ftimeline}
-            
             continue
         # end if
-        
-        # else, append Ndiag, Fdiag in total
-        N[cnt] = Ndiag
-        F[cnt] = Fdiag
+
+        # else, append Ndiag, Fdiag in total (copied, see read_process_pools)
+        N[cnt] = Ndiag.copy()
+        F[cnt] = Fdiag.copy()
     # end for
-    
+
+    Timeline = model.Timeline.copy()
+
     # ready, return
     return N, F, Timeline
 # end func
@@ -536,7 +740,7 @@ def remove_dangling_diag(Ndiag, Fdiag):
     #    > has_dangling: True if the original diagram had dangling nodes/flows, False else
     
     Nnew = {}
-    Fnew = {}
+    Fnew = utils_process.DiagFlows()
     
     # for all nodes
     for nID in Ndiag.keys():
@@ -599,10 +803,12 @@ def remove_dangling_diag(Ndiag, Fdiag):
 
 #%% function - remove_dangling_proc
 
-def remove_dangling_proc(Nall, Fall, Timeline = None, Fmsg = None):
+def remove_dangling_proc(Nall, Fall, Timeline = None, Fmsg = None, node_index = None):
     # remove dangling nodes and flows from a process
     # Input:
     #    > Nall, Fall: diagram nodes and flows for all diagrams
+    #    > node_index: (optional) NodeIndex of Nall (see utils_process); the removed
+    #                  nodes are removed also from the index
     # Output:
     #    > Nnew, Fnew: the new process, with dangling nodes and flows removed
     #    > Timeline_new, Fmsg_new: the new timeline or message flows (otpional)
@@ -647,14 +853,27 @@ def remove_dangling_proc(Nall, Fall, Timeline = None, Fmsg = None):
         Timeline_new = {'nodes': TNnew, 'flows': TFnew}
     # end if
     
+    # keep the node index in line with the remaining nodes (or make one)
+    if node_index is None:
+        node_index = utils_process.NodeIndex(Nnew)
+    else:
+        for i in range( len(Nall) ):
+            for nID in Nall[i]:
+                if nID not in Nnew[i]:
+                    node_index.remove_node(nID)
+                # end if
+            # end for
+        # end for
+    # end if
+    
     # fix also msg flows if available
     if Fmsg is not None:
         for fl in Fmsg.keys():
             # get flow nID1 -> nID2
             nID1, nID2 = fl
             # check if both nodes exist
-            diag1, _, _ = utils_process.get_diag_name_type(nID1, Nnew)
-            diag2, _, _ = utils_process.get_diag_name_type(nID2, Nnew)
+            diag1, _, _ = utils_process.get_diag_name_type(nID1, Nnew, node_index)
+            diag2, _, _ = utils_process.get_diag_name_type(nID2, Nnew, node_index)
             # if both exist => flow exists => add it in
             if diag1 is not None and diag2 is not None:
                 Fmsg_new[fl] = ''
@@ -139,7 +139,7 @@ def get_reward_paths2(Timeline):
 
 #%% function - assign_rew_diags
 
-def assign_rew_diags(Rewards, Timeline, Nall, Fall):
+def assign_rew_diags(Rewards, Timeline, Nall, Fall, node_index = None):
     # assign the rewards found in the timeline to the diagrams
     # that is, from the timeline we have (evID1_T, ev_ID2_T) -> rew,
     # where evID1_T, evID2_T are th event IDs of the timeline
@@ -152,12 +152,18 @@ def assign_rew_diags(Rewards, Timeline, Nall, Fall):
     #    > Timeline: dict of 'nodes' and 'flows' of th timeline diagram
     #                (for the description of nodes and flows, see f.e. utils_process)
     #    > Nall, Fall: nodes and flows of diagram (see utils_read for details)
+    #    > node_index: (optional) NodeIndex of Nall (see utils_process)
     # Output:
     #    > Rew_diag: dict of type (evID1, evID2, diag_i): reward, now for the 
     #               diagram IDs
     
     Rew_diag = {}
     
+    # index the nodes once, for finding them by name
+    if node_index is None:
+        node_index = utils_process.NodeIndex(Nall)
+    # end if
+    
     # get the nodes and flows of the timeline
     Nt = Timeline['nodes']
     Ft = Timeline['flows']
@@ -176,8 +182,8 @@ def assign_rew_diags(Rewards, Timeline, Nall, Fall):
         # corresponding events (events with the same names as evID1_T and evID2_T)
         for i in range(len(Nall)):
             # find events by name in diagram i
-            evID1 = utils_process.nodeID_fromName(ev1T_name, Nall[i])
-            evID2 = utils_process.nodeID_fromName(ev2T_name, Nall[i])
+            evID1 = utils_process.nodeID_fromName(ev1T_name, Nall[i], node_index)
+            evID2 = utils_process.nodeID_fromName(ev2T_name, Nall[i], node_index)
             
             # if both found, append the reward to the list
             if evID1 is not None and evID2 is not None:
@@ -247,7 +253,7 @@ def find_parallel_path(startID, Ndiag, Fdiag):
         for child in children_node:
             # check if a child goes 'backwards', e.g. behind the current node
             # if not, then keep it and make it the current node; e.g. follow it's path
-            if (nodeID, child) == utils_process.order_nodes(nodeID, child, Ndiag, Fdiag):
+            if utils_process.is_forward_flow(nodeID, child, Ndiag, Fdiag):
                 # child goes forward, keep it
                 nodeID = child
                 break
@@ -374,11 +380,12 @@ def assign_rew_nodes(startID, endID, rew_start_end, Ndiag, Fdiag, Rew_nodes = {}
 
 #%% function - assign_rew_process
 
-def assign_rew_process(Timeline, Nall, Fall):
+def assign_rew_process(Timeline, Nall, Fall, node_index = None):
     # assign rewards to an event-based process
     # Input:
     #    > Timeline: the timeline of the process; see previous for details
     #    > Nall, Fall: the nodes and flows for all diagrams; see utils_read
+    #    > node_index: (optional) NodeIndex of Nall (see utils_process)
     # Output:
     #    > rewards_all: list with length equal to the number of diagrams; 
     #                   rewards_all[i] is a dict of the form [nodeID] -> rew,
@@ -398,7 +405,7 @@ def assign_rew_process(Timeline, Nall, Fall):
     # and also the total reward of that path
     # store them in Rew_diag, a dict of type (evID1, evID2, diag_i): reward
     # use function assign_rew_diags for this
-    Rew_diag = assign_rew_diags(Rewards, Timeline, Nall, Fall)
+    Rew_diag = assign_rew_diags(Rewards, Timeline, Nall, Fall, node_index)
     
     # step 3: for each tuple of the form (evID1, evID2, diag_i): reward, go to
     # diagram i and assign the reward to the tasks between evID1 and evID2
@@ -477,6 +484,8 @@ def assign_rew_diags2(Rewards, Timeline, Nall, Fall):
     # get the nodes and flows of the timeline
     Nt = Timeline['nodes']
     Ft = Timeline['flows']
+    # index the timeline nodes once, for finding their names
+    Nt_index = utils_process.NodeIndex([Nt])
     
     event_names = [[] for _ in range(len(Nall))]
     for i in range(len(Rewards)):
@@ -485,8 +494,8 @@ def assign_rew_diags2(Rewards, Timeline, Nall, Fall):
         for fl in Rewards[i]:
             cnt += 1
             evID1, evID2 = fl
-            _, ev_name1, _ = utils_process.get_diag_name_type(evID1, [Nt])
-            _, ev_name2, _ = utils_process.get_diag_name_type(evID2, [Nt])
+            _, ev_name1, _ = utils_process.get_diag_name_type(evID1, [Nt], Nt_index)
+            _, ev_name2, _ = utils_process.get_diag_name_type(evID2, [Nt], Nt_index)
             
             # the timeline is like: start -> ev1 -> ev2 -> ... -> ev_n
             # the reward tuples are like: (sart, ev1), (ev1, ev2), ..., (ev_[n-1], ev_n)
@@ -0,0 +1,1492 @@
+# -*- coding: utf-8 -*-
+"""
+statistical model checking of the generated prism MDP
+simulates many paths at once on the compiled model (see utils_mdp.CompiledModel), as a 
+matrix of variable vectors, without building the state space; models small enough can 
+also be simulated on the explicit MDP, as a fast mode. Estimates the probability of 
+reaching the end state and the accumulated rewards
+"""
+
+#%% imports
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from statistics import NormalDist
+
+import numpy as np
+
+# own modules
+import utils_convert
+import utils_mdp
+import utils_process
+
+
+#%% class - UniformScheduler
+
+class UniformScheduler():
+    # resolves the nondeterminism by picking one of the choices of a state uniformly
+    # at random (as the prism simulator does)
+
+    def choose(self, mdp, states, rng):
+        # pick a choice for each path
+        # Input:
+        #    > mdp: the ExplicitMDP
+        #    > states: array of the current state of each path
+        #    > rng: numpy random Generator
+        # Output:
+        #    > choices: array of the chosen choice (global index) of each path
+        first = mdp.choice_offsets[states]
+        n_choices = mdp.choice_offsets[states + 1] - first
+        return first + (rng.random(len(states)) * n_choices).astype(np.int64)
+    # end func
+
+    def choose_moves(self, weights, rng):
+        # pick a move for each path, on the compiled model (see VectorModel.step)
+        # Input:
+        #    > weights: int array (n_paths, n_kinds) of the number of enabled moves of each
+        #               kind (an unlabelled command, or a label) of each path
+        #    > rng: numpy random Generator
+        # Output:
+        #    > kinds: array of the kind of the chosen move of each path; within a label, 
+        #             the caller picks uniformly
+        cum = np.cumsum(weights, axis = 1)
+        u = (rng.random(len(weights)) * cum[:, -1]).astype(np.int64)
+        return (cum <= u[:, None]).sum(axis = 1)
+    # end func
+
+# end class
+
+
+#%% class - PolicyScheduler
+
+class PolicyScheduler():
+    # a memoryless scheduler, either deterministic or randomised; it is defined on the 
+    # states of the explicit MDP, so it needs the explicit mode (see simulation_model)
+
+    def __init__(self, policy):
+        # Input:
+        #    > policy: either an int array (n_states) with the choice to take in each state,
+        #              as an index among the choices of the state (0 = first choice), or a
+        #              float array (n_choices) with the probability of each choice (summing
+        #              to 1 over the choices of every state)
+        self.policy = np.asarray(policy)
+    # end func
+
+    def choose(self, mdp, states, rng):
+        # pick a choice for each path (see UniformScheduler.choose)
+        first = mdp.choice_offsets[states]
+        if np.issubdtype(self.policy.dtype, np.integer):
+            return first + self.policy[states]
+        # end if
+
+        # randomised: sample within the choices of each state with their cumulative probs
+        cum = np.cumsum(self.policy)
+        base = np.where(first > 0, cum[first - 1], 0.0)
+        last = mdp.choice_offsets[states + 1] - 1
+        u = base + rng.random(len(states)) * (cum[last] - base)
+        choices = np.searchsorted(cum, u, side = 'right')
+        return np.clip(choices, first, last)
+    # end func
+
+# end class
+
+
+#%% function - sample_transitions
+
+def sample_transitions(mdp, choices, rng, cum_probs = None):
+    # sample the next state of each path, given its choice
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > choices: array of the choice (global index) of each path
+    #    > rng: numpy random Generator
+    #    > cum_probs: (optional) np.cumsum(mdp.probs), if already computed
+    # Output:
+    #    > next_states: array of the next state of each path
+
+    if cum_probs is None:
+        cum_probs = np.cumsum(mdp.probs)
+    # end if
+
+    first = mdp.trans_offsets[choices]
+    last = mdp.trans_offsets[choices + 1] - 1
+    base = np.where(first > 0, cum_probs[first - 1], 0.0)
+    u = base + rng.random(len(choices)) * (cum_probs[last] - base)
+    trans = np.clip(np.searchsorted(cum_probs, u, side = 'right'), first, last)
+    return mdp.succ[trans]
+# end func
+
+
+#%% function - simulate_paths
+
+def simulate_paths(mdp, n_paths, scheduler, rng, target, rew = None, max_path_len = 10000,
+                   cum_probs = None, choice_rew = None):
+    # simulate n_paths independent paths from the initial state at once, until they
+    # reach the target or max_path_len steps
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > n_paths: number of paths
+    #    > scheduler: resolves the nondeterminism (e.g. UniformScheduler)
+    #    > rng: numpy random Generator
+    #    > target: boolean array of the target states
+    #    > rew: (optional) array of the state rewards, accumulated until the target
+    #    > max_path_len: maximum number of steps of a path
+    #    > cum_probs: (optional) np.cumsum(mdp.probs), if already computed
+    #    > choice_rew: (optional) array of the transition rewards of the choices 
+    #                  (see utils_mdp.transition_reward_vector), accumulated with rew
+    # Output:
+    #    > reached: boolean array, True for the paths that reached the target
+    #    > acc_rew: array of the reward accumulated on each path (before the target)
+    #    > path_len: array of the number of steps of each path
+
+    if cum_probs is None:
+        cum_probs = np.cumsum(mdp.probs)
+    # end if
+
+    cur = np.zeros(n_paths, dtype = np.int64) # all paths start at the initial state
+    reached = target[cur].copy()
+    acc_rew = np.zeros(n_paths, dtype = np.float64)
+    path_len = np.zeros(n_paths, dtype = np.int64)
+
+    active = np.flatnonzero(~reached)
+    for step in range(max_path_len):
+        if active.size == 0:
+            break
+        # end if
+        states = cur[active]
+        if rew is not None:
+            acc_rew[active] += rew[states]
+        # end if
+        choices = scheduler.choose(mdp, states, rng)
+        if choice_rew is not None:
+            acc_rew[active] += choice_rew[choices]
+        # end if
+        next_states = sample_transitions(mdp, choices, rng, cum_probs)
+        cur[active] = next_states
+        path_len[active] += 1
+
+        # drop the paths that reached the target
+        hit = target[next_states]
+        reached[active[hit]] = True
+        active = active[~hit]
+    # end for
+
+    return reached, acc_rew, path_len
+# end func
+
+
+#%% function - okamoto_samples
+
+def okamoto_samples(eps, delta):
+    # the number of paths for an estimate within +/- eps of the true probability, with
+    # confidence 1 - delta (Chernoff-Hoeffding / Okamoto bound)
+    return int(math.ceil(math.log(2.0 / delta) / (2.0 * eps ** 2)))
+# end func
+
+
+#%% function - okamoto_halfwidth
+
+def okamoto_halfwidth(n, delta, value_range = 1.0):
+    # the half-width of the Chernoff-Hoeffding confidence interval after n paths, with
+    # confidence 1 - delta, for values within an interval of length value_range
+    return value_range * math.sqrt(math.log(2.0 / delta) / (2.0 * n))
+# end func
+
+
+#%% class - VectorModel
+
+class VectorModel():
+    # the compiled model of a process (see utils_mdp.CompiledModel) as numpy tables, for
+    # simulating many paths at once on their variable vectors: the paths are a state matrix
+    # with one row of variable values per path, and the enabled moves are found on the fly,
+    # as in utils_mdp.enabled_moves, without building the state space
+    # the matrix has an extra last column that is always 1; the guards without a module 
+    # state, the missing waits and the missing updates point to it
+
+    def __init__(self, model, target, rew = None, trans_rew = None):
+        # Input:
+        #    > model: the CompiledModel
+        #    > target: the target of the paths, as (mode, [(var index, value), ...]) with
+        #              mode 'all' (all the terms hold) or 'any' (see target_terms)
+        #    > rew: (optional) the state rewards, as a list of (var index, array of the 
+        #           reward of each value of the variable) (see reward_tables)
+        #    > trans_rew: (optional) the transition rewards, as a list of (label index, 
+        #                 var index, value, const, steps) (see transition_reward_items)
+        # Attributes:
+        #    > var_init: the initial variable values (with the extra 1)
+        #    > cmd_var, cmd_value: the state variable and value in the guard of each command
+        #    > cmd_waits: (n_commands, max waits) the flow variables each command waits for
+        #    > unlab: the unlabelled commands (each one a move on its own)
+        #    > pair_cmds: (n_pairs, max commands) the commands of each (label, module) pair,
+        #                 padded with n_commands (never enabled); the pairs of a label are
+        #                 consecutive, from label_first[l] on, label_n_pairs[l] of them
+        #    > pair_matrix: (n_commands, n_pairs) 1 if the command belongs to the pair
+        #    > br_cum: (n_commands, max branches) cumulative probs of the branches
+        #    > br_first, br_n: the first branch (global index) and number of branches 
+        #                      of each command
+        #    > upd_var, upd_val: (n_branches, max updates) the updates of each branch
+
+        self.n_vars = len(model.var_names)
+        one = self.n_vars
+        self.var_init = np.append(model.var_init, 1).astype(np.int64)
+
+        # the commands, module by module
+        cmds = []
+        for k in range(len(model.modules)):
+            for cmd in model.commands[k]:
+                cmds.append((k, cmd))
+            # end for
+        # end for
+        n_cmds = len(cmds)
+        max_waits = max([len(cmd['waits']) for _, cmd in cmds] + [1])
+        max_br = max([len(cmd['branches']) for _, cmd in cmds] + [1])
+        max_upd = max([len(upd) for _, cmd in cmds for _, upd in cmd['branches']] + [1])
+
+        self.cmd_var = np.full(n_cmds, one, dtype = np.int64)
+        self.cmd_value = np.ones(n_cmds, dtype = np.int64)
+        self.cmd_waits = np.full((n_cmds, max_waits), one, dtype = np.int64)
+        self.br_cum = np.full((n_cmds, max_br), 2.0)
+        self.br_first = np.zeros(n_cmds, dtype = np.int64)
+        self.br_n = np.zeros(n_cmds, dtype = np.int64)
+        upd_var = []
+        upd_val = []
+        for c, (k, cmd) in enumerate(cmds):
+            if cmd['value'] is not None:
+                self.cmd_var[c] = model.mod_var[k]
+                self.cmd_value[c] = cmd['value']
+            # end if
+            self.cmd_waits[c, :len(cmd['waits'])] = cmd['waits']
+            self.br_first[c] = len(upd_var)
+            self.br_n[c] = len(cmd['branches'])
+            self.br_cum[c, :len(cmd['branches'])] = np.cumsum([p for p, _ in cmd['branches']])
+            for _, upd in cmd['branches']:
+                upd_var.append([v for v, _ in upd] + [one] * (max_upd - len(upd)))
+                upd_val.append([val for _, val in upd] + [1] * (max_upd - len(upd)))
+            # end for
+        # end for
+        self.upd_var = np.array(upd_var, dtype = np.int64).reshape(-1, max_upd)
+        self.upd_val = np.array(upd_val, dtype = np.int64).reshape(-1, max_upd)
+
+        # the unlabelled commands, and the (label, module) pairs of the labelled ones,
+        # in the order of utils_mdp.enabled_moves
+        self.unlab = np.array([c for c, (k, cmd) in enumerate(cmds) if cmd['label'] == ''], 
+                              dtype = np.int64)
+        pairs = []
+        self.label_first = []
+        self.label_n_pairs = []
+        for the_label in model.label_modules:
+            self.label_first.append(len(pairs))
+            for k in model.label_modules[the_label]:
+                pairs.append([c for c, (k_c, cmd) in enumerate(cmds) 
+                              if k_c == k and cmd['label'] == the_label])
+            # end for
+            self.label_n_pairs.append(len(model.label_modules[the_label]))
+        # end for
+        self.label_first = np.array(self.label_first, dtype = np.int64)
+        self.label_n_pairs = np.array(self.label_n_pairs, dtype = np.int64)
+        max_pair = max([len(pair) for pair in pairs] + [1])
+        self.pair_cmds = np.full((len(pairs), max_pair), n_cmds, dtype = np.int64)
+        self.pair_matrix = np.zeros((n_cmds, len(pairs)), dtype = np.int64)
+        for j, pair in enumerate(pairs):
+            self.pair_cmds[j, :len(pair)] = pair
+            self.pair_matrix[pair, j] = 1
+        # end for
+
+        self.target = target
+        self.rew = rew
+        self.trans_rew = trans_rew
+    # end func
+
+    def initial(self, n_paths):
+        # the state matrix of n_paths paths in the initial state
+        return np.tile(self.var_init, (n_paths, 1))
+    # end func
+
+    def is_target(self, X):
+        # boolean array, True for the rows of the state matrix X in the target
+        mode, terms = self.target
+        if terms == []:
+            return np.full(len(X), mode == 'all')
+        # end if
+        held = np.stack([X[:, v] == val for v, val in terms], axis = 1)
+        return held.all(axis = 1) if mode == 'all' else held.any(axis = 1)
+    # end func
+
+    def reward(self, X):
+        # the state reward of each row of the state matrix X
+        r = np.zeros(len(X), dtype = np.float64)
+        for v, table in self.rew:
+            r += table[X[:, v]]
+        # end for
+        return r
+    # end func
+
+    def enabled(self, X):
+        # the enabled commands of each row of X: boolean array (n_rows, n_commands + 1);
+        # the last column (the padding of pair_cmds) is never enabled
+        E = X[:, self.cmd_var] == self.cmd_value
+        E &= (X[:, self.cmd_waits] == 1).all(axis = 2)
+        return np.concatenate([E, np.zeros((len(X), 1), dtype = bool)], axis = 1)
+    # end func
+
+    def transition_reward(self, X, lab):
+        # the transition reward of the labelled moves lab (label indices) from the rows 
+        # of the state matrix X: the items of the label that hold in the row, each one
+        # the const plus, for each skipped step, the state rewards of the other modules
+        r = np.zeros(len(X), dtype = np.float64)
+        tables = dict(self.rew)
+        for l, v, value, const, steps in self.trans_rew:
+            on = (lab == l) & (X[:, v] == value)
+            if not on.any():
+                continue
+            # end if
+            others = self.reward(X[on])
+            if v in tables:
+                others -= tables[v][X[on, v]]
+            # end if
+            r[on] += const + steps * others
+        # end for
+        return r
+    # end func
+
+    def step(self, X, rows, scheduler, rng, acc_rew = None):
+        # one step of the paths rows of the state matrix X, which is updated in place
+        # Input:
+        #    > X: the state matrix of the paths
+        #    > rows: array of the rows (paths) to move
+        #    > scheduler: picks one of the enabled moves (see UniformScheduler.choose_moves)
+        #    > rng: numpy random Generator
+        #    > acc_rew: (optional) the accumulated rewards of the paths, where the transition
+        #               rewards of the moves are added (see transition_reward)
+        # Output:
+        #    > moved: boolean array, False for the rows without any enabled move (deadlock)
+
+        E = self.enabled(X[rows])
+        # the moves: each enabled unlabelled command, and for each label the combinations
+        # of one enabled command of each of its modules
+        counts = E[:, :-1].astype(np.int64) @ self.pair_matrix
+        if len(self.label_first) > 0:
+            label_moves = np.multiply.reduceat(counts, self.label_first, axis = 1)
+        else:
+            label_moves = np.zeros((len(rows), 0), dtype = np.int64)
+        # end if
+        weights = np.concatenate([E[:, self.unlab].astype(np.int64), label_moves], axis = 1)
+        moved = weights.sum(axis = 1) > 0
+        move = scheduler.choose_moves(weights[moved], rng)
+        idx = np.flatnonzero(moved)
+
+        # the unlabelled moves are single commands
+        is_unlab = move < len(self.unlab)
+        cmd_rows = [idx[is_unlab]]
+        cmd_ids = [self.unlab[move[is_unlab]]]
+
+        # a labelled move takes one enabled command, uniformly, from each module of the label
+        lab_idx = idx[~is_unlab]
+        if len(lab_idx) > 0:
+            lab = move[~is_unlab] - len(self.unlab)
+            n_pairs = self.label_n_pairs[lab]
+            pair_rows = np.repeat(lab_idx, n_pairs)
+            starts = np.repeat(self.label_first[lab] - np.cumsum(n_pairs) + n_pairs, n_pairs)
+            pairs = starts + np.arange(n_pairs.sum())
+            cand = self.pair_cmds[pairs]
+            En = E[pair_rows[:, None], cand]
+            r = (rng.random(len(pairs)) * En.sum(axis = 1)).astype(np.int64)
+            pick = (np.cumsum(En, axis = 1) <= r[:, None]).sum(axis = 1)
+            cmd_rows.append(pair_rows)
+            cmd_ids.append(cand[np.arange(len(pairs)), pick])
+            # (the transition rewards are taken on the state before the move)
+            if acc_rew is not None and self.trans_rew:
+                acc_rew[rows[lab_idx]] += self.transition_reward(X[rows[lab_idx]], lab)
+            # end if
+        # end if
+        cmd_rows = rows[np.concatenate(cmd_rows)]
+        cmd_ids = np.concatenate(cmd_ids)
+
+        # a branch of each command, and its updates
+        u = rng.random(len(cmd_ids))
+        b = np.minimum((u[:, None] >= self.br_cum[cmd_ids]).sum(axis = 1), self.br_n[cmd_ids] - 1)
+        branch = self.br_first[cmd_ids] + b
+        X[cmd_rows[:, None], self.upd_var[branch]] = self.upd_val[branch]
+
+        return moved
+    # end func
+
+    def simulate(self, n_paths, scheduler, rng, max_path_len, rewards = True):
+        # simulate n_paths paths from the initial state (see simulate_vectors)
+        reached, acc_rew, path_len, _ = simulate_vectors(self, n_paths, scheduler, rng, 
+                                                         max_path_len, rewards)
+        return reached, acc_rew, path_len
+    # end func
+
+# end class
+
+
+#%% function - simulate_vectors
+
+def simulate_vectors(vmodel, n_paths, scheduler, rng, max_path_len = 10000, rewards = True):
+    # simulate n_paths independent paths from the initial state at once on their variable 
+    # vectors (see VectorModel), until they reach the target or max_path_len steps; a path
+    # in a deadlock stops there, without reaching the target
+    # Input:
+    #    > vmodel: the VectorModel
+    #    > n_paths: number of paths
+    #    > scheduler: resolves the nondeterminism (e.g. UniformScheduler)
+    #    > rng: numpy random Generator
+    #    > max_path_len: maximum number of steps of a path
+    #    > rewards: if True, accumulate the state (and transition) rewards of vmodel 
+    #               until the target
+    # Output:
+    #    > reached, acc_rew, path_len: see simulate_paths
+    #    > X: the state matrix of the paths where they stopped
+
+    X = vmodel.initial(n_paths)
+    reached = vmodel.is_target(X)
+    acc_rew = np.zeros(n_paths, dtype = np.float64)
+    path_len = np.zeros(n_paths, dtype = np.int64)
+    with_rew = rewards and vmodel.rew is not None
+
+    active = np.flatnonzero(~reached)
+    for step in range(max_path_len):
+        if active.size == 0:
+            break
+        # end if
+        if with_rew:
+            acc_rew[active] += vmodel.reward(X[active])
+        # end if
+        moved = vmodel.step(X, active, scheduler, rng, acc_rew if with_rew else None)
+        active = active[moved]
+        path_len[active] += 1
+
+        # drop the paths that reached the target
+        hit = vmodel.is_target(X[active])
+        reached[active[hit]] = True
+        active = active[~hit]
+    # end for
+
+    return reached, acc_rew, path_len, X
+# end func
+
+
+#%% function - target_terms
+
+def target_terms(model, target, result = None):
+    # the target of a property as terms on the variables (see VectorModel)
+    # Input:
+    #    > model: the CompiledModel
+    #    > target: a label of the model (e.g. 'end_state'), or a BPMN node ID or a list of 
+    #              node IDs (the states where the module of a node is in the node's prism
+    #              state, see utils_convert.states_table)
+    #    > result: the ConversionResult of the process; needed for node targets
+    # Output:
+    #    > terms: (mode, [(var index, value), ...]), mode 'all' for a label, 'any' for nodes
+
+    if isinstance(target, str) and target in model.labels:
+        return ('all', list(model.labels[target]))
+    # end if
+    if not isinstance(target, (str, list, tuple)):
+        raise ValueError('A target given as states needs the explicit MDP (explicit = True)')
+    # end if
+    if result is None:
+        raise ValueError('Node targets need the ConversionResult of the process')
+    # end if
+
+    if isinstance(target, str):
+        target = [target]
+    # end if
+    terms = []
+    for nID in target:
+        found = False
+        for diag_i in range(len(result.ids2prism)):
+            if nID in result.ids2prism[diag_i]:
+                s_mod = result.ids2prism[diag_i][nID]['prism_mod']
+                s_state = result.ids2prism[diag_i][nID]['prism_state']
+                terms.append((model.var_index['s{}_{}'.format(diag_i, s_mod)], s_state))
+                found = True
+                break
+            # end if
+        # end for
+        if not found:
+            raise ValueError('Unknown target: ' + str(nID))
+        # end if
+    # end for
+
+    return ('any', terms)
+# end func
+
+
+#%% function - reward_tables
+
+def reward_tables(model, rew_states):
+    # the state rewards as tables on the module state variables (see VectorModel), 
+    # the same as utils_mdp.state_reward_vector
+    # Input:
+    #    > model: the CompiledModel
+    #    > rew_states: list, one for each diagram, of dicts (prism_mod, prism_state): rew
+    #                  (see utils_convert.ConversionResult.state_rewards)
+    # Output:
+    #    > rew: list of (var index, array of the reward of each value of the variable)
+
+    tables = {}
+    for diag_i in range(len(rew_states)):
+        for (s_mod, s_state), r in rew_states[diag_i].items():
+            v = model.var_index['s{}_{}'.format(diag_i, s_mod)]
+            if v not in tables:
+                tables[v] = np.zeros(model.var_high[v] + 1, dtype = np.float64)
+            # end if
+            # the .mdp file has the rewards with 2 decimals
+            tables[v][s_state] += float('{:.2f}'.format(r))
+        # end for
+    # end for
+
+    return list(tables.items())
+# end func
+
+
+#%% function - transition_reward_items
+
+def transition_reward_items(model, trans_rew):
+    # the transition rewards on the labels and module state variables (see VectorModel), 
+    # the same as utils_mdp.transition_reward_vector
+    # Input:
+    #    > model: the CompiledModel
+    #    > trans_rew: the rewards of the skipped steps 
+    #                 (see utils_convert.ConversionResult.transition_rewards)
+    # Output:
+    #    > items: list of (label index, var index, value, const, steps)
+
+    labels = list(model.label_modules)
+    items = []
+    for item in trans_rew:
+        if item['label'] not in labels:
+            continue
+        # end if
+        v = model.var_index['s{}_{}'.format(item['diag'], item['mod'])]
+        items.append((labels.index(item['label']), v, item['s'], item['const'], item['steps']))
+    # end for
+
+    return items
+# end func
+
+
+#%% function - simulation_model
+
+def simulation_model(source, target = 'end_state', rew = None, explicit = False):
+    # the model the paths are simulated on: the compiled model (see VectorModel), or, 
+    # as a fast mode for models small enough, the arrays of the explicit MDP (see MDPArrays)
+    # Input:
+    #    > source: the ConversionResult of the process (it gives also the rewards and the
+    #              node targets), its CompiledModel or prism_mod_proc, or an ExplicitMDP
+    #              (which always uses the explicit mode)
+    #    > target: the target of the paths (see target_terms, or target_mask if explicit)
+    #    > rew: (optional) the state rewards; if None, they are taken from source, with the
+    #           transition rewards of the skipped steps. If False, no rewards. For the 
+    #           explicit mode also an array of the state rewards
+    #    > explicit: if True, build the explicit MDP (see utils_mdp.build_mdp) and simulate
+    #                on its CSR arrays
+    # Output:
+    #    > sim: the VectorModel, or the dict of the MDPArrays arrays (see iterate_chunks)
+
+    result = source if isinstance(source, utils_convert.ConversionResult) else None
+    rew_states = None
+    trans_rew = []
+    if rew is None and result is not None:
+        rew_states = result.state_rewards()
+        trans_rew = result.transition_rewards()
+        if rew_states == []:
+            rew_states = None
+        # end if
+    # end if
+
+    if explicit or isinstance(source, utils_mdp.ExplicitMDP):
+        if isinstance(source, utils_mdp.ExplicitMDP):
+            mdp = source
+        else:
+            mdp = utils_mdp.build_mdp(source)
+        # end if
+        arrays = {'choice_offsets': mdp.choice_offsets, 'trans_offsets': mdp.trans_offsets,
+                  'succ': mdp.succ, 'probs': mdp.probs, 'cum_probs': np.cumsum(mdp.probs),
+                  'target': target_mask(mdp, target, result)}
+        if rew_states is not None:
+            arrays['rew'] = utils_mdp.state_reward_vector(mdp, rew_states)
+            if trans_rew != []:
+                arrays['choice_rew'] = utils_mdp.transition_reward_vector(mdp, trans_rew, 
+                                                                          rew_states)
+            # end if
+        elif rew is not None and rew is not False:
+            arrays['rew'] = np.asarray(rew, dtype = np.float64)
+        # end if
+        return arrays
+    # end if
+
+    model = utils_mdp.compile_model(source)
+    tables = None
+    if rew_states is not None:
+        tables = reward_tables(model, rew_states)
+    elif rew is not None and rew is not False:
+        tables = rew
+    # end if
+    return VectorModel(model, target_terms(model, target, result), tables, 
+                       transition_reward_items(model, trans_rew))
+# end func
+
+
+#%% function - check_scheduler
+
+def check_scheduler(sim, scheduler):
+    # the scheduler to simulate with (default: UniformScheduler); the compiled model
+    # needs one that picks among the enabled moves (see UniformScheduler.choose_moves)
+    if scheduler is None:
+        return UniformScheduler()
+    # end if
+    if isinstance(sim, VectorModel) and not hasattr(scheduler, 'choose_moves'):
+        raise ValueError('The scheduler is defined on the explicit MDP; use explicit = True')
+    # end if
+    return scheduler
+# end func
+
+
+#%% class - MDPArrays
+
+class MDPArrays():
+    # the CSR arrays of an explicit MDP needed for simulating paths (see utils_mdp.ExplicitMDP);
+    # a light stand-in for the MDP in the explicit mode (see simulation_model)
+
+    def __init__(self, arrays):
+        # Input:
+        #    > arrays: dict with 'choice_offsets', 'trans_offsets', 'succ', 'probs', 
+        #              'cum_probs', 'target' and optionally 'rew' and 'choice_rew'
+        self.choice_offsets = arrays['choice_offsets']
+        self.trans_offsets = arrays['trans_offsets']
+        self.succ = arrays['succ']
+        self.probs = arrays['probs']
+        self.cum_probs = arrays['cum_probs']
+        self.target = arrays['target']
+        self.rew = arrays.get('rew')
+        self.choice_rew = arrays.get('choice_rew')
+    # end func
+
+    def simulate(self, n_paths, scheduler, rng, max_path_len, rewards = True):
+        # simulate n_paths paths from the initial state (see simulate_paths)
+        return simulate_paths(self, n_paths, scheduler, rng, self.target, 
+                              self.rew if rewards else None, max_path_len, self.cum_probs,
+                              self.choice_rew if rewards else None)
+    # end func
+
+# end class
+
+
+#%% function - share_arrays
+
+def share_arrays(arrays):
+    # copy arrays into shared memory blocks, so that worker processes can attach to them
+    # without copying
+    # Input:
+    #    > arrays: dict name: numpy array
+    # Output:
+    #    > blocks: list of the SharedMemory blocks (to be closed and unlinked by the caller)
+    #    > spec: dict name: (block name, shape, dtype), to attach to them (see attach_arrays)
+
+    blocks = []
+    spec = {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        block = shared_memory.SharedMemory(create = True, size = max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype = arr.dtype, buffer = block.buf)[...] = arr
+        blocks.append(block)
+        spec[name] = (block.name, arr.shape, arr.dtype.str)
+    # end for
+
+    return blocks, spec
+# end func
+
+
+#%% function - attach_arrays
+
+def attach_arrays(spec):
+    # attach to arrays in shared memory (see share_arrays)
+    # Input:
+    #    > spec: dict name: (block name, shape, dtype)
+    # Output:
+    #    > blocks: the attached SharedMemory blocks (they must be kept alive with the arrays)
+    #    > arrays: dict name: numpy array (read-only view on the shared memory)
+
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec.items():
+        # (the block is unlinked by the creating process, see iterate_chunks)
+        block = shared_memory.SharedMemory(name = block_name)
+        arr = np.ndarray(shape, dtype = np.dtype(dtype), buffer = block.buf)
+        arr.flags.writeable = False
+        blocks.append(block)
+        arrays[name] = arr
+    # end for
+
+    return blocks, arrays
+# end func
+
+
+#%% function - init_worker
+
+# state of a worker process: the model (loaded once) and the simulation settings
+WORKER = {}
+
+def init_worker(sim, scheduler, max_path_len):
+    # initialise a worker process: load the model once, either the compiled model 
+    # (a VectorModel, sent to each worker once), or, in the explicit mode, the spec of 
+    # the shared MDP arrays to attach to (see share_arrays)
+    if isinstance(sim, VectorModel):
+        WORKER['sim'] = sim
+    else:
+        blocks, arrays = attach_arrays(sim)
+        WORKER['blocks'] = blocks
+        WORKER['sim'] = MDPArrays(arrays)
+    # end if
+    WORKER['scheduler'] = scheduler
+    WORKER['max_path_len'] = max_path_len
+# end func
+
+
+#%% function - chunk_rng
+
+def chunk_rng(entropy, chunk_i):
+    # the random generator of a chunk of paths; chunk i always gets the i-th stream
+    # spawned from the seed, no matter which process simulates it
+    return np.random.default_rng(np.random.SeedSequence(entropy, spawn_key = (chunk_i,)))
+# end func
+
+
+#%% function - chunk_sums
+
+def chunk_sums(sim, n_paths, scheduler, rng, max_path_len):
+    # simulate a chunk of paths and return the partial sums of the estimate
+    # Input:
+    #    > sim: the model to simulate on, with its target and rewards (VectorModel or MDPArrays)
+    #    > n_paths, scheduler, rng, max_path_len: see simulate_paths
+    # Output:
+    #    > sums: (n_paths, n_reached, rew_sum, rew_sq_sum), with the rewards summed over
+    #            the paths that reached the target
+
+    reached, acc_rew, _ = sim.simulate(n_paths, scheduler, rng, max_path_len)
+    acc_rew = acc_rew[reached]
+    return (n_paths, int(reached.sum()), float(acc_rew.sum()), float((acc_rew ** 2).sum()))
+# end func
+
+
+#%% function - chunk_reached
+
+def chunk_reached(sim, n_paths, scheduler, rng, max_path_len):
+    # simulate a chunk of paths and return, for each path in order, whether it reached
+    # the target (see chunk_sums)
+    reached, _, _ = sim.simulate(n_paths, scheduler, rng, max_path_len, rewards = False)
+    return reached
+# end func
+
+
+#%% function - run_chunk
+
+def run_chunk(chunk_i, n_paths, entropy, chunk_func = chunk_sums):
+    # simulate chunk chunk_i in a worker process (see init_worker)
+    rng = chunk_rng(entropy, chunk_i)
+    return chunk_func(WORKER['sim'], n_paths, WORKER['scheduler'], rng, WORKER['max_path_len'])
+# end func
+
+
+#%% function - chunk_sizes
+
+def chunk_sizes(batch, max_paths = None):
+    # the sizes of the chunks of paths, in order: batch each, up to max_paths in total
+    chunk_i = 0
+    while max_paths is None or chunk_i * batch < max_paths:
+        if max_paths is None:
+            yield chunk_i, batch
+        else:
+            yield chunk_i, min(batch, max_paths - chunk_i * batch)
+        # end if
+        chunk_i += 1
+    # end while
+# end func
+
+
+#%% function - iterate_chunks
+
+def iterate_chunks(sim, scheduler, max_path_len, batch, max_paths, entropy, workers = None,
+                   chunk_func = chunk_sums):
+    # simulate the chunks of paths and yield their results in chunk order, either 
+    # in this process or in a pool of worker processes
+    # Input:
+    #    > sim: the model to simulate on (see simulation_model): a VectorModel, which each
+    #           worker gets once, or the dict of the explicit MDP arrays (see MDPArrays), 
+    #           which the workers share
+    #    > scheduler, max_path_len: see simulate_paths
+    #    > batch, max_paths: see chunk_sizes
+    #    > entropy: entropy of the seed (see chunk_rng)
+    #    > workers: number of worker processes; None or 1 for simulating in this process
+    #    > chunk_func: simulates a chunk and returns its result (chunk_sums or chunk_reached)
+    # Output:
+    #    > yields the result of chunk 0, 1, 2, ...
+
+    if workers is None or workers <= 1:
+        if not isinstance(sim, VectorModel):
+            sim = MDPArrays(sim)
+        # end if
+        for chunk_i, n_paths in chunk_sizes(batch, max_paths):
+            yield chunk_func(sim, n_paths, scheduler, chunk_rng(entropy, chunk_i), max_path_len)
+        # end for
+        return
+    # end if
+
+    # the workers load the model once (the explicit arrays are attached to one shared copy),
+    # and keep a few chunks each in flight
+    if isinstance(sim, VectorModel):
+        blocks, spec = [], sim
+    else:
+        blocks, spec = share_arrays(sim)
+    # end if
+    try:
+        with ProcessPoolExecutor(max_workers = workers, initializer = init_worker,
+                                 initargs = (spec, scheduler, max_path_len)) as executor:
+            chunks = chunk_sizes(batch, max_paths)
+            pending = []
+            try:
+                while True:
+                    while len(pending) < 2 * workers:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        # end if
+                        pending.append(executor.submit(run_chunk, chunk[0], chunk[1], entropy, 
+                                                       chunk_func))
+                    # end while
+                    if pending == []:
+                        break
+                    # end if
+                    yield pending.pop(0).result()
+                # end while
+            finally:
+                # the caller may stop early; drop the chunks not needed
+                for future in pending:
+                    future.cancel()
+                # end for
+            # end try
+        # end with
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        # end for
+    # end try
+# end func
+
+
+#%% function - estimate
+
+def estimate(source, eps = 0.01, delta = 0.01, scheduler = None, rew = None, reward_eps = None,
+             reward_range = None, batch = 1000, max_paths = None, max_path_len = 10000,
+             seed = None, workers = None, explicit = False):
+    # statistical model checking of the process: estimate the probability of reaching
+    # the end state and the expected accumulated reward, simulating paths in chunks
+    # until the requested precision is reached
+    # chunk i always uses the i-th random stream spawned from the seed, and the chunks
+    # are merged in order, so the estimate for a given seed is the same for any number
+    # of workers
+    # Input:
+    #    > source: the ConversionResult of the process (it gives also the rewards), or
+    #              anything simulation_model accepts
+    #    > eps, delta: the probability is estimated within +/- eps with confidence 1 - delta
+    #    > scheduler: resolves the nondeterminism (default: UniformScheduler)
+    #    > rew: (optional) the state rewards (see simulation_model); taken from source if None
+    #    > reward_eps: (optional) also run until the reward is estimated within +/- reward_eps
+    #    > reward_range: (optional) bound of the accumulated reward of a path; if given, the
+    #                    reward interval is a Chernoff-Hoeffding one, else a normal approximation
+    #    > batch: number of paths of a chunk (simulated at once)
+    #    > max_paths: (optional) stop after this many paths, even if not precise enough
+    #    > max_path_len: maximum number of steps of a path
+    #    > seed: seed of the random streams (int); if None, a fresh one is drawn
+    #    > workers: (optional) number of worker processes to simulate the chunks in
+    #    > explicit: if True, build the explicit MDP and simulate on it (see simulation_model);
+    #                a fast mode for the models small enough (which utils_mdp also solves 
+    #                exactly), and needed for a PolicyScheduler
+    # Output:
+    #    > results: dict with 'n_paths', 'p_reach' (with 'p_halfwidth'), 'confidence',
+    #               'reward_mean' and 'reward_halfwidth' (None without rewards), 
+    #               'n_unfinished' (paths cut at max_path_len), and 'seed' (to reproduce it)
+
+    sim = simulation_model(source, 'end_state', rew, explicit)
+    has_rew = (sim.rew is not None) if isinstance(sim, VectorModel) else ('rew' in sim)
+    scheduler = check_scheduler(sim, scheduler)
+
+    entropy = np.random.SeedSequence(seed).entropy
+
+    n = 0
+    n_reached = 0
+    rew_sum = 0.0
+    rew_sq_sum = 0.0
+    chunks = iterate_chunks(sim, scheduler, max_path_len, batch, max_paths, entropy, workers)
+    try:
+        for n_chunk, n_reached_chunk, rew_sum_chunk, rew_sq_sum_chunk in chunks:
+            n += n_chunk
+            n_reached += n_reached_chunk
+            # the reward is defined on the paths that reach the end state
+            rew_sum += rew_sum_chunk
+            rew_sq_sum += rew_sq_sum_chunk
+
+            p_halfwidth = okamoto_halfwidth(n, delta)
+            rew_halfwidth = reward_halfwidth(rew_sum, rew_sq_sum, n_reached, delta, reward_range)
+
+            # stop once precise enough
+            # (the probability needs okamoto_samples(eps, delta) paths)
+            done = p_halfwidth <= eps
+            if reward_eps is not None and has_rew:
+                done = done and rew_halfwidth is not None and rew_halfwidth <= reward_eps
+            # end if
+            if done:
+                break
+            # end if
+        # end for
+    finally:
+        chunks.close()
+    # end try
+
+    results = {'n_paths': n, 'p_reach': n_reached / n, 'p_halfwidth': p_halfwidth,
+               'confidence': 1 - delta, 'reward_mean': None, 'reward_halfwidth': None,
+               'n_unfinished': n - n_reached, 'seed': entropy}
+    if has_rew and n_reached > 0:
+        results['reward_mean'] = rew_sum / n_reached
+        results['reward_halfwidth'] = rew_halfwidth
+    # end if
+
+    return results
+# end func
+
+
+#%% function - reward_halfwidth
+
+def reward_halfwidth(rew_sum, rew_sq_sum, n, delta, reward_range = None):
+    # the half-width of the confidence interval of the mean reward, with confidence 1 - delta
+    # Chernoff-Hoeffding if the rewards are bounded by reward_range, else normal approximation
+    if n < 2:
+        return None
+    # end if
+    if reward_range is not None:
+        return okamoto_halfwidth(n, delta, reward_range)
+    # end if
+
+    mean = rew_sum / n
+    var = max(rew_sq_sum / n - mean ** 2, 0.0) * n / (n - 1)
+    # normal quantile of 1 - delta/2
+    z = NormalDist().inv_cdf(1 - delta / 2)
+    return z * math.sqrt(var / n)
+# end func
+
+
+#%% function - target_mask
+
+def target_mask(mdp, target, result = None):
+    # the target states of a property
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > target: a label of the model (e.g. 'end_state'), a BPMN node ID or a list of
+    #              node IDs (the states where the module of the node is in the node's prism
+    #              state, see utils_convert.states_table), or a boolean array of states
+    #    > result: the ConversionResult of the process; needed for node targets
+    # Output:
+    #    > mask: boolean array of the target states
+
+    if not isinstance(target, (str, list, tuple)):
+        return np.asarray(target, dtype = bool)
+    # end if
+    if isinstance(target, str) and target in mdp.model.labels:
+        return mdp.label_mask(target)
+    # end if
+    if result is None:
+        raise ValueError('Node targets need the ConversionResult of the process')
+    # end if
+
+    if isinstance(target, str):
+        target = [target]
+    # end if
+    mask = np.zeros(mdp.n_states, dtype = bool)
+    for nID in target:
+        found = False
+        for diag_i in range(len(result.ids2prism)):
+            if nID in result.ids2prism[diag_i]:
+                s_mod = result.ids2prism[diag_i][nID]['prism_mod']
+                s_state = result.ids2prism[diag_i][nID]['prism_state']
+                mask |= (mdp.var_values('s{}_{}'.format(diag_i, s_mod)) == s_state)
+                found = True
+                break
+            # end if
+        # end for
+        if not found:
+            raise ValueError('Unknown target: ' + str(nID))
+        # end if
+    # end for
+
+    return mask
+# end func
+
+
+#%% function - sprt
+
+def sprt(source, theta, target = 'end_state', comparison = '>=', indifference = 0.005, 
+         alpha = 0.01, beta = 0.01, scheduler = None, batch = 1000, max_paths = None, 
+         max_path_len = 10000, seed = None, workers = None, explicit = False):
+    # hypothesis testing of a threshold property, e.g. P >= 0.99 [F "end_state"], with
+    # Wald's sequential probability ratio test: the paths are simulated in chunks 
+    # (see estimate), but consumed one by one, and the test stops as soon as it 
+    # can accept or reject
+    # the test decides between H0: p >= theta + indifference and H1: p <= theta - indifference
+    # with error probabilities at most alpha (rejecting H0 wrongly) and beta (accepting
+    # H0 wrongly); inside the indifference region, either answer may be given. Near 0 or 1
+    # the region is clipped to (0, 1), e.g. for theta = 0.999 H0 is p >= 1 - 1e-12, so
+    # any path that misses the target rejects it at once
+    # Input:
+    #    > source: the ConversionResult of the process (needed for node targets), or
+    #              anything simulation_model accepts
+    #    > theta: the probability threshold, within (0, 1)
+    #    > target: the target of the property (see target_terms, or target_mask if explicit)
+    #    > comparison: '>=' for P >= theta, or '<=' for P <= theta
+    #    > indifference: half-width of the indifference region around theta
+    #    > alpha, beta: the error bounds
+    #    > scheduler, batch, max_paths, max_path_len, seed, workers, explicit: see estimate
+    # Output:
+    #    > results: dict with 'holds' (True/False, or None if max_paths was reached
+    #               without a decision), 'n_samples' (paths the decision used), 
+    #               'n_simulated' (paths simulated, whole chunks), 'n_reached' (of the
+    #               used paths), 'llr' (final log-likelihood ratio) and 'seed'
+
+    if comparison not in ['>=', '<=']:
+        raise ValueError('comparison must be >= or <=')
+    # end if
+    if not (0 < theta < 1):
+        raise ValueError('theta must be within (0, 1)')
+    # end if
+    # the indifference region, clipped to (0, 1) near the ends
+    p0 = min(theta + indifference, 1 - 1e-12)
+    p1 = max(theta - indifference, 1e-12)
+
+    sim = simulation_model(source, target, False, explicit)
+    scheduler = check_scheduler(sim, scheduler)
+
+    entropy = np.random.SeedSequence(seed).entropy
+
+    # log-likelihood ratio of H1 against H0: each path adds log(p1/p0) if it reached
+    # the target, and log((1-p1)/(1-p0)) if not
+    llr_yes = math.log(p1 / p0)
+    llr_no = math.log((1 - p1) / (1 - p0))
+    accept_H1 = math.log((1 - beta) / alpha)
+    accept_H0 = math.log(beta / (1 - alpha))
+
+    llr = 0.0
+    n_samples = 0
+    n_reached = 0
+    n_simulated = 0
+    accepted = None
+    chunks = iterate_chunks(sim, scheduler, max_path_len, batch, max_paths, entropy, workers,
+                            chunk_reached)
+    try:
+        for reached in chunks:
+            n_simulated += len(reached)
+            # the ratio after each path of the chunk, and the first crossing
+            steps = np.where(reached, llr_yes, llr_no)
+            llr_path = llr + np.cumsum(steps)
+            crossed = np.flatnonzero((llr_path >= accept_H1) | (llr_path <= accept_H0))
+            if crossed.size > 0:
+                k = crossed[0] + 1
+                llr = float(llr_path[k - 1])
+                n_samples += int(k)
+                n_reached += int(reached[:k].sum())
+                accepted = 'H1' if llr >= accept_H1 else 'H0'
+                break
+            # end if
+            llr = float(llr_path[-1])
+            n_samples += len(reached)
+            n_reached += int(reached.sum())
+        # end for
+    finally:
+        chunks.close()
+    # end try
+
+    # H0 is p >= theta (+ indifference)
+    if accepted is None:
+        holds = None
+    elif comparison == '>=':
+        holds = (accepted == 'H0')
+    else:
+        holds = (accepted == 'H1')
+    # end if
+
+    return {'holds': holds, 'n_samples': n_samples, 'n_simulated': n_simulated,
+            'n_reached': n_reached, 'llr': llr, 'seed': entropy}
+# end func
+
+
+#%% function - module_levels
+
+def module_levels(result):
+    # the level of each state of each prism module: the BFS depth (distance from the
+    # diagram start) of the node the state stands for; the idle state 0 has level 0,
+    # and an auxiliary decision state the level of the decision node it comes from
+    # Input:
+    #    > result: the ConversionResult of the process
+    # Output:
+    #    > levels: levels[diag_i][mod_i] = array with the level of each module state
+
+    levels = []
+    for diag_i in range(len(result.prism_mod_proc)):
+        Ndiag = result.Nall[diag_i]
+        Fdiag = result.Fall[diag_i]
+        startID = utils_process.find_start(Ndiag)
+        levels_diag = []
+        for mod_i in range(len(result.prism_mod_proc[diag_i])):
+            prism_mod = result.prism_mod_proc[diag_i][mod_i]
+            info = prism_mod['info']
+            lev = np.zeros(info['n_states'] + info['n_aux_states'] + 1, dtype = np.int64)
+            known = np.zeros(len(lev), dtype = bool)
+            known[0] = True
+            for s_state in range(1, len(lev)):
+                nID = result.prism2ids[diag_i].get((s_state, mod_i))
+                if nID is not None:
+                    lev[s_state] = max(utils_process.path_len(startID, nID, Ndiag, Fdiag), 0)
+                    known[s_state] = True
+                # end if
+            # end for
+            # auxiliary states: the level of the state that leads to them
+            for trans in prism_mod['transitions']:
+                for s_next in trans['s_next']:
+                    if not known[s_next]:
+                        lev[s_next] = lev[trans['s']]
+                    # end if
+                # end for
+            # end for
+            levels_diag.append(lev)
+        # end for
+        levels.append(levels_diag)
+    # end for
+
+    return levels
+# end func
+
+
+#%% function - level_function
+
+def level_function(mdp, result):
+    # the importance (level) of each state of the MDP, for importance splitting:
+    # the sum, over all modules, of the BFS depth of the module's current node
+    # (see module_levels)
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > result: the ConversionResult of the process
+    # Output:
+    #    > level: int array with the level of every state
+
+    levels = module_levels(result)
+    level = np.zeros(mdp.n_states, dtype = np.int64)
+    for k in range(len(mdp.model.modules)):
+        diag_i, mod_i = mdp.model.modules[k]
+        level += levels[diag_i][mod_i][mdp.states[:, mdp.model.mod_var[k]]]
+    # end for
+
+    return level
+# end func
+
+
+#%% function - distance_level
+
+def distance_level(mdp, target, fail = None):
+    # the importance (level) of each state for reaching the target: the BFS depth of the
+    # state in the backward search from the target (see utils_mdp.ExplicitMDP.distance_to),
+    # counted so that the target has the highest level
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > target: boolean array of the target states
+    #    > fail: (optional) boolean array of the states where paths give up
+    # Output:
+    #    > level: int array with the level of every state; -1 for the states that cannot
+    #             reach the target (without passing through fail)
+
+    dist = mdp.distance_to(target, fail)
+    return np.where(dist >= 0, dist.max() - dist, -1)
+# end func
+
+
+#%% function - failure_target
+
+def failure_target(mdp, kind = 'restart'):
+    # the states of a failure, as a target for importance splitting
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > kind: 'restart' for the states right after a decision-gate jump (a move on a
+    #            restart label, see utils_convert.processToPrism), or 'deadlock' for the 
+    #            deadlock states other than the end state
+    # Output:
+    #    > mask: boolean array of the failure states
+
+    mask = np.zeros(mdp.n_states, dtype = bool)
+    if kind == 'restart':
+        # the labels of the restarting commands (the ones enabled in any module state)
+        restart_labels = set()
+        for mod_commands in mdp.model.commands:
+            for cmd in mod_commands:
+                if cmd['value'] is None:
+                    restart_labels.add(cmd['label'])
+                # end if
+            # end for
+        # end for
+        is_restart = np.array([lbl in restart_labels for lbl in mdp.label_names], dtype = bool)
+        restart_trans = is_restart[mdp.choice_labels][mdp.trans_choice]
+        mask[mdp.succ[restart_trans]] = True
+    elif kind == 'deadlock':
+        mask[mdp.deadlocks] = True
+        mask &= ~mdp.label_mask('end_state')
+    else:
+        raise ValueError('kind must be restart or deadlock')
+    # end if
+
+    return mask
+# end func
+
+
+#%% function - simulate_until
+
+def simulate_until(mdp, starts, scheduler, rng, success, fail, max_path_len = 10000, 
+                   cum_probs = None):
+    # simulate paths from the given start states, until they hit a success or a fail state
+    # (or max_path_len steps, counted as fail)
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > starts: array of the start state of each path
+    #    > scheduler, rng, max_path_len, cum_probs: see simulate_paths
+    #    > success, fail: boolean arrays of the states that stop a path
+    # Output:
+    #    > hit: boolean array, True for the paths that hit a success state
+    #    > ends: array of the state where each path stopped
+
+    cur = np.array(starts, dtype = np.int64)
+    hit = success[cur].copy()
+    active = np.flatnonzero(~hit & ~fail[cur])
+    for step in range(max_path_len):
+        if active.size == 0:
+            break
+        # end if
+        choices = scheduler.choose(mdp, cur[active], rng)
+        next_states = sample_transitions(mdp, choices, rng, cum_probs)
+        cur[active] = next_states
+        won = success[next_states]
+        hit[active[won]] = True
+        active = active[~won & ~fail[next_states]]
+    # end for
+
+    return hit, cur
+# end func
+
+
+#%% function - csr_ranges
+
+def csr_ranges(offsets, rows):
+    # the positions of all the items of the given rows of a CSR array, concatenated
+    # (e.g. the choices of some states, with mdp.choice_offsets)
+    first = offsets[rows]
+    counts = offsets[rows + 1] - first
+    return np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+# end func
+
+
+#%% function - stage_is_sure
+
+def stage_is_sure(mdp, starts, success, fail):
+    # check if a splitting stage is certain: every path from the start states reaches a
+    # success state before a fail state, whatever the (positive) choice probabilities;
+    # in a finite model that is when no fail state can be reached before a success one,
+    # and every state on the way can still reach a success state
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > starts: boolean array of the start states of the stage
+    #    > success, fail: boolean arrays of the states that stop a path
+    # Output:
+    #    > sure: True or False
+    #    > entrances: boolean array of the success states the paths can enter through
+
+    # forward, through the states that do not stop a path
+    stop = success | fail
+    seen = starts.copy()
+    frontier = np.flatnonzero(starts & ~stop)
+    while frontier.size > 0:
+        trans = csr_ranges(mdp.trans_offsets, csr_ranges(mdp.choice_offsets, frontier))
+        succ = np.unique(mdp.succ[trans])
+        succ = succ[~seen[succ]]
+        seen[succ] = True
+        frontier = succ[~stop[succ]]
+    # end while
+    entrances = seen & success
+
+    if (seen & fail & ~success).any():
+        return False, entrances
+    # end if
+    # backward from the success states, avoiding the fail ones
+    pred_offsets, pred = mdp.predecessors()
+    can = success.copy()
+    frontier = np.flatnonzero(success)
+    while frontier.size > 0:
+        prev = np.unique(pred[csr_ranges(pred_offsets, frontier)])
+        prev = prev[~can[prev] & ~fail[prev]]
+        can[prev] = True
+        frontier = prev
+    # end while
+
+    return bool(can[seen & ~stop].all()), entrances
+# end func
+
+
+#%% function - splitting_thresholds
+
+def splitting_thresholds(mdp, level, target, fail, n_levels = 5):
+    # the default thresholds of importance splitting: the levels between the initial
+    # state and the target that some paths fail to reach; a level every path crosses 
+    # anyway (see stage_is_sure), or past which every path reaches the target, only adds
+    # a stage that all paths pass. Out of these, up to n_levels, spread evenly
+    # Input:
+    #    > mdp: the ExplicitMDP
+    #    > level: int array with the level of every state
+    #    > target, fail: boolean arrays of the target states and of the states where
+    #                    paths give up
+    #    > n_levels: the maximum number of thresholds
+    # Output:
+    #    > thresholds: increasing list of the level thresholds
+
+    if not target.any():
+        return []
+    # end if
+    low = level[0]
+    high = level[target].min()
+    candidates = np.unique(level[(level > low) & (level < high)])
+
+    thresholds = []
+    starts = np.zeros(mdp.n_states, dtype = bool)
+    starts[0] = True
+    for th in candidates:
+        sure, entrances = stage_is_sure(mdp, starts, target | (level >= th), fail)
+        if not sure:
+            thresholds.append(int(th))
+            starts = entrances
+        # end if
+    # end for
+
+    # the last threshold is useless too, if every path past it reaches the target
+    if thresholds and stage_is_sure(mdp, starts, target, fail)[0]:
+        thresholds.pop()
+    # end if
+
+    # spread evenly, if too many
+    if len(thresholds) > n_levels:
+        pick = np.linspace(0, len(thresholds) - 1, n_levels + 2)[1:-1].round().astype(np.int64)
+        thresholds = [thresholds[k] for k in np.unique(pick)]
+    # end if
+
+    return thresholds
+# end func
+
+
+#%% function - splitting
+
+def splitting(source, target = 'restart', stop = 'end_state', level = 'distance', n_levels = 5, 
+              thresholds = None, effort = 1000, scheduler = None, max_path_len = 10000, 
+              seed = None):
+    # estimate a rare probability, P(reach target before stop), by fixed-effort importance 
+    # splitting: the paths advance from level to level of an importance function, and
+    # at each level the paths that made it are cloned into a new set of effort paths;
+    # the estimate is the product of the fractions that advance at each level
+    # Input:
+    #    > source: the ConversionResult of the process (needed for the default level 
+    #              function and node targets), or an ExplicitMDP
+    #    > target: 'restart' or 'deadlock' (see failure_target), or any target of target_mask
+    #    > stop: the states where a path gives up (see target_mask); by default the end state
+    #    > level: the importance function: 'distance' (the BFS depth of the state towards 
+    #             the target, see distance_level), 'modules' (the sum of the BFS depths of the
+    #             modules' current nodes, see level_function), or an int array with the level
+    #             of each state. 'distance' measures how close a state is to the target, for 
+    #             any target, at the cost of a backward search over the MDP. 'modules' needs
+    #             no search, and fits targets that lie deep in the diagrams (e.g. the nodes 
+    #             near their ends), which the paths approach as the modules advance; it does
+    #             not fit the restart and deadlock targets, which a path can hit at any depth
+    #    > n_levels: the maximum number of intermediate levels, if thresholds is None; the
+    #                levels that every path crosses anyway are skipped, and the rest are 
+    #                spread evenly (see splitting_thresholds). Without any, splitting is 
+    #                plain Monte Carlo
+    #    > thresholds: (optional) increasing list of the intermediate level thresholds, used
+    #                  as given
+    #    > effort: number of paths simulated at each level
+    #    > scheduler, max_path_len, seed: see estimate
+    # Output:
+    #    > results: dict with 'p' (the estimate), 'stage_probs' (the fraction of paths that
+    #               advanced at each stage), 'thresholds', 'rel_error' (estimated relative
+    #               error of p), 'n_paths' (simulated paths in total) and 'seed'
+
+    if isinstance(source, utils_mdp.ExplicitMDP):
+        mdp = source
+    else:
+        mdp = utils_mdp.build_mdp(source)
+    # end if
+    result = source if isinstance(source, utils_convert.ConversionResult) else None
+    if scheduler is None:
+        scheduler = UniformScheduler()
+    # end if
+
+    if isinstance(target, str) and target in ['restart', 'deadlock']:
+        target = failure_target(mdp, target)
+    else:
+        target = target_mask(mdp, target, result)
+    # end if
+    fail = target_mask(mdp, stop, result) & ~target
+    if isinstance(level, str) and level == 'distance':
+        level = distance_level(mdp, target, fail)
+    elif isinstance(level, str) and level == 'modules':
+        if result is None:
+            raise ValueError('The modules level function needs the ConversionResult of the process')
+        # end if
+        level = level_function(mdp, result)
+    # end if
+    level = np.asarray(level)
+    # the paths in states that cannot reach the target can give up at once
+    fail = fail | (~target & ~mdp.can_reach(target))
+
+    # the intermediate thresholds, up to the lowest level of a target state
+    if thresholds is None:
+        thresholds = splitting_thresholds(mdp, level, target, fail, n_levels)
+    # end if
+
+    entropy = np.random.SeedSequence(seed).entropy
+    rng = np.random.default_rng(np.random.SeedSequence(entropy))
+    cum_probs = np.cumsum(mdp.probs)
+
+    # stage k: from the entrance states of level k-1, reach level k (or the target)
+    starts = np.zeros(effort, dtype = np.int64)
+    stage_probs = []
+    n_paths = 0
+    for th in list(thresholds) + [None]:
+        if th is None:
+            success = target
+        else:
+            success = target | (level >= th)
+        # end if
+        hit, ends = simulate_until(mdp, starts, scheduler, rng, success, fail, max_path_len,
+                                   cum_probs)
+        n_paths += len(starts)
+        stage_probs.append(hit.mean())
+        if not hit.any():
+            break
+        # end if
+        # clone the paths that made it: the next stage starts from their entrance states
+        starts = rng.choice(ends[hit], size = effort, replace = True)
+    # end for
+
+    p = float(np.prod(stage_probs))
+    if p > 0:
+        rel_error = math.sqrt(sum((1 - q) / (effort * q) for q in stage_probs))
+    else:
+        rel_error = None
+    # end if
+
+    return {'p': p, 'stage_probs': [float(q) for q in stage_probs], 'thresholds': list(thresholds),
+            'rel_error': rel_error, 'n_paths': n_paths, 'seed': entropy}
+# end func
@@ -20,6 +20,7 @@ app.secret_key = b'_5#y2L"F4Q8z\n\xec]/'
 # own modules
 sys.path.append('../utils')
 import utils_all
+import utils_read
 
 
 #%% app params
@@ -120,8 +121,9 @@ def index():
         # try to process file
         no_errors = False
         try:
-            # convert to prism
-            prism_data, nodes_states = utils_all.bpmn2prism(f_path, remove_redund = True)
+            # parse the bpmn file (once) and convert to prism
+            bpmn_model = utils_read.read_model(f_path)
+            prism_data, nodes_states = utils_all.bpmn2prism(bpmn_model, remove_redund = True)
             no_errors = True
         except:
             no_errors = False 
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+shared fixtures of the tests: the example processes of the tool
+"""
+
+#%% imports
+
+import glob
+import os
+import sys
+
+import pytest
+
+# the utils are flat modules, imported by name
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src', 'utils'))
+
+import utils_read
+import rem_redundancy
+import utils_rewards
+import utils_mdp
+
+
+#%% example files
+
+EXAMPLES = sorted(glob.glob(os.path.join(HERE, '..', 'examples', '**', '*.xml'), recursive = True))
+
+
+def example_id(xml_file):
+    # the name of an example, for the test ids
+    return os.path.splitext(os.path.basename(xml_file))[0]
+# end func
+
+
+def read_example(xml_file):
+    # the event-based process of an example, ready for utils_convert.convert_process
+    # Output:
+    #    > (Nall, Fall, Fmsg, rewards_all)
+    model = utils_read.read_model(xml_file)
+    Nall, Fall, Timeline = utils_read.read_process_events(model)
+    _, _, Fmsg = rem_redundancy.events_to_flows3(Nall, Fall)
+    rewards_all = utils_rewards.assign_rew_process2(Timeline, Nall, Fall)
+    return Nall, Fall, Fmsg, rewards_all
+# end func
+
+
+#%% helpers
+
+def assert_same_properties(res_a, res_b, epsilon = 1e-6):
+    # the two conversions give the same Pmin/Pmax/Rmin/Rmax on the explicit mdp
+    props_a = utils_mdp.check_properties(res_a, epsilon = epsilon)
+    props_b = utils_mdp.check_properties(res_b, epsilon = epsilon)
+    assert props_a.keys() == props_b.keys()
+    for prop in props_a:
+        assert props_b[prop] == pytest.approx(props_a[prop], rel = 1e-4, abs = 1e-6), prop
+    # end for
+# end func
+
+
+#%% fixtures
+
+@pytest.fixture(scope = 'session', params = EXAMPLES, ids = example_id)
+def example_file(request):
+    # the xml file of each example
+    return request.param
+# end func
+
+
+@pytest.fixture(scope = 'session')
+def example_process(example_file):
+    # the process of each example (see read_example)
+    return read_example(example_file)
+# end func
+
+
+@pytest.fixture(scope = 'session')
+def small_process():
+    # the process of the smallest example, for the slower tests (see read_example)
+    return read_example([f for f in EXAMPLES if example_id(f) == 'UC_Abstr_level_1'][0])
+# end func
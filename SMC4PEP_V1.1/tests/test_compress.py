@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+the chain compression keeps the model checking results (see utils_convert.compress_chains)
+"""
+
+#%% imports
+
+import pytest
+
+import utils_convert
+import utils_mdp
+from conftest import assert_same_properties
+
+
+#%% tests
+
+def test_compress_without_rewards(example_process):
+    # without rewards the chains are collapsed, and the probabilities stay the same
+    Nall, Fall, Fmsg, _ = example_process
+    plain = utils_convert.convert_process(Nall, Fall, Fmsg, None)
+    compressed = utils_convert.convert_process(Nall, Fall, Fmsg, None, compress = True)
+    assert sum(map(sum, compressed.chain_removed)) > 0
+    assert utils_mdp.build_mdp(compressed).n_states < utils_mdp.build_mdp(plain).n_states
+    assert_same_properties(plain, compressed)
+# end func
+
+
+def test_compress_with_rewards(example_process):
+    # with rewards the chains of nodes with equal rewards are collapsed, and the
+    # transitions out of them carry the skipped rewards, so Rmin/Rmax do not change
+    Nall, Fall, Fmsg, rewards_all = example_process
+    plain = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all)
+    compressed = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, compress = True)
+    assert sum(map(sum, compressed.chain_removed)) > 0
+    assert compressed.transition_rewards() != []
+    assert utils_mdp.build_mdp(compressed).n_states < utils_mdp.build_mdp(plain).n_states
+    assert_same_properties(plain, compressed)
+# end func
+
+
+@pytest.mark.parametrize('with_rewards', [False, True])
+def test_nodes_to_states_map(example_process, with_rewards):
+    # the node map of the compressed model, without converting the whole process
+    Nall, Fall, Fmsg, rewards_all = example_process
+    rewards_all = rewards_all if with_rewards else None
+    compressed = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, compress = True)
+    nodes_states = utils_convert.nodes_to_states_map(Nall, Fall, Fmsg, compress = True, 
+                                                     rewards_all = rewards_all)
+    assert nodes_states.equals(compressed.nodes_states())
+# end func
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+the dtmc detection of the converter (see utils_mdp.check_determinism)
+"""
+
+#%% imports
+
+import os
+import subprocess
+import sys
+
+import utils_convert
+import utils_mdp
+
+
+#%% tests
+
+def test_detect_dtmc(example_process):
+    # the examples interleave their pools, so they stay mdps
+    Nall, Fall, Fmsg, rewards_all = example_process
+    result = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, detect_dtmc = True)
+    assert result.determinism['deterministic'] is False
+    assert result.model_type == 'mdp'
+    assert result.process_str.startswith('mdp')
+# end func
+
+
+def chain_module(n_states):
+    # a single prism module going 1 -> 2 -> ... -> n_states (see utils_convert.processToPrism)
+    transitions = [utils_convert.helper_make_trans('', s, None, [], [s + 1], [None], [1.0], [[]], [[]])
+                   for s in range(1, n_states)]
+    info = {'start_state': 1, 'end_state': n_states, 'n_states': n_states, 'n_aux_states': 0}
+    return [[{'info': info, 'transitions': transitions, 'flow_vars': [], 'restart_labels': []}]]
+# end func
+
+
+def test_determinism_bound():
+    # a deterministic model is a dtmc, unless the analysis gives up first
+    prism_mod_proc = chain_module(10)
+    assert utils_mdp.check_determinism(prism_mod_proc)['model_type'] == 'dtmc'
+    report = utils_mdp.check_determinism(prism_mod_proc, max_states = 5)
+    assert report['deterministic'] is None
+    assert report['model_type'] == 'mdp'
+    assert report['n_states'] == 5
+# end func
+
+
+def test_detect_dtmc_passes_bound(small_process, monkeypatch):
+    # convert_process hands max_states to the analysis
+    bounds = []
+    def check_determinism(source, max_states = None):
+        bounds.append(max_states)
+        return {'deterministic': None, 'model_type': 'mdp'}
+    # end func
+    monkeypatch.setattr(utils_mdp, 'check_determinism', check_determinism)
+    Nall, Fall, Fmsg, rewards_all = small_process
+    utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, detect_dtmc = True, 
+                                  max_states = 123)
+    utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, detect_dtmc = True)
+    assert bounds == [123, 100000]
+# end func
+
+
+def test_no_import_cycle():
+    # the converter loads the explicit engine only for detect_dtmc
+    utils_dir = os.path.dirname(utils_convert.__file__)
+    code = 'import sys; import utils_convert; print("utils_mdp" in sys.modules)'
+    out = subprocess.run([sys.executable, '-c', code], cwd = utils_dir, 
+                         capture_output = True, text = True, check = True)
+    assert out.stdout.strip() == 'False'
+# end func
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+the tight variable encoding gives the same model (see utils_convert.encode_variables)
+"""
+
+#%% imports
+
+import pytest
+
+import utils_convert
+import utils_mdp
+from conftest import assert_same_properties
+
+
+#%% tests
+
+@pytest.mark.parametrize('layout', ['modules', 'packed'])
+def test_encoding_same_model(example_process, layout):
+    # the reachable states of the plain model, without the dropped flow variables, are
+    # exactly those of the encoded model, and the properties agree
+    Nall, Fall, Fmsg, rewards_all = example_process
+    plain = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, layout = layout)
+    encoded = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, layout = layout,
+                                            encode = True)
+    mdp_plain = utils_mdp.build_mdp(plain)
+    mdp_enc = utils_mdp.build_mdp(encoded)
+
+    kept = [mdp_plain.model.var_index[var_name] for var_name in mdp_enc.model.var_names]
+    assert set(map(tuple, mdp_plain.states[:, kept])) == set(map(tuple, mdp_enc.states))
+    assert (mdp_enc.states >= mdp_enc.model.var_low).all()
+    assert (mdp_enc.states <= mdp_enc.model.var_high).all()
+    assert_same_properties(plain, encoded)
+# end func
+
+
+def test_encoding_report(example_process):
+    # the report states the bits actually saved, also when there are none
+    Nall, Fall, Fmsg, rewards_all = example_process
+    encoding = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, encode = True).encoding
+    assert encoding['bits_saved'] == encoding['bits_before'] - encoding['bits_after'] >= 0
+    if encoding['dropped_flows'] == [] and encoding['ranges_tightened'] == 0:
+        assert encoding['bits_saved'] == 0
+    # end if
+# end func
+
+
+def test_encoding_bool_flows(small_process):
+    # the flow variables are written as bool
+    Nall, Fall, Fmsg, rewards_all = small_process
+    encoded = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, encode = True)
+    flows = [line for line in encoded.process_str.split('\n') if line.startswith('fl')]
+    assert flows != []
+    assert all(line.endswith(': bool init false; ') for line in flows)
+# end func
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+folding the aux decision states keeps the model checking results 
+(see utils_convert.fold_aux_states)
+"""
+
+#%% imports
+
+import utils_convert
+import utils_mdp
+from conftest import assert_same_properties
+
+
+#%% tests
+
+def test_fold_aux_without_rewards(example_process):
+    # without rewards the aux states are folded, and the probabilities stay the same
+    Nall, Fall, Fmsg, _ = example_process
+    plain = utils_convert.convert_process(Nall, Fall, Fmsg, None)
+    folded = utils_convert.convert_process(Nall, Fall, Fmsg, None, fold_aux = True)
+    assert sum(map(sum, folded.aux_removed)) > 0
+    assert utils_mdp.build_mdp(folded).n_states < utils_mdp.build_mdp(plain).n_states
+    assert_same_properties(plain, folded)
+# end func
+
+
+def test_fold_aux_with_rewards(example_process):
+    # with rewards the folded decisions carry the rewards of the skipped steps, 
+    # so Rmin/Rmax do not change
+    Nall, Fall, Fmsg, rewards_all = example_process
+    plain = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all)
+    folded = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all, fold_aux = True)
+    assert sum(map(sum, folded.aux_removed)) > 0
+    assert folded.transition_rewards() != []
+    assert utils_mdp.build_mdp(folded).n_states < utils_mdp.build_mdp(plain).n_states
+    assert_same_properties(plain, folded)
+# end func
+
+
+def test_fold_aux_and_compress_with_rewards(small_process):
+    # both reductions together, on every layout option, keep Rmin/Rmax
+    plain = utils_convert.convert_process(*small_process)
+    reduced = utils_convert.convert_process(*small_process, fold_aux = True, compress = True,
+                                            layout = 'packed', encode = True, order = True)
+    assert utils_mdp.build_mdp(reduced).n_states < utils_mdp.build_mdp(plain).n_states
+    assert_same_properties(plain, reduced)
+# end func
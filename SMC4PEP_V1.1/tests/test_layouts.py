@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+the packed module layout describes the same process (see utils_convert.pack_modules)
+"""
+
+#%% imports
+
+import pytest
+
+import utils_mdp
+
+
+#%% tests
+
+def test_packed_layout_same_model(example_process):
+    # both layouts have the same state space and properties, with fewer modules packed
+    Nall, Fall, Fmsg, rewards_all = example_process
+    table = utils_mdp.benchmark_layouts(Nall, Fall, Fmsg, rewards_all).set_index('layout')
+    modules, packed = table.loc['modules'], table.loc['packed']
+    assert packed['states'] == modules['states']
+    assert packed['transitions'] == modules['transitions']
+    for prop in [col for col in table.columns if col.startswith(('P', 'R'))]:
+        assert packed[prop] == pytest.approx(modules[prop], rel = 1e-4, abs = 1e-6), prop
+    # end for
+    assert packed['modules'] <= modules['modules']
+    assert packed['state bits'] <= modules['state bits']
+# end func
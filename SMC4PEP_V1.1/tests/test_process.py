@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+the edge table of a diagram gives the same flow directions as order_nodes, and its DFS
+classes and loops agree with the DFS (see utils_process.classify_edges)
+"""
+
+#%% imports
+
+import utils_process
+
+
+#%% helpers
+
+def nested_loops_diagram():
+    # start -> a -> b -> c -> d -> end, with the loops b <- c (inner) and a <- d (outer),
+    # and the shortcut a -> c
+    Ndiag = {nID: {'type': 'task'} for nID in ['a', 'b', 'c', 'd']}
+    Ndiag['s'] = {'type': 'start'}
+    Ndiag['e'] = {'type': 'end'}
+    Fdiag = {('s', 'a'): '', ('a', 'b'): '', ('b', 'c'): '', ('c', 'd'): '', ('d', 'e'): '',
+             ('c', 'b'): '', ('d', 'a'): '', ('a', 'c'): ''}
+    return Ndiag, utils_process.DiagFlows(Fdiag)
+# end func
+
+
+#%% tests
+
+def test_edge_directions_match_order_nodes(example_process):
+    # every flow of every diagram, read from the table and ordered by BFS paths
+    Nall, Fall, _, _ = example_process
+    for diag in Nall:
+        Ndiag, Fdiag = Nall[diag], Fall[diag]
+        edge_table, _, _ = utils_process.classify_edges(Ndiag, Fdiag)
+        assert set(edge_table) == set(Fdiag)
+        for (nID, chID), edge in edge_table.items():
+            expected = utils_process.order_nodes(nID, chID, Ndiag, dict(Fdiag)) == (nID, chID)
+            assert edge['forward'] == expected
+        # end for
+    # end for
+# end func
+
+
+def test_nested_loops():
+    # the DFS classes, and the two loops, the inner one nested in the outer one
+    Ndiag, Fdiag = nested_loops_diagram()
+    edge_table, loops, loop_of = utils_process.classify_edges(Ndiag, Fdiag)
+    kinds = {flow: edge['kind'] for flow, edge in edge_table.items()}
+    assert kinds == {('s', 'a'): 'tree', ('a', 'b'): 'tree', ('b', 'c'): 'tree', 
+                     ('c', 'd'): 'tree', ('d', 'e'): 'tree', ('c', 'b'): 'back', 
+                     ('d', 'a'): 'back', ('a', 'c'): 'forward'}
+    assert loops == {'a': {'nodes': ['a', 'b', 'c', 'd'], 'parent': None, 'depth': 1},
+                     'b': {'nodes': ['b', 'c'], 'parent': 'a', 'depth': 2}}
+    assert loop_of == {'a': 'a', 'b': 'b', 'c': 'b', 'd': 'a'}
+    # (kept on the diagram flows)
+    assert utils_process.classify_edges(Ndiag, Fdiag)[1] is loops
+# end func
+
+
+def test_loops_agree_with_the_dfs(example_process):
+    # on the examples: one tree flow into each node below a DFS root, back flows go to the
+    # headers of loops that hold their source, and the loops nest
+    Nall, Fall, _, _ = example_process
+    for diag in Nall:
+        edge_table, loops, loop_of = utils_process.classify_edges(Nall[diag], Fall[diag])
+        tree_targets = [chID for (_, chID), edge in edge_table.items() if edge['kind'] == 'tree']
+        assert len(tree_targets) == len(set(tree_targets))
+        for (nID, chID), edge in edge_table.items():
+            if edge['kind'] == 'back':
+                assert nID in loops[chID]['nodes']
+            # end if
+        # end for
+        for headerID, loop in loops.items():
+            assert loop['nodes'][0] == headerID
+            if loop['parent'] is None:
+                assert loop['depth'] == 1
+            else:
+                parent = loops[loop['parent']]
+                assert set(loop['nodes']) < set(parent['nodes'])
+                assert loop['depth'] == parent['depth'] + 1
+            # end if
+        # end for
+        for nID, headerID in loop_of.items():
+            assert nID in loops[headerID]['nodes']
+            assert all(loops[h]['depth'] <= loops[headerID]['depth'] 
+                       for h in loops if nID in loops[h]['nodes'])
+        # end for
+    # end for
+# end func
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+the streaming reader gives the same processes as the xmltodict one (see utils_read)
+"""
+
+#%% imports
+
+import glob
+import os
+
+import pytest
+
+import utils_read
+from conftest import EXAMPLES, HERE, example_id
+
+
+#%% tests
+
+# the examples, and the model shipped with the web gui
+XML_FILES = EXAMPLES + sorted(glob.glob(os.path.join(HERE, '..', 'src', 'web_gui', 'upload', '*.xml')))
+
+
+@pytest.mark.parametrize('xml_file', XML_FILES, ids = example_id)
+def test_readers_agree(xml_file):
+    # the nodes and flows of the diagrams, in the same order as read (dict order matters, 
+    # e.g. for the ordering of children), the message flows and the timeline
+    models = [utils_read.BPMNmodel(xml_file, 'iterparse'), utils_read.BPMNmodel(xml_file, 'xmltodict')]
+
+    assert models[0].process_type == models[1].process_type
+    diags = [[(cnt, name, list(Ndiag.items()), list(Fdiag.items()))
+              for cnt, name, Ndiag, Fdiag in m.diagrams] for m in models]
+    assert diags[0] == diags[1]
+    fmsg = [None if m.Fmsg is None else list(m.Fmsg.items()) for m in models]
+    assert fmsg[0] == fmsg[1]
+    timeline = [None if m.Timeline is None else (list(m.Timeline['nodes'].items()),
+                                                 list(m.Timeline['flows'].items()))
+                for m in models]
+    assert timeline[0] == timeline[1]
+# end func
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+the statistical model checker agrees with the explicit engine (see utils_smc, utils_mdp)
+"""
+
+#%% imports
+
+import numpy as np
+import pytest
+
+import utils_convert
+import utils_mdp
+import utils_smc
+
+
+#%% helpers
+
+def uniform_values(mdp, target, rew, n_iters = 100000, epsilon = 1e-9, choice_rew = None):
+    # the exact reach probability and expected reward until the target of the mdp, when
+    # every choice of a state is taken with the same probability (the UniformScheduler)
+    n_choices = np.diff(mdp.choice_offsets)
+    if choice_rew is not None:
+        rew = rew + np.bincount(mdp.choice_state, weights = choice_rew / n_choices[mdp.choice_state], 
+                                minlength = mdp.n_states)
+    # end if
+    weight = mdp.probs / n_choices[mdp.choice_state[mdp.trans_choice]]
+    src = mdp.choice_state[mdp.trans_choice]
+
+    def solve(value, add):
+        for _ in range(n_iters):
+            new = add + np.bincount(src, weights = weight * value[mdp.succ], minlength = mdp.n_states)
+            new[target] = value[target]
+            if np.max(np.abs(new - value)) < epsilon:
+                return new
+            # end if
+            value = new
+        # end for
+        return value
+    # end func
+
+    p = solve(target.astype(np.float64), np.zeros(mdp.n_states))
+    r = solve(np.zeros(mdp.n_states), np.where(target, 0.0, rew))
+    return p[0], r[0]
+# end func
+
+
+@pytest.fixture(scope = 'module')
+def example_result(example_process):
+    # the conversion of each example
+    Nall, Fall, Fmsg, rewards_all = example_process
+    return utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all)
+# end func
+
+
+#%% tests
+
+def test_vector_model_initial_state(example_result):
+    # the state matrix starts from the initial variable values of the compiled model
+    model = utils_mdp.compile_model(example_result)
+    vmodel = utils_smc.simulation_model(example_result)
+    X = vmodel.initial(3)
+    assert X.shape == (3, len(model.var_names) + 1)
+    assert (X[:, :-1] == model.var_init).all()
+# end func
+
+
+def test_vector_steps_follow_the_mdp(example_result):
+    # every step of the simulated state vectors is a transition of the explicit mdp
+    mdp = utils_mdp.build_mdp(example_result)
+    ids = {tuple(state): s for s, state in enumerate(mdp.states)}
+    vmodel = utils_smc.simulation_model(example_result)
+    scheduler = utils_smc.UniformScheduler()
+    rng = np.random.default_rng(0)
+    X = vmodel.initial(200)
+    rows = np.arange(200)
+    for _ in range(50):
+        before = [ids[tuple(x)] for x in X[rows, :-1]]
+        moved = vmodel.step(X, rows, scheduler, rng)
+        for s, x in zip(np.array(before)[moved], X[rows[moved], :-1]):
+            choices = range(mdp.choice_offsets[s], mdp.choice_offsets[s + 1])
+            succ = [mdp.succ[t] for c in choices for t in range(mdp.trans_offsets[c], mdp.trans_offsets[c + 1])]
+            assert ids[tuple(x)] in succ
+        # end for
+        rows = rows[moved]
+    # end for
+# end func
+
+
+def test_estimate_matches_uniform_scheduler(example_result):
+    # the estimates on the state vectors match the exact values of the uniform scheduler
+    mdp = utils_mdp.build_mdp(example_result)
+    target = mdp.label_mask('end_state')
+    rew = utils_mdp.state_reward_vector(mdp, example_result.state_rewards())
+    p_exact, r_exact = uniform_values(mdp, target, rew)
+
+    results = utils_smc.estimate(example_result, eps = 0.02, delta = 0.001, seed = 7, 
+                                 max_paths = 4000)
+    assert abs(results['p_reach'] - p_exact) <= results['p_halfwidth']
+    assert abs(results['reward_mean'] - r_exact) <= results['reward_halfwidth']
+# end func
+
+
+def test_explicit_mode(example_result):
+    # the explicit mode estimates the same values
+    results = utils_smc.estimate(example_result, eps = 0.05, seed = 3, max_paths = 2000)
+    explicit = utils_smc.estimate(example_result, eps = 0.05, seed = 3, max_paths = 2000, 
+                                  explicit = True)
+    assert results['p_reach'] == explicit['p_reach'] == 1.0
+    halfwidth = results['reward_halfwidth'] + explicit['reward_halfwidth']
+    assert abs(results['reward_mean'] - explicit['reward_mean']) <= halfwidth
+# end func
+
+
+@pytest.mark.parametrize('explicit', [False, True])
+def test_estimate_with_transition_rewards(small_process, explicit):
+    # the rewards carried by the compressed chains are accumulated by the simulation too
+    result = utils_convert.convert_process(*small_process, compress = True)
+    mdp = utils_mdp.build_mdp(result)
+    target = mdp.label_mask('end_state')
+    rew_states = result.state_rewards()
+    rew = utils_mdp.state_reward_vector(mdp, rew_states)
+    choice_rew = utils_mdp.transition_reward_vector(mdp, result.transition_rewards(), rew_states)
+    assert choice_rew.any()
+    _, r_exact = uniform_values(mdp, target, rew, choice_rew = choice_rew)
+
+    results = utils_smc.estimate(result, eps = 0.05, delta = 0.001, seed = 7, max_paths = 4000,
+                                 explicit = explicit)
+    assert abs(results['reward_mean'] - r_exact) <= results['reward_halfwidth']
+# end func
+
+
+def test_policy_scheduler_needs_explicit(example_result):
+    # a scheduler on the explicit states cannot drive the compiled model
+    scheduler = utils_smc.PolicyScheduler(np.zeros(1, dtype = np.int64))
+    with pytest.raises(ValueError):
+        utils_smc.estimate(example_result, scheduler = scheduler, max_paths = 10)
+    # end with
+# end func
+
+
+def test_reward_halfwidth():
+    # the normal quantile of 1 - delta/2 (1.95996 for delta = 0.05)
+    rew = np.array([1.0, 3.0] * 50)
+    halfwidth = utils_smc.reward_halfwidth(rew.sum(), (rew ** 2).sum(), len(rew), 0.05)
+    assert halfwidth == pytest.approx(1.959964 * np.sqrt(100 / 99 / 100), rel = 1e-6)
+# end func
+
+
+def test_sprt_near_one(small_process):
+    # a threshold within the indifference of 1 is clipped, not refused; the end state is
+    # always reached, so P >= 0.999 holds
+    result = utils_convert.convert_process(*small_process)
+    results = utils_smc.sprt(result, 0.999, seed = 5, max_paths = 5000)
+    assert results['holds'] is True
+    assert results['n_reached'] == results['n_samples']
+    with pytest.raises(ValueError):
+        utils_smc.sprt(result, 1.0)
+    # end with
+# end func
+
+
+def test_workers_same_results(small_process):
+    # the chunks get their own random streams, so any number of workers gives the same 
+    # estimate (the workers load the compiled model once, and simulate state vectors)
+    Nall, Fall, Fmsg, rewards_all = small_process
+    result = utils_convert.convert_process(Nall, Fall, Fmsg, rewards_all)
+    settings = dict(eps = 0.05, seed = 11, batch = 200, max_paths = 1000)
+    single = utils_smc.estimate(result, workers = 1, **settings)
+    pooled = utils_smc.estimate(result, workers = 2, **settings)
+    assert single == pooled
+    single = utils_smc.sprt(result, 0.9, batch = 50, seed = 11, workers = 1)
+    pooled = utils_smc.sprt(result, 0.9, batch = 50, seed = 11, workers = 2)
+    assert single == pooled
+# end func
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+the default thresholds of importance splitting skip the levels that every path crosses
+anyway (see utils_smc.splitting_thresholds)
+"""
+
+#%% imports
+
+import numpy as np
+import pytest
+
+import utils_convert
+import utils_mdp
+import utils_smc
+
+
+#%% helpers
+
+def chain_mdp():
+    # a small mdp with two risky steps: 0 -> 1 (or fail), 1 -> 2, 2 -> 3 (or fail), 3 -> target;
+    # state 4 is the target and state 5 the fail state, both absorbing
+    # Output:
+    #    > (mdp, level, target, fail)
+    trans = [[(1, 0.5), (5, 0.5)], [(2, 1.0)], [(3, 0.5), (5, 0.5)], [(4, 1.0)], [(4, 1.0)], [(5, 1.0)]]
+    trans_offsets = np.cumsum([0] + [len(t) for t in trans])
+    succ = np.array([s for t in trans for s, _ in t], dtype = np.int64)
+    probs = np.array([p for t in trans for _, p in t])
+    mdp = utils_mdp.ExplicitMDP(None, np.zeros((len(trans), 1), dtype = np.int64),
+                                np.arange(len(trans) + 1), np.zeros(len(trans), dtype = np.int64),
+                                [''], trans_offsets, succ, probs, np.array([], dtype = np.int64))
+    level = np.array([0, 1, 2, 3, 4, 0])
+    target = np.arange(6) == 4
+    fail = np.arange(6) == 5
+    return mdp, level, target, fail
+# end func
+
+
+#%% tests
+
+def test_stage_is_sure():
+    # a stage is sure only if no path can fail on the way
+    mdp, level, target, fail = chain_mdp()
+    starts = np.arange(6) == 1
+    sure, entrances = utils_smc.stage_is_sure(mdp, starts, level >= 2, fail)
+    assert sure
+    assert np.flatnonzero(entrances).tolist() == [2]
+    sure, _ = utils_smc.stage_is_sure(mdp, starts, level >= 3, fail)
+    assert not sure
+# end func
+
+
+def test_thresholds_skip_sure_levels():
+    # of the levels 1, 2, 3, only 1 is kept: 2 is sure from 1, and past 3 every path reaches
+    # the target
+    mdp, level, target, fail = chain_mdp()
+    assert utils_smc.splitting_thresholds(mdp, level, target, fail) == [1]
+    assert utils_smc.splitting_thresholds(mdp, level, target, fail, n_levels = 0) == []
+    out = utils_smc.splitting(mdp, target = target, stop = fail, level = level, effort = 2000, seed = 1)
+    assert out['thresholds'] == [1]
+    assert all(q < 1.0 for q in out['stage_probs'])
+    assert out['p'] == pytest.approx(0.25, abs = 0.05)
+# end func
+
+
+def test_given_thresholds_are_kept():
+    # thresholds passed by the user are used as given
+    mdp, level, target, fail = chain_mdp()
+    out = utils_smc.splitting(mdp, target = target, stop = fail, level = level,
+                              thresholds = [1, 2, 3], effort = 500, seed = 1)
+    assert out['thresholds'] == [1, 2, 3]
+    assert len(out['stage_probs']) == 4
+# end func
+
+
+@pytest.mark.parametrize('level', ['distance', 'modules'])
+def test_example_stages_are_not_sure(small_process, level):
+    # on an example, no stage before the last one passes every path
+    result = utils_convert.convert_process(*small_process)
+    out = utils_smc.splitting(result, level = level, effort = 200, seed = 1)
+    assert all(q < 1.0 for q in out['stage_probs'][:-1])
+# end func